@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from auth_api.models import RevokedToken
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['jti', 'user', 'token_type', 'revoked_at', 'expires_at']
+    list_filter = ['token_type', 'revoked_at']
+    search_fields = ['jti', 'user__username']
+    readonly_fields = ['jti', 'user', 'token_type', 'expires_at', 'revoked_at']
+    date_hierarchy = 'revoked_at'
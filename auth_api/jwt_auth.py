@@ -1,15 +1,105 @@
 import jwt
+import copy
 import datetime
 import logging
+import threading
+import time
+from collections import OrderedDict
 from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication
 
+from auth_api.revocation import generate_jti, revocation_list
+
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
+
+def jwt_setting(name, default=None):
+    """Lit une option de JWT_SETTINGS"""
+    return getattr(settings, 'JWT_SETTINGS', {}).get(name, default)
+
+
+class TTLCache:
+    """
+    Cache LRU local au processus avec durée de vie par entrée (thread-safe).
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Valeur en cache, ou None si absente ou expirée"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Utilisateurs authentifiés par ID (invalidés à la sauvegarde / suppression, cf. auth_api.models)
+user_cache = TTLCache(jwt_setting('USER_CACHE_SIZE', 1024))
+# Payloads décodés par token, jusqu'à leur expiration
+token_cache = TTLCache(jwt_setting('TOKEN_CACHE_SIZE', 4096))
+
+
+def invalidate_cached_user(user_id):
+    """Retire un utilisateur du cache d'authentification"""
+    user_cache.delete(user_id)
+
+
+def get_cached_user(user_id):
+    """
+    Utilisateur par ID via le cache local ; une copie est renvoyée pour que les
+    requêtes concurrentes ne partagent pas la même instance
+    """
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.objects.get(id=user_id)
+        user_cache.set(user_id, user, jwt_setting('USER_CACHE_TTL', 60))
+    return copy.copy(user)
+
+
+def decode_token(token):
+    """Décode un token en mémoïsant le payload jusqu'à l'expiration du token"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(
+            token, 
+            settings.SECRET_KEY, 
+            algorithms=['HS256']
+        )
+        exp = payload.get('exp')
+        if exp:
+            token_cache.set(token, payload, exp - time.time())
+    return payload
+
 class JWTAuthentication(BaseAuthentication):
     """
     Authentification personnalisée utilisant PyJWT
@@ -30,20 +120,19 @@ class JWTAuthentication(BaseAuthentication):
                 return None
                 
             token = parts[1]
-            logger.debug(f"Tentative de décodage du token: {token[:20]}...")
-            
-            payload = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=['HS256']
-            )
+            payload = decode_token(token)
             
             # Vérifier l'expiration
             exp = payload.get('exp')
-            if exp and datetime.datetime.utcnow().timestamp() > exp:
+            if exp and time.time() > exp:
                 logger.warning(f"Token expiré pour l'utilisateur ID: {payload.get('user_id', 'N/A')}")
                 print(f"⚠️ ERREUR AUTH - Token expiré pour l'utilisateur ID: {payload.get('user_id', 'N/A')}")
                 raise AuthenticationFailed('Token expiré')
+            
+            # Vérifier la révocation (filtre de Bloom local, sans I/O dans le cas courant)
+            if revocation_list.is_revoked(payload.get('jti')):
+                logger.warning(f"Token révoqué pour l'utilisateur ID: {payload.get('user_id', 'N/A')}")
+                raise AuthenticationFailed('Token révoqué')
                 
             # Récupérer l'utilisateur
             user_id = payload.get('user_id')
@@ -52,9 +141,9 @@ class JWTAuthentication(BaseAuthentication):
                 print(f"❌ ERREUR AUTH - Token sans user_id")
                 raise AuthenticationFailed('Token invalide')
                 
-            user = User.objects.get(id=user_id)
-            logger.info(f"Authentification réussie pour l'utilisateur: {user.username} (ID: {user.id})")
-            print(f"✅ SUCCÈS AUTH - Utilisateur authentifié: {user.username} (ID: {user.id})")
+            user = get_cached_user(user_id)
+            if jwt_setting('LOG_SUCCESS', False):
+                logger.info("Authentification réussie pour l'utilisateur: %s (ID: %s)", user.username, user.id)
             return (user, token)
             
         except jwt.InvalidTokenError as e:
@@ -76,7 +165,6 @@ def generate_tokens(user):
     Génère les tokens d'accès et de rafraîchissement
     """
     try:
-        import time
         current_time = datetime.datetime.utcnow()
         
         logger.info(f"Génération de tokens pour l'utilisateur: {user.username} (ID: {user.id})")
@@ -88,7 +176,7 @@ def generate_tokens(user):
             'exp': current_time + datetime.timedelta(hours=1),
             'iat': current_time,
             'type': 'access',
-            'jti': str(int(time.time() * 1000000))  # Identifiant unique basé sur le timestamp en microsecondes
+            'jti': generate_jti()
         }
         
         # Token de rafraîchissement (7 jours)
@@ -97,7 +185,7 @@ def generate_tokens(user):
             'exp': current_time + datetime.timedelta(days=7),
             'iat': current_time,
             'type': 'refresh',
-            'jti': str(int(time.time() * 1000000) + 1)  # Identifiant unique différent
+            'jti': generate_jti()
         }
         
         access_token = jwt.encode(access_payload, settings.SECRET_KEY, algorithm='HS256')
@@ -127,21 +215,24 @@ def refresh_access_token(refresh_token):
             logger.warning("Token de rafraîchissement avec type invalide")
             print(f"⚠️ ERREUR REFRESH - Type de token invalide: {payload.get('type')}")
             raise jwt.InvalidTokenError('Token de rafraîchissement invalide')
+        
+        if revocation_list.is_revoked(payload.get('jti')):
+            logger.warning("Token de rafraîchissement révoqué")
+            raise jwt.InvalidTokenError('Token de rafraîchissement révoqué')
             
         user_id = payload.get('user_id')
         user = User.objects.get(id=user_id)
         
         logger.info(f"Rafraîchissement du token pour l'utilisateur: {user.username} (ID: {user.id})")
         
-        # Générer un nouveau token d'accès avec un timestamp unique
-        import time
+        # Générer un nouveau token d'accès
         access_payload = {
             'user_id': user.id,
             'username': user.username,
             'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1),
             'iat': datetime.datetime.utcnow(),
             'type': 'access',
-            'jti': str(int(time.time() * 1000))  # Identifiant unique basé sur le timestamp
+            'jti': generate_jti()
         }
         
         access_token = jwt.encode(access_payload, settings.SECRET_KEY, algorithm='HS256')
@@ -162,4 +253,18 @@ def refresh_access_token(refresh_token):
     except Exception as e:
         logger.error(f"Erreur inattendue lors du rafraîchissement: {str(e)}")
         print(f"❌ ERREUR REFRESH - Exception: {str(e)}")
-        raise AuthenticationFailed(f'Erreur de rafraîchissement: {str(e)}') 
\ No newline at end of file
+        raise AuthenticationFailed(f'Erreur de rafraîchissement: {str(e)}') 
+
+
+def revoke_token(token, user=None):
+    """
+    Révoque un token (accès ou rafraîchissement) jusqu'à son expiration.
+    Retourne False si le token est invalide, expiré ou sans jti.
+    """
+    try:
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        return False
+    if user is not None and payload.get('user_id') != user.id:
+        return False
+    return revocation_list.revoke(payload, user)
@@ -0,0 +1,14 @@
+"""
+Commande de purge des révocations de tokens expirés
+"""
+from django.core.management.base import BaseCommand
+
+from auth_api.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = "Supprime les révocations des tokens JWT déjà expirés (inutiles au contrôle d'authentification)"
+
+    def handle(self, *args, **options):
+        deleted = RevokedToken.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"✅ {deleted} révocation(s) expirée(s) supprimée(s)"))
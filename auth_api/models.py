@@ -1,3 +1,44 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
-# Create your models here.
+
+class RevokedToken(models.Model):
+    """
+    Token JWT révoqué (déconnexion), identifié par son jti.
+    La ligne n'est utile que jusqu'à l'expiration du token (cf. purge_revoked_tokens).
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='revoked_tokens')
+    token_type = models.CharField(max_length=10, default='access')
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Token révoqué"
+        verbose_name_plural = "Tokens révoqués"
+    
+    def __str__(self):
+        return f"{self.token_type} {self.jti} (expire le {self.expires_at:%d/%m/%Y %H:%M})"
+    
+    @classmethod
+    def active_jtis(cls):
+        """jti des tokens révoqués non encore expirés"""
+        return cls.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True)
+    
+    @classmethod
+    def purge_expired(cls):
+        """Supprime les révocations de tokens expirés, retourne le nombre de lignes supprimées"""
+        deleted, _ = cls.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """Invalide l'utilisateur mis en cache par JWTAuthentication"""
+    # Import local : jwt_auth dépend de ce module (RevokedToken)
+    from auth_api.jwt_auth import invalidate_cached_user
+    invalidate_cached_user(instance.pk)
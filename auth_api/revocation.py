@@ -0,0 +1,123 @@
+"""
+Révocation des tokens JWT.
+
+Les jti révoqués sont stockés en base (RevokedToken) jusqu'à l'expiration du token.
+Chaque worker garde un filtre de Bloom de ces jti, reconstruit périodiquement :
+le cas courant (« non révoqué ») ne coûte aucune I/O, seuls les positifs
+(vrais ou faux) sont confirmés en base.
+"""
+import datetime
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+from auth_api.models import RevokedToken
+
+
+def generate_jti():
+    """Identifiant de token sans collision (UUID4)"""
+    return uuid.uuid4().hex
+
+
+def revocation_setting(name, default):
+    return getattr(settings, 'JWT_SETTINGS', {}).get(name, default)
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom (double hachage sur blake2b) : aucun faux négatif,
+    taux de faux positifs proche de `error_rate` jusqu'à `capacity` éléments.
+    """
+    
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+    
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationList:
+    """
+    Liste de révocation locale au processus.
+
+    Une révocation faite par un autre worker est prise en compte au plus tard
+    après REVOCATION_REFRESH_SECONDS (reconstruction du filtre).
+    """
+    
+    def __init__(self):
+        self._bloom = None
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _refresh_if_stale(self):
+        interval = revocation_setting('REVOCATION_REFRESH_SECONDS', 30)
+        if self._bloom is not None and time.monotonic() - self._refreshed_at < interval:
+            return
+        with self._lock:
+            if self._bloom is not None and time.monotonic() - self._refreshed_at < interval:
+                return
+            jtis = list(RevokedToken.active_jtis())
+            bloom = BloomFilter(
+                max(revocation_setting('REVOCATION_BLOOM_CAPACITY', 100000), 2 * len(jtis)),
+                revocation_setting('REVOCATION_BLOOM_ERROR_RATE', 0.01)
+            )
+            for jti in jtis:
+                bloom.add(jti)
+            # Remplacement atomique : les lectures concurrentes voient l'ancien ou le nouveau filtre
+            self._bloom = bloom
+            self._refreshed_at = time.monotonic()
+    
+    def is_revoked(self, jti):
+        """True si le jti est révoqué (aucune requête tant que le filtre répond « absent »)"""
+        if not jti:
+            return False
+        self._refresh_if_stale()
+        bloom = self._bloom
+        if bloom is not None and jti not in bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+    
+    def revoke(self, payload, user=None):
+        """Révoque le token décrit par `payload` jusqu'à son expiration"""
+        jti = payload.get('jti')
+        exp = payload.get('exp')
+        if not jti or not exp:
+            return False
+        RevokedToken.objects.get_or_create(
+            jti=jti,
+            defaults={
+                'user': user,
+                'token_type': payload.get('type', 'access'),
+                'expires_at': datetime.datetime.fromtimestamp(exp, tz=datetime.timezone.utc),
+            }
+        )
+        self._refresh_if_stale()
+        bloom = self._bloom
+        if bloom is not None:
+            bloom.add(jti)
+        return True
+    
+    def reset(self):
+        """Force la reconstruction du filtre au prochain contrôle"""
+        self._bloom = None
+
+
+revocation_list = RevocationList()
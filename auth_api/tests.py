@@ -1,17 +1,20 @@
 import json
 import jwt
 from datetime import datetime, timedelta
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.conf import settings
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
 from unittest.mock import patch, MagicMock
 
 from auth_api.auth_serializer import AuthSerializer
-from auth_api.jwt_auth import JWTAuthentication, generate_tokens, refresh_access_token
+from auth_api.jwt_auth import JWTAuthentication, generate_tokens, refresh_access_token, user_cache, token_cache
+from auth_api.revocation import BloomFilter, generate_jti
 from auth_api.views import AuthViewSet
+from my_frais.throttling import get_bucket_backend
 
 
 class AuthSerializerTestCase(TestCase):
@@ -176,6 +179,56 @@ class JWTAuthenticationTestCase(TestCase):
         
         with self.assertRaises(Exception):
             refresh_access_token(invalid_token)
+    
+    def test_jti_unique(self):
+        """Test que les jti générés ne se répètent pas"""
+        jtis = {generate_jti() for _ in range(1000)}
+        self.assertEqual(len(jtis), 1000)
+        
+        access_token, refresh_token = generate_tokens(self.user)
+        access_payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
+        refresh_payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=['HS256'])
+        self.assertNotEqual(access_payload['jti'], refresh_payload['jti'])
+    
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Test du filtre de Bloom : tous les éléments ajoutés sont retrouvés"""
+        bloom = BloomFilter(1000, 0.01)
+        values = [generate_jti() for _ in range(1000)]
+        for value in values:
+            bloom.add(value)
+        
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(generate_jti() in bloom for _ in range(1000))
+        self.assertLess(false_positives, 50)
+    
+    def test_authentication_cached_without_queries(self):
+        """Test qu'une authentification répétée ne fait aucune requête"""
+        user_cache.clear()
+        token_cache.clear()
+        access_token, _ = generate_tokens(self.user)
+        request = MagicMock()
+        request.headers = {'Authorization': f'Bearer {access_token}'}
+        
+        self.authentication.authenticate(request)
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate(request)
+        self.assertEqual(user.id, self.user.id)
+    
+    def test_user_cache_invalidated_on_save_and_delete(self):
+        """Test de l'invalidation du cache à la modification et à la suppression"""
+        access_token, _ = generate_tokens(self.user)
+        request = MagicMock()
+        request.headers = {'Authorization': f'Bearer {access_token}'}
+        self.authentication.authenticate(request)
+        
+        self.user.first_name = 'Modifié'
+        self.user.save()
+        user, _ = self.authentication.authenticate(request)
+        self.assertEqual(user.first_name, 'Modifié')
+        
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate(request)
 
 
 class AuthViewSetTestCase(APITestCase):
@@ -191,6 +244,7 @@ class AuthViewSetTestCase(APITestCase):
             first_name='Test',
             last_name='User'
         )
+        get_bucket_backend().reset()
     
     def test_login_success(self):
         """Test de connexion réussie"""
@@ -221,6 +275,52 @@ class AuthViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('non_field_errors', response.data)
     
+    @override_settings(RATE_LIMIT_SETTINGS={'RATES': {'login': {'capacity': 2, 'per_minute': 1, 'key': 'ip'}}})
+    def test_login_rate_limited(self):
+        """Test de la limitation des tentatives de connexion par IP"""
+        url = reverse('auth-login')
+        data = {'username': 'testuser@example.com', 'password': 'mauvais'}
+        
+        for _ in range(2):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        
+        # Une autre adresse IP a son propre seau
+        response = self.client.post(url, data, format='json', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @override_settings(RATE_LIMIT_SETTINGS={'RATES': {'login': {'capacity': 2, 'per_minute': 1, 'key': 'ip'}}})
+    def test_login_rate_limit_ignores_spoofed_forwarded_for(self):
+        """Test : un X-Forwarded-For fourni par le client ne donne pas un nouveau seau"""
+        url = reverse('auth-login')
+        data = {'username': 'testuser@example.com', 'password': 'mauvais'}
+        
+        for index in range(2):
+            response = self.client.post(url, data, format='json', HTTP_X_FORWARDED_FOR=f'1.1.1.{index}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(url, data, format='json', HTTP_X_FORWARDED_FOR='2.2.2.2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    @override_settings(RATE_LIMIT_SETTINGS={'NUM_PROXIES': 1,
+                                            'RATES': {'login': {'capacity': 1, 'per_minute': 1, 'key': 'ip'}}})
+    def test_login_rate_limit_behind_trusted_proxy(self):
+        """Test : derrière un proxy de confiance, seule l'adresse qu'il ajoute est retenue"""
+        url = reverse('auth-login')
+        data = {'username': 'testuser@example.com', 'password': 'mauvais'}
+        
+        response = self.client.post(url, data, format='json', HTTP_X_FORWARDED_FOR='9.9.9.9, 1.1.1.1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Entrée de gauche falsifiée : même client pour le proxy
+        response = self.client.post(url, data, format='json', HTTP_X_FORWARDED_FOR='8.8.8.8, 1.1.1.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(url, data, format='json', HTTP_X_FORWARDED_FOR='1.1.1.2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
     def test_login_missing_fields(self):
         """Test de connexion avec champs manquants"""
         url = reverse('auth-login')
@@ -382,6 +482,24 @@ class AuthViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('message', response.data)
     
+    def test_logout_revokes_tokens(self):
+        """Test que la déconnexion révoque les tokens d'accès et de rafraîchissement"""
+        login_response = self.client.post(reverse('auth-login'), {
+            'username': 'testuser@example.com',
+            'password': 'testpassword123'
+        }, format='json')
+        access_token = login_response.data['access_token']
+        refresh_token = login_response.data['refresh_token']
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        response = self.client.post(reverse('auth-logout'), {'refresh_token': refresh_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.get(reverse('auth-profile'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with self.assertRaises(AuthenticationFailed):
+            refresh_access_token(refresh_token)
+    
     def test_profile_success(self):
         """Test de récupération du profil utilisateur"""
         # D'abord se connecter
@@ -426,6 +544,7 @@ class AuthIntegrationTestCase(APITestCase):
     def setUp(self):
         """Configuration initiale pour chaque test"""
         self.client = APIClient()
+        get_bucket_backend().reset()
     
     def test_complete_auth_flow(self):
         """Test d'un flux d'authentification complet"""
@@ -6,15 +6,16 @@ from rest_framework.permissions import AllowAny
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from auth_api.auth_serializer import AuthSerializer
-from auth_api.jwt_auth import generate_tokens, refresh_access_token
+from auth_api.jwt_auth import generate_tokens, refresh_access_token, revoke_token
 from my_frais.logging_service import app_logger
+from my_frais.throttling import LoginRateThrottle, RegisterRateThrottle
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
 class AuthViewSet(viewsets.ViewSet):
     
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], throttle_classes=[LoginRateThrottle])
     def login(self, request):
         """Connexion avec génération de tokens JWT"""
         try:
@@ -89,7 +90,7 @@ class AuthViewSet(viewsets.ViewSet):
             
             return Response({'message': 'Erreur interne du serveur.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], throttle_classes=[RegisterRateThrottle])
     def register(self, request):
         """Inscription avec génération automatique de tokens JWT"""
         try:
@@ -206,8 +207,13 @@ class AuthViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['post'])
     def logout(self, request):
-        """Déconnexion (sans blacklist pour simplifier)"""
+        """Déconnexion : révocation du token d'accès (et du token de rafraîchissement s'il est fourni)"""
         try:
+            revoke_token(request.auth, request.user)
+            refresh_token = request.data.get('refresh_token')
+            if refresh_token:
+                revoke_token(refresh_token, request.user)
+            
             print(f"✅ SUCCÈS LOGOUT - Utilisateur déconnecté: {request.user.username} (ID: {request.user.id})")
             
             # Log de la déconnexion
@@ -219,8 +225,6 @@ class AuthViewSet(viewsets.ViewSet):
                 details={'username': request.user.username}
             )
             
-            # Note: Pour une implémentation complète, vous pourriez ajouter
-            # une table de blacklist pour les tokens révoqués
             return Response({'message': 'Déconnexion réussie'}, status=status.HTTP_200_OK)
         except Exception as e:
             print(f"❌ ERREUR LOGOUT - Exception: {str(e)}")
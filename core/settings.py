@@ -65,6 +65,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'my_frais.middleware.LoggingMiddleware',
+    # Profilage SQL sur demande (QUERY_PROFILER_SETTINGS), après LoggingMiddleware
+    'my_frais.middleware.QueryProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -110,6 +112,107 @@ MONGODB_CONFIG = {
     'username': os.getenv('MONGODB_USERNAME'),
     'password': os.getenv('MONGODB_PASSWORD'),
     'auth_source': os.getenv('MONGODB_AUTH_SOURCE'),
+    # Délais courts (ms) : MongoDB indisponible ne doit pas bloquer l'application
+    'server_selection_timeout_ms': 2000,
+    'connect_timeout_ms': 2000,
+    'socket_timeout_ms': 5000,
+    # Disjoncteur : ouverture après N échecs consécutifs, nouvel essai après X secondes
+    'breaker_failure_threshold': 3,
+    'breaker_reset_timeout': 30,
+    # Index des collections de logs vérifiés au premier appel de chaque processus
+    'ensure_indexes': True,
+    # En cas d'échec (droits, conflit de nom), nouvel essai après N secondes ; l'appel n'est jamais bloqué
+    'ensure_indexes_retry_seconds': 300,
+    # Rétention (jours) appliquée par MongoDB via un index TTL sur timestamp (None : conservation illimitée)
+    'retention_days': {
+        'auth_events': 180,
+        'crud_events': 365,
+        'errors': 90,
+        'business_events': 90,
+        # Agrégats horaires (my_frais.log_rollups)
+        'rollups': 400,
+    },
+}
+
+# Écriture des logs MongoDB (my_frais.log_writer) : en file, par lots, hors requête
+LOG_WRITER_SETTINGS = {
+    'ASYNC': True,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,  # secondes
+    'SHUTDOWN_TIMEOUT': 5.0,
+}
+
+# Agrégats des logs (my_frais.log_rollups) : erreurs par heure, empreintes d'erreurs,
+# échecs d'authentification par IP, durées des requêtes lentes par chemin
+LOG_ROLLUP_SETTINGS = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 10.0,  # secondes
+    'MAX_PENDING_KEYS': 10000,
+}
+
+# Schéma des documents de logs (my_frais.log_schema) : 2 = compact (utilisateur et user agent par
+# référence, différences champ par champ pour le CRUD, valeurs tronquées), 1 = format d'origine
+LOG_SCHEMA_SETTINGS = {
+    'VERSION': 2,
+    'MAX_STRING_LENGTH': 256,
+    'MAX_LIST_ITEMS': 20,
+    'MAX_DEPTH': 4,
+    'MAX_TRACEBACK_LENGTH': 8000,
+}
+
+# Regroupement des erreurs par empreinte (ApplicationLogger.log_error) : première occurrence écrite
+# en entier, les suivantes de la fenêtre seulement comptées (rollup_error_fingerprints)
+ERROR_LOG_SETTINGS = {
+    'DEDUP_WINDOW': 300,  # secondes, 0 pour tout écrire
+    'SAMPLE_RATE': 0.0,  # proportion d'occurrences regroupées écrites malgré tout
+    'MAX_FINGERPRINTS': 5000,
+}
+
+# Métriques des requêtes exposées sur /metrics (my_frais.metrics) ; avec plusieurs workers gunicorn,
+# DIRECTORY (partagé, vidé au déploiement) permet d'additionner les compteurs de tous les workers
+METRICS_SETTINGS = {
+    'ENABLED': True,
+    'DIRECTORY': os.getenv('METRICS_DIR') or None,
+    'WRITE_INTERVAL': 5.0,  # secondes
+    # Jeton Bearer exigé par /metrics ; sans jeton, seules les requêtes locales sont acceptées
+    'TOKEN': os.getenv('METRICS_TOKEN') or None,
+}
+
+# Profilage SQL par requête (my_frais.query_profiler) : nombre, durée, gabarits répétés (N+1)
+# en en-têtes X-Query-* ; pour le staff avec l'en-tête X-Profile-Queries: 1, ou toujours si ENABLED
+QUERY_PROFILER_SETTINGS = {
+    'ENABLED': os.getenv('QUERY_PROFILER_ENABLED', 'False') == 'True',
+    'HEADER': 'X-Profile-Queries',
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'TOP_TEMPLATES': 5,
+}
+
+# Destinations des logs applicatifs (my_frais.log_sinks), routées par collection :
+# MongoLogSink, JsonlFileLogSink (rotation), RingBufferLogSink (mémoire), NullLogSink
+LOG_SINKS = {
+    'SINKS': {
+        'mongo': {'BACKEND': 'my_frais.log_sinks.MongoLogSink'},
+        # 'file': {'BACKEND': 'my_frais.log_sinks.JsonlFileLogSink',
+        #          'OPTIONS': {'path': '/var/log/mes_frais/events.jsonl', 'max_bytes': 50 * 1024 * 1024, 'backup_count': 5}},
+    },
+    # Ex. : {'errors': ['mongo', 'file'], 'crud_events': ['file'], 'default': ['mongo']}
+    'ROUTES': {
+        'default': ['mongo'],
+    },
+}
+
+# Spool local (my_frais.log_spool) des logs que MongoDB n'a pas pu recevoir (panne, file pleine),
+# rejoué automatiquement ; désactivé si DIRECTORY est vide (logs perdus et comptés)
+LOG_SPOOL_SETTINGS = {
+    'DIRECTORY': os.getenv('LOG_SPOOL_DIR'),
+    'SEGMENT_MAX_BYTES': 8 * 1024 * 1024,
+    'QUOTA_BYTES': 512 * 1024 * 1024,
+    'FSYNC_EVERY': 100,  # fsync groupé : tous les N logs...
+    'FSYNC_INTERVAL': 1.0,  # ... ou toutes les X secondes
+    'REPLAY_INTERVAL': 10.0,
+    'REPLAY_BATCH_SIZE': 500,
+    'CLAIM_TIMEOUT': 300,  # segment réservé par un worker disparu, repris après X secondes
 }
 
 # Password validation
@@ -175,4 +278,42 @@ JWT_SETTINGS = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ALGORITHM': 'HS256',
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Cache local des utilisateurs authentifiés (secondes / nombre d'entrées)
+    'USER_CACHE_TTL': 60,
+    'USER_CACHE_SIZE': 1024,
+    # Cache des tokens décodés (conservés jusqu'à leur expiration)
+    'TOKEN_CACHE_SIZE': 4096,
+    # Journaliser chaque authentification réussie (INFO)
+    'LOG_SUCCESS': False,
+    # Révocation : reconstruction du filtre de Bloom local (secondes) et dimensionnement
+    'REVOCATION_REFRESH_SECONDS': 30,
+    'REVOCATION_BLOOM_CAPACITY': 100000,
+    'REVOCATION_BLOOM_ERROR_RATE': 0.01,
+}
+
+# Limitation de débit par seau à jetons (my_frais.throttling)
+# capacity : rafale maximale, per_minute : jetons regagnés par minute,
+# key : 'ip', 'user' ou 'user_ip' (les anonymes sont toujours limités par IP)
+RATE_LIMIT_SETTINGS = {
+    'ENABLED': True,
+    # 'my_frais.throttling.CacheBucketBackend' pour partager les seaux entre workers
+    'BACKEND': 'my_frais.throttling.InProcessBucketBackend',
+    'CACHE_ALIAS': 'default',
+    'MAX_BUCKETS': 10000,
+    # Nombre de proxies de confiance (reverse proxy, load balancer) ajoutant X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('RATE_LIMIT_NUM_PROXIES', '0')),
+    'RATES': {
+        'login': {'capacity': 10, 'per_minute': 5, 'key': 'ip'},
+        'register': {'capacity': 5, 'per_minute': 2, 'key': 'ip'},
+        'projection_compute': {'capacity': 10, 'per_minute': 20, 'key': 'user'},
+        'dashboard': {'capacity': 20, 'per_minute': 60, 'key': 'user'},
+    },
+}
+
+# Synchronisation différentielle (endpoint sync/)
+SYNC_SETTINGS = {
+    'PAGE_SIZE': 200,
+    'MAX_PAGE_SIZE': 1000,
+    'CURSOR_GRACE_SECONDS': 5,
+    'TOMBSTONE_RETENTION_DAYS': 90,
 }
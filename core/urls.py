@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from my_frais.metrics import metrics_view
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('admin/mongodb-logs/', include('my_frais.admin_urls')),
     path('admin/', admin.site.urls),
     path('api/v1/', include('auth_api.urls')),
@@ -2,9 +2,11 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.contrib.admin import AdminSite
+from django.db import transaction
+from django.utils import timezone
 
 # Ajoute les models de models.py
-from my_frais.models import Account, Operation, DirectDebit, RecurringIncome, BudgetProjection, AutomatedTask, AutomaticTransaction
+from my_frais.models import Account, Operation, DirectDebit, RecurringIncome, BudgetProjection, AutomatedTask, AutomaticTransaction, SyncChange
 
 
 # ozdjuzndzndzun
@@ -38,12 +40,22 @@ class AccountAdmin(BaseModelAdmin):
         ('Informations du compte', {
             'fields': ('user', 'nom', 'solde')
         }),
+        ('Activité', {
+            'fields': ('operations_count', 'last_operation_at', 'active_debits_count', 'active_incomes_count'),
+            'classes': ('collapse',)
+        }),
         ('Métadonnées', {
             'fields': ('created_by', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
+    def get_readonly_fields(self, request, obj=None):
+        """Les compteurs sont maintenus automatiquement"""
+        return super().get_readonly_fields(request, obj) + (
+            'operations_count', 'last_operation_at', 'active_debits_count', 'active_incomes_count'
+        )
+    
     def solde_formatted(self, obj):
         """Formatage du solde avec couleur selon le montant"""
         color = 'green' if obj.solde >= 0 else 'red'
@@ -57,10 +69,11 @@ class AccountAdmin(BaseModelAdmin):
     
     def nombre_operations(self, obj):
         """Compte le nombre d'opérations liées au compte"""
-        count = obj.operations.count()
+        count = obj.operations_count
         url = reverse('admin:my_frais_operation_changelist') + f'?compte_reference__id__exact={obj.id}'
         return format_html('<a href="{}">{} opération(s)</a>', url, count)
     nombre_operations.short_description = 'Opérations'
+    nombre_operations.admin_order_field = 'operations_count'
 
 
 @admin.register(Operation)
@@ -158,13 +171,21 @@ class DirectDebitAdmin(OperationAdmin):
     
     def activer_prelevements(self, request, queryset):
         """Action pour activer plusieurs prélèvements"""
-        updated = queryset.update(actif=True)
+        with transaction.atomic():
+            account_ids = list(queryset.order_by().values_list('compte_reference_id', flat=True).distinct())
+            updated = queryset.update(actif=True, updated_at=timezone.now())
+            SyncChange.record_updated(queryset)
+            Account.rebuild_counters(account_ids)
         self.message_user(request, f'{updated} prélèvement(s) activé(s) avec succès.')
     activer_prelevements.short_description = "Activer les prélèvements sélectionnés"
     
     def desactiver_prelevements(self, request, queryset):
         """Action pour désactiver plusieurs prélèvements"""
-        updated = queryset.update(actif=False)
+        with transaction.atomic():
+            account_ids = list(queryset.order_by().values_list('compte_reference_id', flat=True).distinct())
+            updated = queryset.update(actif=False, updated_at=timezone.now())
+            SyncChange.record_updated(queryset)
+            Account.rebuild_counters(account_ids)
         self.message_user(request, f'{updated} prélèvement(s) désactivé(s) avec succès.')
     desactiver_prelevements.short_description = "Désactiver les prélèvements sélectionnés"
 
@@ -2,30 +2,55 @@
 Service pour afficher les logs MongoDB dans l'admin Django
 """
 from my_frais.mongodb_service import mongodb_service
+from my_frais.log_rollups import LogRollupService
+from my_frais.log_schema import UserAgentTable, schema_version
+from django.contrib.auth.models import User
 from django.utils import timezone
+from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+import base64
 import json
 
 
 class MongoDBLogService:
     """Service pour gérer l'affichage des logs MongoDB dans l'admin"""
     
+    # Champs affichés dans les listes ; les blobs de détail sont chargés à la demande (get_log_detail)
+    LIST_PROJECTION = {
+        'timestamp': 1, 'event_type': 1, 'category': 1, 'success': 1,
+        'user_info.user_id': 1, 'user_info.username': 1,
+        'request_info.method': 1, 'request_info.path': 1, 'request_info.ip_address': 1,
+        'model_name': 1, 'object_id': 1, 'error_type': 1, 'error_message': 1,
+        'fingerprint': 1, 'suppressed_occurrences': 1,
+    }
+    DETAIL_FIELDS = ('details', 'changes', 'old_data', 'new_data', 'context', 'error_traceback')
+    MAX_PAGE_SIZE = 200
+    # Collections de la chronologie d'un utilisateur
+    TIMELINE_COLLECTIONS = ('auth_events', 'crud_events', 'business_events')
+    
     @staticmethod
     def get_logs_summary() -> Dict[str, int]:
-        """Récupère un résumé des logs par collection"""
+        """Récupère un résumé des logs par collection (estimation sur métadonnées, sans parcours)"""
         collections = ['auth_events', 'crud_events', 'errors', 'business_events']
         summary = {}
         
         for collection in collections:
-            try:
-                count = mongodb_service.db[collection].count_documents({})
-                summary[collection] = count
-            except Exception:
-                summary[collection] = 0
+            summary[collection] = mongodb_service.estimated_count(collection)
         
         return summary
     
+    @staticmethod
+    def get_analytics() -> Dict[str, Any]:
+        """Agrégats du tableau de bord (cf. log_rollups) sur les dernières 24 heures"""
+        return {
+            'errors_per_hour': LogRollupService.errors_per_hour(),
+            'top_errors': LogRollupService.top_error_fingerprints(),
+            'auth_failures': LogRollupService.auth_failures_by_ip(),
+            'slow_endpoints': LogRollupService.slow_endpoints(),
+        }
+    
     @staticmethod
     def get_recent_logs(collection: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Récupère les logs récents d'une collection"""
@@ -35,6 +60,85 @@ class MongoDBLogService:
         except Exception:
             return []
     
+    @staticmethod
+    def encode_cursor(log: Dict[str, Any]) -> str:
+        """Curseur opaque (timestamp, _id) d'un log"""
+        raw = f"{log['timestamp'].isoformat()}|{log['_id']}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+        """Retourne (timestamp, _id) ; ValueError si le curseur est invalide"""
+        try:
+            timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(timestamp), ObjectId(log_id)
+        except (ValueError, UnicodeDecodeError, TypeError, InvalidId) as e:
+            raise ValueError("Curseur invalide") from e
+    
+    @classmethod
+    def get_logs_page(cls, collection: str, limit: int = 50, after: Optional[str] = None,
+                      before: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Page de logs formatés pour les listes de l'admin (champs de LIST_PROJECTION seulement),
+        avec les curseurs des pages suivante (plus anciens) et précédente (plus récents)
+        """
+        limit = max(1, min(limit, cls.MAX_PAGE_SIZE))
+        after_key = cls.decode_cursor(after) if after else None
+        before_key = cls.decode_cursor(before) if before else None
+        
+        # Un log de plus pour savoir s'il existe une page au-delà
+        logs = mongodb_service.find_logs_page(
+            collection, limit=limit + 1, after=after_key, before=before_key, projection=cls.LIST_PROJECTION
+        )
+        has_more = len(logs) > limit
+        if before_key is not None:
+            logs = logs[-limit:]
+            has_newer, has_older = has_more, True
+        else:
+            logs = logs[:limit]
+            has_newer, has_older = after_key is not None, has_more
+        
+        formatted = cls.format_logs(logs)
+        if collection == 'errors':
+            # Total des occurrences de chaque erreur (y compris celles regroupées, non écrites)
+            stats = LogRollupService.fingerprint_stats([log['fingerprint'] for log in logs if log.get('fingerprint')])
+            for log in formatted:
+                log['fingerprint_stats'] = stats.get(log.get('fingerprint'))
+        
+        return {
+            'logs': formatted,
+            'next_cursor': cls.encode_cursor(logs[-1]) if logs and has_older else None,
+            'prev_cursor': cls.encode_cursor(logs[0]) if logs and has_newer else None,
+        }
+    
+    @classmethod
+    def get_log_detail(cls, collection: str, log_id: str) -> Optional[Dict[str, Any]]:
+        """Blobs de détail d'un log, formatés (None si le log est introuvable)"""
+        try:
+            log = mongodb_service.get_log(collection, ObjectId(log_id))
+        except InvalidId:
+            return None
+        if log is None:
+            return None
+        detail = {'log_id': str(log['_id'])}
+        for field in cls.DETAIL_FIELDS:
+            value = log.get(field)
+            if value:
+                detail[f'{field}_display'] = (
+                    value if isinstance(value, str) else json.dumps(value, indent=2, ensure_ascii=False, default=str)
+                )
+        
+        request_info = log.get('request_info') or {}
+        if schema_version(log) >= 2 and request_info.get('ua'):
+            # Schéma compact : user agent stocké une seule fois, par empreinte
+            rows = mongodb_service.aggregate(UserAgentTable.COLLECTION, [{'$match': {'_id': request_info['ua']}}])
+            user_agent = rows[0].get('user_agent') if rows else None
+        else:
+            user_agent = request_info.get('user_agent')
+        if user_agent:
+            detail['user_agent_display'] = user_agent
+        return detail
+    
     @staticmethod
     def get_logs_by_date_range(collection: str, start_date: datetime, end_date: datetime, limit: int = 100) -> List[Dict[str, Any]]:
         """Récupère les logs dans une plage de dates"""
@@ -52,16 +156,46 @@ class MongoDBLogService:
     
     @staticmethod
     def get_logs_by_user(user_id: int, limit: int = 100) -> List[Dict[str, Any]]:
-        """Récupère les logs d'un utilisateur spécifique"""
+        """Récupère les logs d'un utilisateur spécifique (authentification, CRUD, métier), les plus récents d'abord"""
         try:
             filter_dict = {'user_info.user_id': user_id}
-            logs = mongodb_service.find_logs('auth_events', filter_dict, limit)
-            logs.extend(mongodb_service.find_logs('crud_events', filter_dict, limit))
-            logs.extend(mongodb_service.find_logs('business_events', filter_dict, limit))
-            return sorted(logs, key=lambda x: x.get('timestamp', datetime.min), reverse=True)
+            return mongodb_service.find_timeline(list(MongoDBLogService.TIMELINE_COLLECTIONS), filter_dict, limit)
         except Exception:
             return []
     
+    @classmethod
+    def get_user_timeline(cls, user_id: int, limit: int = 50, cursor: Optional[str] = None,
+                          start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                          categories: Optional[List[str]] = None,
+                          collections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Chronologie paginée (curseur) des logs d'un utilisateur, toutes collections fusionnées,
+        filtrable par plage de dates et par catégorie
+        """
+        limit = max(1, min(limit, cls.MAX_PAGE_SIZE))
+        filter_dict = {'user_info.user_id': user_id}
+        if start_date or end_date:
+            filter_dict['timestamp'] = {}
+            if start_date:
+                filter_dict['timestamp']['$gte'] = start_date
+            if end_date:
+                filter_dict['timestamp']['$lte'] = end_date
+        if categories:
+            filter_dict['category'] = {'$in': list(categories)}
+        
+        logs = mongodb_service.find_timeline(
+            list(collections or cls.TIMELINE_COLLECTIONS), filter_dict, limit + 1,
+            after=cls.decode_cursor(cursor) if cursor else None,
+            projection=cls.LIST_PROJECTION
+        )
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+        
+        return {
+            'logs': cls.format_logs(logs),
+            'next_cursor': cls.encode_cursor(logs[-1]) if has_more else None,
+        }
+    
     @staticmethod
     def get_error_logs(limit: int = 100) -> List[Dict[str, Any]]:
         """Récupère les logs d'erreurs"""
@@ -71,11 +205,40 @@ class MongoDBLogService:
         except Exception:
             return []
     
+    @classmethod
+    def format_logs(cls, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Formate une liste de logs des deux versions du schéma : en schéma compact (2),
+        les noms d'utilisateur sont résolus en une requête
+        """
+        user_ids = {
+            (log.get('user_info') or {}).get('user_id') for log in logs
+            if schema_version(log) >= 2 and 'username' not in (log.get('user_info') or {})
+        }
+        user_ids.discard(None)
+        usernames = dict(User.objects.filter(id__in=user_ids).values_list('id', 'username')) if user_ids else {}
+        
+        formatted_logs = []
+        for log in logs:
+            user_info = log.get('user_info')
+            if schema_version(log) >= 2 and user_info is not None and 'username' not in user_info:
+                user_id = user_info.get('user_id')
+                log = {**log, 'user_info': {
+                    **user_info,
+                    'username': usernames.get(user_id, 'utilisateur supprimé') if user_id else 'anonymous',
+                }}
+            formatted_logs.append(cls.format_log_for_display(log))
+        return formatted_logs
+    
     @staticmethod
     def format_log_for_display(log: Dict[str, Any]) -> Dict[str, Any]:
         """Formate un log pour l'affichage dans l'admin"""
         formatted = log.copy()
         
+        # Les templates et JsonResponse ne manipulent pas les ObjectId (ni les attributs préfixés par _)
+        if '_id' in formatted:
+            formatted['log_id'] = str(formatted.pop('_id'))
+        
         # Formater le timestamp
         if 'timestamp' in formatted:
             if isinstance(formatted['timestamp'], datetime):
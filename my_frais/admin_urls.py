@@ -8,7 +8,8 @@ from .admin_views import (
     logs_crud_events,
     logs_errors,
     logs_business_events,
-    LogsAPIView
+    LogsAPIView,
+    UserTimelineAPIView
 )
 
 app_name = 'mongodb_logs'
@@ -19,5 +20,6 @@ urlpatterns = [
     path('crud/', logs_crud_events, name='crud'),
     path('errors/', logs_errors, name='errors'),
     path('business/', logs_business_events, name='business'),
+    path('api/users/<int:user_id>/timeline/', UserTimelineAPIView.as_view(), name='user_timeline'),
     path('api/<str:collection>/', LogsAPIView.as_view(), name='api'),
 ] 
\ No newline at end of file
@@ -8,6 +8,7 @@ from django.utils.decorators import method_decorator
 from django.views import View
 from django.contrib import messages
 from my_frais.admin_services import MongoDBLogService
+from my_frais.mongodb_service import mongodb_service
 from datetime import datetime, timedelta
 import json
 
@@ -25,15 +26,17 @@ def logs_dashboard(request):
         recent_crud = MongoDBLogService.get_recent_logs('crud_events', 10)
         
         # Formater les logs pour l'affichage
-        recent_auth = [MongoDBLogService.format_log_for_display(log) for log in recent_auth]
-        recent_errors = [MongoDBLogService.format_log_for_display(log) for log in recent_errors]
-        recent_crud = [MongoDBLogService.format_log_for_display(log) for log in recent_crud]
+        recent_auth = MongoDBLogService.format_logs(recent_auth)
+        recent_errors = MongoDBLogService.format_logs(recent_errors)
+        recent_crud = MongoDBLogService.format_logs(recent_crud)
         
         context = {
             'summary': summary,
             'recent_auth': recent_auth,
             'recent_errors': recent_errors,
             'recent_crud': recent_crud,
+            'analytics': MongoDBLogService.get_analytics(),
+            'mongodb_stats': mongodb_service.stats(),
             'title': 'Tableau de bord des logs MongoDB'
         }
         
@@ -44,26 +47,21 @@ def logs_dashboard(request):
         return render(request, 'admin/mongodb_logs/error.html', {'error': str(e)})
 
 
-@staff_member_required
-def logs_auth_events(request):
-    """Page des logs d'authentification"""
+def render_logs_list(request, collection: str, title: str):
+    """Page d'une collection de logs, paginée par curseur (?after= / ?before=)"""
     try:
-        # Paramètres de pagination
         limit = int(request.GET.get('limit', 50))
-        page = int(request.GET.get('page', 1))
-        
-        # Récupérer les logs
-        logs = MongoDBLogService.get_recent_logs('auth_events', limit * page)
-        
-        # Formater les logs
-        formatted_logs = [MongoDBLogService.format_log_for_display(log) for log in logs]
+        page = MongoDBLogService.get_logs_page(
+            collection, limit, after=request.GET.get('after'), before=request.GET.get('before')
+        )
         
         context = {
-            'logs': formatted_logs,
-            'collection': 'auth_events',
-            'title': 'Logs d\'authentification',
+            'logs': page['logs'],
+            'collection': collection,
+            'title': title,
             'limit': limit,
-            'page': page
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
         }
         
         return render(request, 'admin/mongodb_logs/logs_list.html', context)
@@ -73,79 +71,28 @@ def logs_auth_events(request):
         return render(request, 'admin/mongodb_logs/error.html', {'error': str(e)})
 
 
+@staff_member_required
+def logs_auth_events(request):
+    """Page des logs d'authentification"""
+    return render_logs_list(request, 'auth_events', 'Logs d\'authentification')
+
+
 @staff_member_required
 def logs_crud_events(request):
     """Page des logs CRUD"""
-    try:
-        limit = int(request.GET.get('limit', 50))
-        page = int(request.GET.get('page', 1))
-        
-        logs = MongoDBLogService.get_recent_logs('crud_events', limit * page)
-        formatted_logs = [MongoDBLogService.format_log_for_display(log) for log in logs]
-        
-        context = {
-            'logs': formatted_logs,
-            'collection': 'crud_events',
-            'title': 'Logs CRUD',
-            'limit': limit,
-            'page': page
-        }
-        
-        return render(request, 'admin/mongodb_logs/logs_list.html', context)
-        
-    except Exception as e:
-        messages.error(request, f"Erreur lors du chargement des logs: {str(e)}")
-        return render(request, 'admin/mongodb_logs/error.html', {'error': str(e)})
+    return render_logs_list(request, 'crud_events', 'Logs CRUD')
 
 
 @staff_member_required
 def logs_errors(request):
     """Page des logs d'erreurs"""
-    try:
-        limit = int(request.GET.get('limit', 50))
-        page = int(request.GET.get('page', 1))
-        
-        logs = MongoDBLogService.get_recent_logs('errors', limit * page)
-        formatted_logs = [MongoDBLogService.format_log_for_display(log) for log in logs]
-        
-        context = {
-            'logs': formatted_logs,
-            'collection': 'errors',
-            'title': 'Logs d\'erreurs',
-            'limit': limit,
-            'page': page
-        }
-        
-        return render(request, 'admin/mongodb_logs/logs_list.html', context)
-        
-    except Exception as e:
-        messages.error(request, f"Erreur lors du chargement des logs: {str(e)}")
-        return render(request, 'admin/mongodb_logs/error.html', {'error': str(e)})
+    return render_logs_list(request, 'errors', 'Logs d\'erreurs')
 
 
 @staff_member_required
 def logs_business_events(request):
     """Page des logs d'événements métier"""
-    try:
-        limit = int(request.GET.get('limit', 50))
-        page = int(request.GET.get('page', 1))
-        
-        logs = MongoDBLogService.get_recent_logs('business_events', limit * page)
-        formatted_logs = [MongoDBLogService.format_log_for_display(log) for log in logs]
-        
-        context = {
-            'logs': formatted_logs,
-            'collection': 'business_events',
-            'title': 'Logs d\'événements métier',
-            'limit': limit,
-            'page': page
-        }
-        
-        return render(request, 'admin/mongodb_logs/logs_list.html', context)
-        
-    except Exception as e:
-        messages.error(request, f"Erreur lors du chargement des logs: {str(e)}")
-        return render(request, 'admin/mongodb_logs/error.html', {'error': str(e)})
+    return render_logs_list(request, 'business_events', 'Logs d\'événements métier')
 
 
 @method_decorator(staff_member_required, name='dispatch')
@@ -153,17 +100,33 @@ class LogsAPIView(View):
     """Vue API pour les logs (AJAX)"""
     
     def get(self, request, collection):
-        """Récupérer des logs via AJAX"""
+        """Récupérer une page de logs (?after= / ?before=) ou le détail d'un log (?id=) via AJAX"""
+        if collection not in mongodb_service.LOG_COLLECTIONS:
+            return JsonResponse({'success': False, 'error': 'Collection inconnue'}, status=404)
         try:
+            log_id = request.GET.get('id')
+            if log_id:
+                detail = MongoDBLogService.get_log_detail(collection, log_id)
+                if detail is None:
+                    return JsonResponse({'success': False, 'error': 'Log introuvable'}, status=404)
+                return JsonResponse({'success': True, 'log': detail})
+            
             limit = int(request.GET.get('limit', 50))
-            logs = MongoDBLogService.get_recent_logs(collection, limit)
-            formatted_logs = [MongoDBLogService.format_log_for_display(log) for log in logs]
+            page = MongoDBLogService.get_logs_page(
+                collection, limit, after=request.GET.get('after'), before=request.GET.get('before')
+            )
             
             return JsonResponse({
                 'success': True,
-                'logs': formatted_logs
+                **page
             })
             
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+            
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -187,4 +150,48 @@ class LogsAPIView(View):
             return JsonResponse({
                 'success': False,
                 'error': str(e)
-            }, status=500) 
\ No newline at end of file
+            }, status=500)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class UserTimelineAPIView(View):
+    """Vue API de la chronologie des logs d'un utilisateur (AJAX)"""
+    
+    def get(self, request, user_id):
+        """
+        Page de la chronologie : ?cursor=, ?limit=, ?start= / ?end= (dates ISO),
+        ?category= et ?collection= (répétables)
+        """
+        try:
+            collections = request.GET.getlist('collection')
+            unknown = set(collections) - set(mongodb_service.LOG_COLLECTIONS)
+            if unknown:
+                raise ValueError(f"Collection(s) inconnue(s): {', '.join(sorted(unknown))}")
+            start = request.GET.get('start')
+            end = request.GET.get('end')
+            
+            page = MongoDBLogService.get_user_timeline(
+                user_id,
+                limit=int(request.GET.get('limit', 50)),
+                cursor=request.GET.get('cursor'),
+                start_date=datetime.fromisoformat(start) if start else None,
+                end_date=datetime.fromisoformat(end) if end else None,
+                categories=request.GET.getlist('category'),
+                collections=collections,
+            )
+            
+            return JsonResponse({
+                'success': True,
+                **page
+            })
+            
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=500)
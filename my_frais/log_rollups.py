@@ -0,0 +1,294 @@
+"""
+Agrégats des logs tenus à jour au fil de l'écriture (MongoLogSink), lus par le tableau de bord :
+
+- rollup_hourly_events : nombre de logs par collection, event_type et heure (dont échecs)
+- rollup_error_fingerprints : erreurs regroupées par empreinte (cf. ApplicationLogger.log_error), y compris
+  les occurrences non écrites en entier
+- rollup_auth_failures : échecs d'authentification par IP et par heure
+- rollup_request_durations : histogramme des durées par chemin et par heure (requêtes lentes et en erreur)
+
+Les incréments sont cumulés en mémoire puis appliqués par lots ($inc, upsert) au plus
+toutes les FLUSH_INTERVAL secondes ; MongoDB indisponible, ils sont conservés pour le lot suivant.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from pymongo import UpdateOne
+
+from my_frais.mongodb_service import mongodb_service
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LOG_ROLLUP_SETTINGS = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 10.0,
+    # Au-delà, les incréments non écrits (MongoDB indisponible) sont abandonnés
+    'MAX_PENDING_KEYS': 10000,
+}
+
+# Bornes supérieures (secondes) des classes de l'histogramme des durées ; la dernière est ouverte
+DURATION_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 30, 60]
+
+FAILED_AUTH_EVENTS = {'login_failed', 'login_validation_failed'}
+
+_IDENTIFIER = re.compile(r'/\d+(?=/|$)')
+_VARIABLE = re.compile(r"0x[0-9a-fA-F]+|\d+|'[^']*'|\"[^\"]*\"")
+_FRAME = re.compile(r'File "([^"]+)", line \d+, in (\S+)')
+
+
+def log_rollup_setting(name):
+    return getattr(settings, 'LOG_ROLLUP_SETTINGS', {}).get(name, DEFAULT_LOG_ROLLUP_SETTINGS[name])
+
+
+def hour_of(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def normalize_path(path: str) -> str:
+    """/api/v1/accounts/12/ -> /api/v1/accounts/{id}/ (une série par route, pas par objet)"""
+    return _IDENTIFIER.sub('/{id}', path or '')
+
+
+def normalize_message(message: str) -> str:
+    """Message d'erreur sans ses valeurs variables (nombres, adresses, chaînes citées)"""
+    return _VARIABLE.sub('?', message or '')
+
+
+def error_fingerprint(data: Dict[str, Any]) -> str:
+    """
+    Empreinte d'une erreur : celle calculée par ApplicationLogger.log_error, sinon (anciens logs)
+    type, message normalisé et dernière frame du traceback
+    """
+    if data.get('fingerprint'):
+        return data['fingerprint']
+    frames = _FRAME.findall(data.get('error_traceback') or '')
+    location = ':'.join(frames[-1]) if frames else ''
+    raw = f"{data.get('error_type')}|{normalize_message(data.get('error_message'))}|{location}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def duration_bucket(duration: float) -> int:
+    for index, bound in enumerate(DURATION_BUCKETS):
+        if duration <= bound:
+            return index
+    return len(DURATION_BUCKETS)
+
+
+def percentile_from_buckets(buckets: Dict[str, int], percentile: float) -> float:
+    """Percentile estimé (borne supérieure de la classe) ; la classe ouverte renvoie la dernière borne"""
+    counts = [int(buckets.get(str(index), 0)) for index in range(len(DURATION_BUCKETS) + 1)]
+    total = sum(counts)
+    if not total:
+        return 0.0
+    threshold = total * percentile / 100
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= threshold:
+            return float(DURATION_BUCKETS[min(index, len(DURATION_BUCKETS) - 1)])
+    return float(DURATION_BUCKETS[-1])
+
+
+class LogRollups:
+    """Incréments d'agrégats en attente dans le processus courant"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (collection d'agrégat, _id) -> {'$inc': {...}, '$min': {...}, '$max': {...}, '$set': {...}, '$setOnInsert': {...}}
+        self._pending: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._last_flush = time.monotonic()
+        # Collections des documents de référence (upsert), conservés jusqu'à leur écriture
+        self._reference_collections = set()
+        self.counters = {'flushed': 0, 'failed': 0, 'dropped': 0}
+
+    def _update(self, collection: str, key: str, operator: str, values: Dict[str, Any]):
+        update = self._pending.setdefault((collection, key), {})
+        fields = update.setdefault(operator, {})
+        for field, value in values.items():
+            if operator == '$inc':
+                fields[field] = fields.get(field, 0) + value
+            elif operator == '$max':
+                fields[field] = max(fields[field], value) if field in fields else value
+            elif operator == '$min':
+                fields[field] = min(fields[field], value) if field in fields else value
+            else:
+                fields[field] = value
+
+    def record(self, collection: str, documents: List[Dict[str, Any]]):
+        """Cumule les incréments d'un lot de logs"""
+        if not log_rollup_setting('ENABLED'):
+            return
+        with self._lock:
+            for data in documents:
+                timestamp = data.get('timestamp') or datetime.utcnow()
+                hour = hour_of(timestamp)
+                event_type = data.get('event_type') or 'unknown'
+
+                key = f"{collection}|{event_type}|{hour.isoformat()}"
+                self._update('rollup_hourly_events', key, '$setOnInsert',
+                             {'collection': collection, 'event_type': event_type, 'hour': hour})
+                self._update('rollup_hourly_events', key, '$inc',
+                             {'count': 1, 'failures': 1 if data.get('success') is False else 0})
+
+                request_info = data.get('request_info') or {}
+                if collection == 'errors':
+                    fingerprint = error_fingerprint(data)
+                    self._update('rollup_error_fingerprints', fingerprint, '$setOnInsert', {
+                        'error_type': data.get('error_type'),
+                        'error_message': (data.get('error_message') or '')[:500],
+                        'path': normalize_path(request_info.get('path')),
+                    })
+                    self._update('rollup_error_fingerprints', fingerprint, '$inc', {'count': 1})
+                    self._update('rollup_error_fingerprints', fingerprint, '$min', {'first_seen': timestamp})
+                    self._update('rollup_error_fingerprints', fingerprint, '$max', {'last_seen': timestamp})
+
+                if collection == 'auth_events' and event_type in FAILED_AUTH_EVENTS:
+                    ip_address = request_info.get('ip_address') or 'unknown'
+                    key = f"{ip_address}|{hour.isoformat()}"
+                    self._update('rollup_auth_failures', key, '$setOnInsert', {'ip_address': ip_address, 'hour': hour})
+                    self._update('rollup_auth_failures', key, '$inc', {'count': 1})
+
+                duration = (data.get('details') or {}).get('duration')
+                if collection == 'business_events' and isinstance(duration, (int, float)):
+                    path = normalize_path((data.get('details') or {}).get('path') or request_info.get('path'))
+                    key = f"{path}|{hour.isoformat()}"
+                    self._update('rollup_request_durations', key, '$setOnInsert', {'path': path, 'hour': hour})
+                    self._update('rollup_request_durations', key, '$inc', {
+                        'count': 1, 'total_duration': duration, f'buckets.{duration_bucket(duration)}': 1,
+                    })
+                    self._update('rollup_request_durations', key, '$max', {'max_duration': duration})
+
+            overflow = len(self._pending) - log_rollup_setting('MAX_PENDING_KEYS')
+            if overflow > 0:
+                # Agrégats les plus anciens abandonnés ; jamais les documents de référence, que
+                # leur auteur considère déjà comme écrits (ex. user agents des logs v2)
+                evicted = [
+                    pending_key for pending_key in self._pending
+                    if pending_key[0] not in self._reference_collections
+                ][:overflow]
+                for pending_key in evicted:
+                    del self._pending[pending_key]
+                self.counters['dropped'] += len(evicted)
+
+    def upsert(self, collection: str, key: str, fields: Dict[str, Any], timestamp: datetime):
+        """
+        Document de référence (ex. log_user_agents) créé au prochain lot s'il n'existe pas ;
+        jamais abandonné au débordement, il est réessayé jusqu'à son écriture
+        """
+        with self._lock:
+            self._reference_collections.add(collection)
+            self._update(collection, key, '$setOnInsert', fields)
+            self._update(collection, key, '$min', {'first_seen': timestamp})
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= log_rollup_setting('FLUSH_INTERVAL'):
+            self.flush()
+
+    def flush(self) -> bool:
+        """Applique les incréments en attente, un bulk_write par collection d'agrégat"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return True
+
+        by_collection: Dict[str, list] = {}
+        for (collection, key), update in pending.items():
+            by_collection.setdefault(collection, []).append((key, update))
+
+        ok = True
+        for collection, updates in by_collection.items():
+            operations = [UpdateOne({'_id': key}, update, upsert=True) for key, update in updates]
+            if mongodb_service.upsert_many(collection, operations):
+                self.counters['flushed'] += len(operations)
+                continue
+            ok = False
+            self.counters['failed'] += len(operations)
+            # Conservés pour le prochain lot, fusionnés avec les incréments arrivés entre-temps
+            with self._lock:
+                for key, update in updates:
+                    for operator, values in update.items():
+                        self._update(collection, key, operator, values)
+        return ok
+
+
+# Instance globale (une par processus)
+log_rollups = LogRollups()
+
+
+class LogRollupService:
+    """Lectures des agrégats pour le tableau de bord (quelques petites requêtes)"""
+
+    @staticmethod
+    def errors_per_hour(hours: int = 24) -> List[Dict[str, Any]]:
+        since = hour_of(datetime.utcnow()) - timedelta(hours=hours - 1)
+        return mongodb_service.aggregate('rollup_hourly_events', [
+            {'$match': {'collection': 'errors', 'hour': {'$gte': since}}},
+            {'$group': {'_id': '$hour', 'count': {'$sum': '$count'}}},
+            {'$sort': {'_id': 1}},
+            {'$project': {'_id': 0, 'hour': '$_id', 'count': 1}},
+        ])
+
+    @staticmethod
+    def top_error_fingerprints(limit: int = 10) -> List[Dict[str, Any]]:
+        return mongodb_service.aggregate('rollup_error_fingerprints', [
+            {'$sort': {'count': -1}},
+            {'$limit': limit},
+            {'$addFields': {'fingerprint': '$_id'}},
+            {'$project': {'_id': 0}},
+        ])
+
+    @staticmethod
+    def fingerprint_stats(fingerprints: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Occurrences et dernière occurrence de chaque empreinte (une requête)"""
+        if not fingerprints:
+            return {}
+        rows = mongodb_service.aggregate('rollup_error_fingerprints', [
+            {'$match': {'_id': {'$in': list(set(fingerprints))}}},
+            {'$project': {'count': 1, 'first_seen': 1, 'last_seen': 1}},
+        ])
+        return {row.pop('_id'): row for row in rows}
+
+    @staticmethod
+    def auth_failures_by_ip(hours: int = 24, limit: int = 10) -> List[Dict[str, Any]]:
+        since = hour_of(datetime.utcnow()) - timedelta(hours=hours - 1)
+        return mongodb_service.aggregate('rollup_auth_failures', [
+            {'$match': {'hour': {'$gte': since}}},
+            {'$group': {'_id': '$ip_address', 'count': {'$sum': '$count'}}},
+            {'$sort': {'count': -1}},
+            {'$limit': limit},
+            {'$project': {'_id': 0, 'ip_address': '$_id', 'count': 1}},
+        ])
+
+    @staticmethod
+    def slow_endpoints(hours: int = 24, limit: int = 10) -> List[Dict[str, Any]]:
+        """Chemins aux requêtes lentes (> 2 s) ou en erreur les plus fréquentes, avec p50/p95/p99"""
+        since = hour_of(datetime.utcnow()) - timedelta(hours=hours - 1)
+        rows = mongodb_service.aggregate('rollup_request_durations', [
+            {'$match': {'hour': {'$gte': since}}},
+        ])
+        by_path: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            entry = by_path.setdefault(row['path'], {'path': row['path'], 'count': 0, 'total_duration': 0.0,
+                                                     'max_duration': 0.0, 'buckets': {}})
+            entry['count'] += row.get('count', 0)
+            entry['total_duration'] += row.get('total_duration', 0.0)
+            entry['max_duration'] = max(entry['max_duration'], row.get('max_duration', 0.0))
+            for index, count in (row.get('buckets') or {}).items():
+                entry['buckets'][index] = entry['buckets'].get(index, 0) + count
+
+        endpoints = []
+        for entry in sorted(by_path.values(), key=lambda entry: entry['count'], reverse=True)[:limit]:
+            buckets = entry.pop('buckets')
+            entry['avg_duration'] = entry.pop('total_duration') / entry['count'] if entry['count'] else 0.0
+            for percentile in (50, 95, 99):
+                entry[f'p{percentile}'] = percentile_from_buckets(buckets, percentile)
+            endpoints.append(entry)
+        return endpoints
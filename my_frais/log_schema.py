@@ -0,0 +1,121 @@
+"""
+Schéma compact des documents de logs (schema_version 2, cf. settings.LOG_SCHEMA_SETTINGS) :
+
+- utilisateur par référence : user_info = {'user_id'} (nom résolu à l'affichage)
+- requête sans user agent : request_info = {'ip_address', 'method', 'path', 'ua'}, où `ua` est
+  l'empreinte du user agent, dont le texte est stocké une seule fois dans log_user_agents
+- CRUD : différences champ par champ (`changes`) au lieu de old_data / new_data complets
+- valeurs longues tronquées (chaînes, listes, profondeur, traceback)
+
+Les documents sans schema_version sont au format d'origine (1) ; l'admin lit les deux.
+"""
+import hashlib
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from my_frais.log_rollups import log_rollups
+
+
+DEFAULT_LOG_SCHEMA_SETTINGS = {
+    'VERSION': 2,
+    'MAX_STRING_LENGTH': 256,
+    'MAX_LIST_ITEMS': 20,
+    'MAX_DEPTH': 4,
+    'MAX_TRACEBACK_LENGTH': 8000,
+}
+
+TRUNCATION_MARK = '…'
+
+
+def log_schema_setting(name):
+    return getattr(settings, 'LOG_SCHEMA_SETTINGS', {}).get(name, DEFAULT_LOG_SCHEMA_SETTINGS[name])
+
+
+def compact_enabled() -> bool:
+    return log_schema_setting('VERSION') >= 2
+
+
+def schema_version(log: Dict[str, Any]) -> int:
+    return log.get('schema_version', 1)
+
+
+def truncate(value: Any, depth: int = 0) -> Any:
+    """Copie bornée d'une valeur (types non BSON convertis en texte : Decimal, date, UUID...)"""
+    if value is None or isinstance(value, (bool, int, float, datetime)):
+        return value
+    if isinstance(value, date):
+        return value.isoformat()
+    if depth >= log_schema_setting('MAX_DEPTH') and isinstance(value, (dict, list, tuple)):
+        return TRUNCATION_MARK
+    if isinstance(value, dict):
+        return {str(key): truncate(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        max_items = log_schema_setting('MAX_LIST_ITEMS')
+        items = [truncate(item, depth + 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            items.append(f"{TRUNCATION_MARK} {len(value) - max_items} de plus")
+        return items
+    text = value if isinstance(value, str) else str(value)
+    max_length = log_schema_setting('MAX_STRING_LENGTH')
+    return text if len(text) <= max_length else text[:max_length] + TRUNCATION_MARK
+
+
+def truncate_traceback(text: str) -> str:
+    """Garde la fin du traceback (frames les plus proches de l'erreur et message)"""
+    max_length = log_schema_setting('MAX_TRACEBACK_LENGTH')
+    return text if len(text) <= max_length else TRUNCATION_MARK + text[-max_length:]
+
+
+def field_diff(old_data: Optional[Dict[str, Any]], new_data: Optional[Dict[str, Any]]) -> Dict[str, list]:
+    """{champ: [ancienne valeur, nouvelle valeur]} pour les seuls champs modifiés"""
+    old_data = old_data or {}
+    new_data = new_data or {}
+    changes = {}
+    for field in list(old_data) + [field for field in new_data if field not in old_data]:
+        old_value, new_value = old_data.get(field), new_data.get(field)
+        if old_value == new_value:
+            continue
+        # Comparaison texte : Decimal('10.00') avant, '10.00' après sérialisation
+        if old_value is not None and new_value is not None and str(old_value) == str(new_value):
+            continue
+        changes[str(field)] = [truncate(old_value, 1), truncate(new_value, 1)]
+    return changes
+
+
+class UserAgentTable:
+    """Internement des user agents : un document par user agent dans log_user_agents"""
+
+    COLLECTION = 'log_user_agents'
+
+    def __init__(self, max_known: int = 10000):
+        self._lock = threading.Lock()
+        self._known = set()
+        self.max_known = max_known
+
+    @staticmethod
+    def fingerprint(user_agent: str) -> str:
+        return hashlib.sha1(user_agent.encode()).hexdigest()[:16]
+
+    def intern(self, user_agent: Optional[str]) -> Optional[str]:
+        """Empreinte du user agent ; son texte est enregistré (upsert) à la première rencontre du processus"""
+        if not user_agent:
+            return None
+        key = self.fingerprint(user_agent)
+        with self._lock:
+            if key in self._known:
+                return key
+            if len(self._known) >= self.max_known:
+                self._known.clear()
+            self._known.add(key)
+        log_rollups.upsert(self.COLLECTION, key, {'user_agent': user_agent[:1000]}, datetime.utcnow())
+        return key
+
+    def reset(self):
+        with self._lock:
+            self._known.clear()
+
+
+user_agent_table = UserAgentTable()
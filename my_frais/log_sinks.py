@@ -0,0 +1,209 @@
+"""
+Destinations (sinks) des logs applicatifs, choisies dans settings.LOG_SINKS.
+
+Exemple : erreurs vers MongoDB et fichier, CRUD vers fichier seul, le reste vers MongoDB
+
+    LOG_SINKS = {
+        'SINKS': {
+            'mongo': {'BACKEND': 'my_frais.log_sinks.MongoLogSink'},
+            'file': {'BACKEND': 'my_frais.log_sinks.JsonlFileLogSink',
+                     'OPTIONS': {'path': '/var/log/mes_frais/events.jsonl'}},
+        },
+        'ROUTES': {'errors': ['mongo', 'file'], 'crud_events': ['file'], 'default': ['mongo']},
+    }
+
+Les routes sont indexées par collection (auth_events, crud_events, errors, business_events).
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from my_frais.log_rollups import log_rollups
+from my_frais.log_spool import matches, json_default
+from my_frais.mongodb_service import mongodb_service
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LOG_SINKS = {
+    'SINKS': {'mongo': {'BACKEND': 'my_frais.log_sinks.MongoLogSink'}},
+    'ROUTES': {'default': ['mongo']},
+}
+
+
+class LogSink:
+    """Interface d'une destination de logs"""
+
+    def write(self, collection: str, documents: List[Dict[str, Any]]) -> int:
+        """Écrit un lot de logs, retourne le nombre de logs acceptés"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Écrit ce que le sink garde en mémoire (appelé à l'arrêt du thread d'écriture)"""
+        pass
+
+    def close(self):
+        pass
+
+
+class MongoLogSink(LogSink):
+    """MongoDB (avec disjoncteur et spool local, cf. mongodb_service), agrégats compris (cf. log_rollups)"""
+
+    def write(self, collection, documents):
+        # Comptés même si MongoDB est indisponible : le spool local les rejouera
+        log_rollups.record(collection, documents)
+        inserted = mongodb_service.insert_logs(collection, documents)
+        log_rollups.flush_if_due()
+        return inserted
+
+    def flush(self):
+        log_rollups.flush()
+
+
+class JsonlFileLogSink(LogSink):
+    """Fichier JSONL ({'collection', 'data'} par ligne) avec rotation par taille"""
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def _rotate(self):
+        """events.jsonl -> events.jsonl.1 -> ... -> events.jsonl.<backup_count> (supprimé au-delà)"""
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    def write(self, collection, documents):
+        payload = ''.join(
+            json.dumps({'collection': collection, 'data': data}, default=json_default, ensure_ascii=False) + '\n'
+            for data in documents
+        )
+        try:
+            with self._lock:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(payload) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as log_file:
+                    log_file.write(payload)
+        except OSError as e:
+            logger.error(f"Écriture des logs dans {self.path} impossible: {e}")
+            return 0
+        return len(documents)
+
+
+class RingBufferLogSink(LogSink):
+    """Derniers logs en mémoire (tests, benchmarks), consultables avec `find`"""
+
+    def __init__(self, capacity: int = 10000):
+        self.buffer = deque(maxlen=capacity)
+
+    def write(self, collection, documents):
+        self.buffer.extend((collection, data) for data in documents)
+        return len(documents)
+
+    def find(self, collection: str, filter_dict: Dict[str, Any] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        found = [data for name, data in reversed(self.buffer) if name == collection and matches(data, filter_dict)]
+        return found[:limit]
+
+    def clear(self):
+        self.buffer.clear()
+
+
+class NullLogSink(LogSink):
+    """Ignore les logs (mesure du coût de la couche de logging seule)"""
+
+    def write(self, collection, documents):
+        return len(documents)
+
+
+class LogRouter:
+    """Instancie les sinks configurés et distribue chaque lot selon sa collection"""
+
+    def __init__(self):
+        self._sinks = None
+        self._routes = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        config = getattr(settings, 'LOG_SINKS', DEFAULT_LOG_SINKS)
+        sinks = {
+            name: import_string(sink_config['BACKEND'])(**sink_config.get('OPTIONS', {}))
+            for name, sink_config in config['SINKS'].items()
+        }
+        routes = config.get('ROUTES', {'default': list(sinks)})
+        for collection, names in routes.items():
+            unknown = set(names) - set(sinks)
+            if unknown:
+                raise ValueError(f"LOG_SINKS : sink(s) inconnu(s) {sorted(unknown)} pour la route '{collection}'")
+        self._sinks, self._routes = sinks, routes
+
+    def reset(self):
+        with self._lock:
+            if self._sinks:
+                for sink in self._sinks.values():
+                    sink.close()
+            self._sinks = None
+            self._routes = None
+
+    def _ensure_loaded(self):
+        if self._sinks is None:
+            with self._lock:
+                if self._sinks is None:
+                    self._load()
+
+    def get_sink(self, name: str) -> LogSink:
+        self._ensure_loaded()
+        return self._sinks[name]
+
+    def sinks_for(self, collection: str) -> List[LogSink]:
+        self._ensure_loaded()
+        names = self._routes.get(collection, self._routes.get('default', []))
+        return [self._sinks[name] for name in names]
+
+    def flush(self):
+        if self._sinks is None:
+            return
+        for sink in self._sinks.values():
+            try:
+                sink.flush()
+            except Exception as e:
+                logger.error(f"Erreur du sink {type(sink).__name__} à la vidange: {e}")
+
+    def write(self, collection: str, documents: List[Dict[str, Any]]) -> int:
+        """Écrit le lot dans chaque sink de la route ; retourne le nombre accepté par le premier"""
+        sinks = self.sinks_for(collection)
+        accepted = None
+        for sink in sinks:
+            # Copie par sink : un sink peut modifier les documents (_id, created_at)
+            try:
+                written = sink.write(collection, [dict(data) for data in documents] if len(sinks) > 1 else documents)
+            except Exception as e:
+                logger.error(f"Erreur du sink {type(sink).__name__} pour {collection}: {e}")
+                written = 0
+            if accepted is None:
+                accepted = written
+        return len(documents) if accepted is None else accepted
+
+
+log_router = LogRouter()
+
+
+@receiver(setting_changed)
+def reset_log_router(setting, **kwargs):
+    """Sinks reconstruits quand LOG_SINKS change (override_settings)"""
+    if setting == 'LOG_SINKS':
+        log_router.reset()
@@ -0,0 +1,519 @@
+"""
+Spool local des logs que MongoDB n'a pas pu recevoir.
+
+Les événements sont ajoutés à des segments JSONL (un segment ouvert par processus,
+fsync groupés), puis rejoués par insert_many dès que MongoDB répond à nouveau.
+Chaque événement porte un `_id` fixé avant le spool : un segment rejoué deux fois
+(worker arrêté en cours de rejeu, lot partiellement écrit) ne crée pas de doublon.
+
+Cycle de vie d'un segment :
+    seg-<horodatage>-<pid>-<n>.open  (en écriture)  ->  .jsonl  (fermé)  ->  .<pid>.replaying  ->  supprimé
+
+Les logs que MongoDB refuse définitivement (document trop gros, non encodable) sont mis de
+côté dans dead-seg-<...>.jsonl au lieu de bloquer le rejeu des segments suivants.
+"""
+import glob
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from bson import ObjectId
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LOG_SPOOL_SETTINGS = {
+    'DIRECTORY': None,
+    'SEGMENT_MAX_BYTES': 8 * 1024 * 1024,
+    'QUOTA_BYTES': 512 * 1024 * 1024,
+    'FSYNC_EVERY': 100,
+    'FSYNC_INTERVAL': 1.0,
+    'REPLAY_INTERVAL': 10.0,
+    'REPLAY_BATCH_SIZE': 500,
+    'CLAIM_TIMEOUT': 300,
+}
+
+
+def log_spool_setting(name):
+    return getattr(settings, 'LOG_SPOOL_SETTINGS', {}).get(name, DEFAULT_LOG_SPOOL_SETTINGS[name])
+
+
+def json_default(value):
+    """Types BSON/Python non JSON : dates et ObjectId conservés pour le rejeu"""
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    return str(value)
+
+
+def json_object_hook(obj):
+    if len(obj) == 1:
+        if '$date' in obj:
+            return datetime.fromisoformat(obj['$date'])
+        if '$oid' in obj:
+            return ObjectId(obj['$oid'])
+    return obj
+
+
+def _get_path(document: Dict[str, Any], dotted_key: str):
+    value = document
+    for part in dotted_key.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+_OPERATORS = {
+    '$gte': lambda value, bound: value is not None and value >= bound,
+    '$gt': lambda value, bound: value is not None and value > bound,
+    '$lte': lambda value, bound: value is not None and value <= bound,
+    '$lt': lambda value, bound: value is not None and value < bound,
+    '$ne': lambda value, bound: value != bound,
+    '$in': lambda value, bound: value in bound,
+}
+
+
+def matches(document: Dict[str, Any], filter_dict: Optional[Dict[str, Any]]) -> bool:
+    """Sous-ensemble des filtres MongoDB (égalité et $gte/$gt/$lte/$lt/$ne/$in sur clés pointées)"""
+    for key, condition in (filter_dict or {}).items():
+        value = _get_path(document, key)
+        if isinstance(condition, dict) and condition and all(op in _OPERATORS for op in condition):
+            try:
+                if not all(_OPERATORS[op](value, bound) for op, bound in condition.items()):
+                    return False
+            except TypeError:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def log_sort_key(document: Dict[str, Any]) -> Tuple[datetime, str]:
+    """Clé de tri (timestamp, _id) des pages de logs, en base comme dans le spool"""
+    return document.get('timestamp') or datetime.min, str(document.get('_id', ''))
+
+
+class _Reversed:
+    """Clé d'ordre inversé (tas des pages `before`, qui gardent les plus petites clés)"""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+    def __gt__(self, other):
+        return self.key < other.key
+
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Projection MongoDB simple : inclusion de clés (éventuellement pointées) ou exclusion de premier niveau"""
+    if not projection:
+        return document
+    if not any(value for key, value in projection.items() if key != '_id'):
+        return {key: value for key, value in document.items() if projection.get(key, 1)}
+    projected = {'_id': document['_id']} if '_id' in document and projection.get('_id', 1) else {}
+    for key, keep in projection.items():
+        if not keep or key == '_id':
+            continue
+        *parents, leaf = key.split('.')
+        source, target = document, projected
+        for part in parents:
+            source = source.get(part)
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(part, {})
+        else:
+            if leaf in source:
+                target[leaf] = source[leaf]
+    return projected
+
+
+def _stem(path: str) -> str:
+    """Chemin du segment sans son suffixe d'état (.open, .jsonl, .<pid>.replaying)"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, name.split('.', 1)[0])
+
+
+def _owner_alive(path: str) -> bool:
+    """Le processus propriétaire d'un segment ouvert est-il encore en vie ?"""
+    try:
+        pid = int(os.path.basename(path).split('-')[2])
+        os.kill(pid, 0)
+    except (IndexError, ValueError):
+        return False
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class LogSpool:
+    """Spool segmenté sur disque (désactivé tant que LOG_SPOOL_SETTINGS['DIRECTORY'] n'est pas défini)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._segment = None
+        self._segment_bytes = 0
+        self._sequence = 0
+        self._unsynced = 0
+        self._last_fsync = 0.0
+        self._size = None
+        self._replay_thread = None
+        self.counters = {'spooled': 0, 'dropped_quota': 0, 'replayed': 0, 'replay_failures': 0, 'dead_lettered': 0}
+
+    @property
+    def directory(self) -> Optional[str]:
+        return log_spool_setting('DIRECTORY')
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    # --- Écriture -----------------------------------------------------------
+
+    def _segment_paths(self, pattern: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, pattern)))
+
+    def _scan_size(self) -> int:
+        total = 0
+        for path in self._segment_paths('seg-*'):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def _close_segment(self):
+        """Ferme le segment ouvert (fsync) et le rend disponible pour le rejeu"""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self._segment_bytes:
+            os.replace(self._segment, self._segment[:-len('.open')] + '.jsonl')
+        else:
+            os.remove(self._segment)
+        self._file = None
+        self._segment = None
+        self._segment_bytes = 0
+        self._unsynced = 0
+
+    def _open_segment(self):
+        moved = self._segment is not None and os.path.dirname(self._segment) != os.path.abspath(self.directory)
+        if self._pid != os.getpid() or moved:
+            # Processus forké (le segment hérité appartient au parent) ou dossier reconfiguré
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+            self._file = None
+            self._pid = os.getpid()
+            self._size = None
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._sequence += 1
+            self._segment = os.path.join(
+                os.path.abspath(self.directory), f'seg-{time.time_ns()}-{self._pid}-{self._sequence}.open'
+            )
+            self._file = open(self._segment, 'ab')
+            self._last_fsync = time.monotonic()
+
+    def append(self, collection: str, documents: List[Dict[str, Any]]) -> int:
+        """Ajoute des logs au spool, retourne le nombre de logs conservés"""
+        if not self.enabled or not documents:
+            return 0
+
+        lines = []
+        for data in documents:
+            data.setdefault('_id', ObjectId())
+            lines.append(json.dumps({'collection': collection, 'data': data}, default=json_default, ensure_ascii=False) + '\n')
+        payload = ''.join(lines).encode('utf-8')
+
+        with self._lock:
+            try:
+                self._open_segment()
+                if self._size is None:
+                    self._size = self._scan_size()
+                if self._size + len(payload) > log_spool_setting('QUOTA_BYTES'):
+                    self.counters['dropped_quota'] += len(documents)
+                    logger.error(f"Quota du spool de logs atteint, {len(documents)} log(s) perdu(s)")
+                    return 0
+
+                self._file.write(payload)
+                self._file.flush()
+                self._segment_bytes += len(payload)
+                self._size += len(payload)
+                self._unsynced += len(documents)
+
+                # fsync groupé : par nombre d'événements ou par intervalle
+                if (self._unsynced >= log_spool_setting('FSYNC_EVERY')
+                        or time.monotonic() - self._last_fsync >= log_spool_setting('FSYNC_INTERVAL')):
+                    os.fsync(self._file.fileno())
+                    self._unsynced = 0
+                    self._last_fsync = time.monotonic()
+
+                if self._segment_bytes >= log_spool_setting('SEGMENT_MAX_BYTES'):
+                    self._close_segment()
+            except OSError as e:
+                logger.error(f"Écriture dans le spool de logs impossible: {e}")
+                return 0
+
+        self.counters['spooled'] += len(documents)
+        return len(documents)
+
+    def rotate(self):
+        """Ferme le segment ouvert de ce processus pour qu'il puisse être rejoué"""
+        with self._lock:
+            if self._pid == os.getpid():
+                try:
+                    self._close_segment()
+                except OSError as e:
+                    logger.error(f"Fermeture du segment de spool impossible: {e}")
+
+    # --- Lecture ------------------------------------------------------------
+
+    @staticmethod
+    def _read_segment(path: str) -> List[Dict[str, Any]]:
+        events = []
+        try:
+            with open(path, encoding='utf-8') as segment:
+                for line in segment:
+                    try:
+                        events.append(json.loads(line, object_hook=json_object_hook))
+                    except ValueError:
+                        # Dernière ligne tronquée (arrêt brutal) : ignorée
+                        continue
+        except OSError:
+            pass
+        return events
+
+    def has_segments(self) -> bool:
+        """Au moins un segment (ouvert, fermé ou en rejeu), d'après le seul listage du dossier"""
+        if not self.enabled:
+            return False
+        try:
+            with os.scandir(self.directory) as entries:
+                return any(entry.name.startswith('seg-') for entry in entries)
+        except OSError:
+            return False
+
+    def _segments_newest_first(self) -> List[Tuple[datetime, str]]:
+        """
+        Segments triés par date de dernière écriture décroissante. Les timestamps des logs
+        étant fixés avant leur écriture, cette date (UTC) majore ceux de chaque segment.
+        """
+        segments = []
+        for path in self._segment_paths('seg-*'):
+            try:
+                modified = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).replace(tzinfo=None)
+            except OSError:
+                continue
+            segments.append((modified, path))
+        segments.sort(reverse=True)
+        return segments
+
+    def find(self, collection: Union[str, Iterable[str]], filter_dict: Dict[str, Any] = None, limit: Optional[int] = 100,
+             after: Optional[Tuple[datetime, Any]] = None, before: Optional[Tuple[datetime, Any]] = None,
+             projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        Logs encore en spool (non rejoués) d'une collection, les plus récents d'abord (limit=None : tous).
+        Avec plusieurs collections (chronologies), lues en un seul passage, chaque log porte `collection`.
+
+        `after` / `before` (timestamp, _id) bornent la page comme en base : les `limit` logs plus
+        anciens, ou les `limit` logs plus récents que la clé. Les segments sont lus du plus
+        récent au plus ancien et la lecture s'arrête dès qu'aucun segment restant ne peut
+        entrer dans la page ; seuls les `limit` meilleurs logs sont gardés en mémoire.
+        """
+        if not self.enabled:
+            return []
+        collections = {collection} if isinstance(collection, str) else set(collection)
+        after_key = (after[0], str(after[1])) if after is not None else None
+        before_key = (before[0], str(before[1])) if before is not None else None
+
+        # Tas des logs retenus : les plus anciens en tête (pages vers le passé), ou les plus
+        # récents (clé inversée) pour une page `before`, qui garde les plus proches de la clé
+        kept = []
+        sequence = 0
+        for modified, path in self._segments_newest_first():
+            if before_key is not None and modified < before_key[0]:
+                # Ce segment et les suivants ne contiennent que des logs plus anciens que la clé
+                break
+            if (before_key is None and limit is not None and len(kept) >= limit
+                    and modified < kept[0][0][0]):
+                break
+            for event in self._read_segment(path):
+                data = event.get('data', {})
+                if event.get('collection') not in collections or not matches(data, filter_dict):
+                    continue
+                key = log_sort_key(data)
+                if after_key is not None and not key < after_key:
+                    continue
+                if before_key is not None and not key > before_key:
+                    continue
+                sequence += 1
+                entry = (key, sequence, event) if before_key is None else (_Reversed(key), sequence, event)
+                if limit is None or len(kept) < limit:
+                    heapq.heappush(kept, entry)
+                elif entry[0] > kept[0][0]:
+                    heapq.heapreplace(kept, entry)
+
+        found = []
+        for _, _, event in kept:
+            log = {**project(event.get('data', {}), projection), 'spooled': True}
+            if not isinstance(collection, str):
+                log['collection'] = event.get('collection')
+            found.append(log)
+        found.sort(key=log_sort_key, reverse=True)
+        return found
+
+    # --- Rejeu --------------------------------------------------------------
+
+    def _claim(self) -> Optional[str]:
+        """Réserve le plus ancien segment fermé (renommage atomique), ou un segment abandonné"""
+        pid = os.getpid()
+        candidates = self._segment_paths('seg-*.jsonl')
+        # Segments ouverts d'un worker arrêté brutalement
+        candidates += [path for path in self._segment_paths('seg-*.open') if not _owner_alive(path)]
+        now = time.time()
+        for path in self._segment_paths('seg-*.replaying'):
+            try:
+                if now - os.path.getmtime(path) > log_spool_setting('CLAIM_TIMEOUT'):
+                    candidates.append(path)
+            except OSError:
+                continue
+        for path in candidates:
+            claimed = f'{_stem(path)}.{pid}.replaying'
+            try:
+                os.replace(path, claimed)
+                os.utime(claimed)
+                return claimed
+            except OSError:
+                # Réservé par un autre worker entre-temps
+                continue
+        return None
+
+    def _dead_letter(self, claimed: str, rejected: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Conserve les logs refusés définitivement dans dead-<segment>.jsonl (hors quota et hors
+        rejeu, même format que les segments : renommé en seg-*.jsonl, un fichier est rejoué)
+        """
+        path = os.path.join(self.directory, f'dead-{os.path.basename(_stem(claimed))}.jsonl')
+        lines = [
+            json.dumps({'collection': collection, 'data': data}, default=json_default, ensure_ascii=False) + '\n'
+            for collection, data in rejected
+        ]
+        with open(path, 'a', encoding='utf-8') as dead_letters:
+            dead_letters.write(''.join(lines))
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        self.counters['dead_lettered'] += len(rejected)
+        logger.error(f"{len(rejected)} log(s) refusé(s) par MongoDB, conservé(s) dans {path}")
+
+    def replay_once(self, insert: Callable[[str, List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]) -> int:
+        """
+        Rejoue les segments fermés. `insert(collection, documents)` retourne None si MongoDB est
+        indisponible : arrêt, le segment est rendu au spool. Sinon il retourne les documents
+        refusés définitivement (trop gros, non encodables...), mis de côté sans bloquer le reste
+        du segment ni les suivants (doublons d'un rejeu précédent non comptés comme refus).
+        """
+        if not self.enabled or not os.path.isdir(self.directory):
+            return 0
+        self.rotate()
+        batch_size = log_spool_setting('REPLAY_BATCH_SIZE')
+        replayed = 0
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                break
+            by_collection = {}
+            for event in self._read_segment(claimed):
+                by_collection.setdefault(event.get('collection'), []).append(event.get('data', {}))
+
+            success = True
+            rejected = []
+            for collection, documents in by_collection.items():
+                for start in range(0, len(documents), batch_size):
+                    refused = insert(collection, documents[start:start + batch_size])
+                    if refused is None:
+                        success = False
+                        break
+                    rejected += [(collection, document) for document in refused]
+                if not success:
+                    break
+
+            if success and rejected:
+                try:
+                    self._dead_letter(claimed, rejected)
+                except OSError as e:
+                    logger.error(f"Écriture des logs refusés impossible: {e}")
+                    success = False
+            if not success:
+                # Refus éventuels écartés à nouveau au prochain rejeu du segment
+                self.counters['replay_failures'] += 1
+                os.replace(claimed, _stem(claimed) + '.jsonl')
+                break
+            count = sum(len(documents) for documents in by_collection.values()) - len(rejected)
+            os.remove(claimed)
+            replayed += count
+            self.counters['replayed'] += count
+        with self._lock:
+            self._size = None
+        return replayed
+
+    def ensure_replay_worker(self, insert: Callable[[str, List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]],
+                             should_run: Callable[[], bool] = lambda: True):
+        """Démarre (une fois par processus) le thread de rejeu périodique"""
+        if not self.enabled:
+            return
+        thread = self._replay_thread
+        if thread is not None and thread.is_alive() and thread.pid == os.getpid():
+            return
+        with self._lock:
+            thread = self._replay_thread
+            if thread is not None and thread.is_alive() and thread.pid == os.getpid():
+                return
+
+            def run():
+                while True:
+                    time.sleep(log_spool_setting('REPLAY_INTERVAL'))
+                    if not should_run():
+                        continue
+                    try:
+                        self.replay_once(insert)
+                    except Exception as e:
+                        logger.error(f"Erreur lors du rejeu du spool de logs: {e}")
+
+            thread = threading.Thread(target=run, name='log-spool-replay', daemon=True)
+            thread.pid = os.getpid()
+            thread.start()
+            self._replay_thread = thread
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du processus et taille du spool sur disque"""
+        if not self.enabled:
+            return {**self.counters, 'segments': 0, 'size_bytes': 0, 'dead_letter_files': 0}
+        return {
+            **self.counters,
+            'segments': len(self._segment_paths('seg-*')),
+            'size_bytes': self._scan_size(),
+            'dead_letter_files': len(self._segment_paths('dead-*')),
+        }
+
+
+# Instance globale (une par processus)
+log_spool = LogSpool()
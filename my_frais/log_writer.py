@@ -0,0 +1,159 @@
+"""
+Écriture asynchrone et groupée des logs applicatifs vers les sinks configurés (cf. log_sinks)
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any
+
+from django.conf import settings
+
+from my_frais.log_spool import log_spool
+from my_frais.log_sinks import log_router
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LOG_WRITER_SETTINGS = {
+    'ASYNC': True,
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+    'SHUTDOWN_TIMEOUT': 5.0,
+}
+
+
+def log_writer_setting(name):
+    return getattr(settings, 'LOG_WRITER_SETTINGS', {}).get(name, DEFAULT_LOG_WRITER_SETTINGS[name])
+
+
+class AsyncLogWriter:
+    """
+    Thread d'écriture par processus : les logs sont mis en file (bornée) sans attendre
+    les sinks, puis écrits par lots dès que BATCH_SIZE logs sont en attente
+    ou toutes les FLUSH_INTERVAL secondes.
+
+    File pleine : le log part dans le spool local (cf. log_spool) s'il est configuré,
+    sinon il est ignoré ; dans les deux cas un compteur est incrémenté (cf. `stats`).
+    La file est vidée à l'arrêt du processus (atexit).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.counters = {'queued': 0, 'written': 0, 'failed': 0, 'dropped': 0, 'spilled': 0}
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        """Démarre le thread au premier log (et le recrée dans un processus forké)"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Processus enfant : la file héritée appartient au parent
+                self._queue = queue.Queue(maxsize=log_writer_setting('QUEUE_SIZE'))
+                self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, collection: str, data: Dict[str, Any]):
+        """Met un log en file d'écriture ; ne bloque jamais la requête"""
+        data.setdefault('timestamp', datetime.utcnow())
+        if not log_writer_setting('ASYNC'):
+            self._write(collection, [data])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((collection, data))
+            self.counters['queued'] += 1
+        except queue.Full:
+            self._spill(collection, data)
+
+    def _spill(self, collection: str, data: Dict[str, Any]):
+        """Débordement de la file : log conservé dans le spool local, sinon abandonné et compté"""
+        if log_spool.append(collection, [data]):
+            self.counters['spilled'] += 1
+        else:
+            self.counters['dropped'] += 1
+
+    def _write(self, collection: str, documents):
+        inserted = log_router.write(collection, documents)
+        self.counters['written'] += inserted
+        self.counters['failed'] += len(documents) - inserted
+
+    def _flush(self, batch):
+        """Écrit un lot, un insert_many par collection"""
+        by_collection = {}
+        for collection, data in batch:
+            by_collection.setdefault(collection, []).append(data)
+        for collection, documents in by_collection.items():
+            self._write(collection, documents)
+
+    def _run(self):
+        batch_size = log_writer_setting('BATCH_SIZE')
+        interval = log_writer_setting('FLUSH_INTERVAL')
+        log_queue = self._queue
+        batch = []
+        deadline = time.monotonic() + interval
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                batch.append(log_queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+            if len(batch) >= batch_size or time.monotonic() >= deadline or self._stopping.is_set():
+                if self._stopping.is_set():
+                    # Arrêt : tout ce qui reste en file part dans le dernier lot
+                    while True:
+                        try:
+                            batch.append(log_queue.get_nowait())
+                        except queue.Empty:
+                            break
+                if batch:
+                    try:
+                        self._flush(batch)
+                    except Exception as e:
+                        logger.error(f"Erreur d'écriture d'un lot de logs: {e}")
+                        self.counters['failed'] += len(batch)
+                    batch = []
+                if self._stopping.is_set():
+                    log_router.flush()
+                    return
+                deadline = time.monotonic() + interval
+
+    def flush(self, timeout: float = None):
+        """Attend l'écriture des logs en file (arrêt puis redémarrage à la demande)"""
+        self.shutdown(timeout)
+
+    def shutdown(self, timeout: float = None):
+        """Vide la file et arrête le thread"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._stopping.set()
+        thread.join(log_writer_setting('SHUTDOWN_TIMEOUT') if timeout is None else timeout)
+        if thread.is_alive():
+            logger.warning(f"Arrêt du thread de logs incomplet, {self.queue_depth} log(s) en attente")
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+
+    def stats(self) -> Dict[str, int]:
+        """Compteurs du processus courant"""
+        return {**self.counters, 'queue_depth': self.queue_depth}
+
+
+# Instance globale (une par processus)
+log_writer = AsyncLogWriter()
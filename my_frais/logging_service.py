@@ -1,25 +1,112 @@
 """
 Service de logging centralisé pour l'application
 """
-from my_frais.mongodb_service import mongodb_service
+from my_frais.log_rollups import log_rollups, normalize_message
+from my_frais.log_schema import compact_enabled, field_diff, truncate, truncate_traceback, user_agent_table
+from my_frais.log_writer import log_writer
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.http import HttpRequest
+import hashlib
 import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import traceback
 import json
 
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_ERROR_LOG_SETTINGS = {
+    # Après un log complet, les occurrences de la même erreur pendant DEDUP_WINDOW secondes
+    # ne sont que comptées (agrégat rollup_error_fingerprints) ; 0 désactive le regroupement
+    'DEDUP_WINDOW': 300,
+    # Proportion d'occurrences regroupées malgré tout écrites en entier (échantillons)
+    'SAMPLE_RATE': 0.0,
+    'MAX_FINGERPRINTS': 5000,
+}
+
+
+def error_log_setting(name):
+    return getattr(settings, 'ERROR_LOG_SETTINGS', {}).get(name, DEFAULT_ERROR_LOG_SETTINGS[name])
+
+
+def _frame_location(filename: str) -> str:
+    """Chemin relatif au projet (identique d'un déploiement à l'autre), sinon nom du fichier"""
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        return os.path.relpath(filename, base_dir)
+    return os.path.basename(filename)
+
+
+def exception_fingerprint(error: Exception) -> str:
+    """
+    Empreinte d'une exception : type et frames de la pile (fichier, fonction), sans numéros de ligne
+    ni valeurs ; sans pile (exception non levée), type et message normalisé
+    """
+    frames = traceback.extract_tb(error.__traceback__) if error.__traceback__ else []
+    if frames:
+        signature = '|'.join(f"{_frame_location(frame.filename)}:{frame.name}" for frame in frames)
+    else:
+        signature = normalize_message(str(error))
+    raw = f"{type(error).__module__}.{type(error).__qualname__}|{signature}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class ErrorDeduplicator:
+    """
+    Regroupement des erreurs par empreinte dans le processus : la première occurrence d'une
+    fenêtre est écrite en entier, les suivantes sont seulement comptées jusqu'à la fin de la fenêtre
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # empreinte -> [début de fenêtre (monotonic), occurrences regroupées depuis le dernier log complet]
+        self._windows: 'OrderedDict[str, list]' = OrderedDict()
+    
+    def check(self, fingerprint: str) -> Tuple[bool, int]:
+        """Retourne (écrire le log complet ?, occurrences regroupées depuis le dernier log complet)"""
+        window = error_log_setting('DEDUP_WINDOW')
+        if not window:
+            return True, 0
+        now = time.monotonic()
+        with self._lock:
+            entry = self._windows.get(fingerprint)
+            if entry is None or now - entry[0] >= window:
+                suppressed = entry[1] if entry else 0
+                self._windows[fingerprint] = [now, 0]
+                self._windows.move_to_end(fingerprint)
+                while len(self._windows) > error_log_setting('MAX_FINGERPRINTS'):
+                    self._windows.popitem(last=False)
+                return True, suppressed
+            if random.random() < error_log_setting('SAMPLE_RATE'):
+                suppressed, entry[1] = entry[1], 0
+                return True, suppressed
+            entry[1] += 1
+            return False, entry[1]
+    
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+
+
+error_deduplicator = ErrorDeduplicator()
+
+
 class ApplicationLogger:
     """Service de logging centralisé pour tous les événements de l'application"""
     
     @staticmethod
     def _get_user_info(user) -> Dict[str, Any]:
-        """Extrait les informations de l'utilisateur"""
+        """Extrait les informations de l'utilisateur (son seul identifiant en schéma compact)"""
         if user and user.is_authenticated:
+            if compact_enabled():
+                return {'user_id': user.id}
             return {
                 'user_id': user.id,
                 'username': user.username,
@@ -27,11 +114,23 @@ class ApplicationLogger:
                 'is_staff': user.is_staff,
                 'is_superuser': user.is_superuser
             }
+        if compact_enabled():
+            return {'user_id': None}
         return {'user_id': None, 'username': 'anonymous'}
     
     @staticmethod
     def _get_request_info(request: HttpRequest) -> Dict[str, Any]:
-        """Extrait les informations de la requête"""
+        """Extrait les informations de la requête (user agent par empreinte en schéma compact)"""
+        if compact_enabled():
+            request_info = {
+                'ip_address': request.META.get('REMOTE_ADDR'),
+                'method': request.method,
+                'path': truncate(request.path),
+                'ua': user_agent_table.intern(request.META.get('HTTP_USER_AGENT')),
+            }
+            if request.GET:
+                request_info['query_params'] = truncate(dict(request.GET.items()))
+            return request_info
         return {
             'ip_address': request.META.get('REMOTE_ADDR'),
             'user_agent': request.META.get('HTTP_USER_AGENT'),
@@ -41,6 +140,13 @@ class ApplicationLogger:
             'content_type': request.content_type
         }
     
+    @staticmethod
+    def _submit(collection: str, log_data: Dict[str, Any]):
+        """Marque la version du schéma puis met le log en file d'écriture"""
+        if compact_enabled():
+            log_data['schema_version'] = 2
+        log_writer.submit(collection, log_data)
+    
     @staticmethod
     def log_auth_event(event_type: str, user: User = None, request: HttpRequest = None, 
                       success: bool = True, details: Dict[str, Any] = None):
@@ -50,7 +156,7 @@ class ApplicationLogger:
             'category': 'authentication',
             'success': success,
             'timestamp': datetime.utcnow(),
-            'details': details or {}
+            'details': truncate(details or {}) if compact_enabled() else details or {}
         }
         
         if user:
@@ -59,7 +165,7 @@ class ApplicationLogger:
         if request:
             log_data['request_info'] = ApplicationLogger._get_request_info(request)
         
-        mongodb_service.insert_log('auth_events', log_data)
+        ApplicationLogger._submit('auth_events', log_data)
     
     @staticmethod
     def log_crud_event(event_type: str, model_name: str, object_id: int = None, 
@@ -72,9 +178,13 @@ class ApplicationLogger:
             'model_name': model_name,
             'object_id': object_id,
             'timestamp': datetime.utcnow(),
-            'old_data': old_data,
-            'new_data': new_data
         }
+        if compact_enabled():
+            # Différences champ par champ (tout le contenu pour une création ou une suppression)
+            log_data['changes'] = field_diff(old_data, new_data)
+        else:
+            log_data['old_data'] = old_data
+            log_data['new_data'] = new_data
         
         if user:
             log_data['user_info'] = ApplicationLogger._get_user_info(user)
@@ -82,21 +192,46 @@ class ApplicationLogger:
         if request:
             log_data['request_info'] = ApplicationLogger._get_request_info(request)
         
-        mongodb_service.insert_log('crud_events', log_data)
+        ApplicationLogger._submit('crud_events', log_data)
     
     @staticmethod
     def log_error(error: Exception, user: User = None, request: HttpRequest = None, 
                  context: Dict[str, Any] = None):
-        """Log les erreurs de l'application"""
+        """
+        Log les erreurs de l'application, regroupées par empreinte (cf. ErrorDeduplicator) :
+        les occurrences regroupées ne mettent à jour que les compteurs de l'empreinte
+        """
+        fingerprint = exception_fingerprint(error)
+        store, suppressed = error_deduplicator.check(fingerprint)
+        
+        if not store:
+            # Compteurs et dernière occurrence seulement : ni traceback, ni contexte
+            log_rollups.record('errors', [{
+                'event_type': 'error',
+                'fingerprint': fingerprint,
+                'error_type': type(error).__name__,
+                'error_message': str(error),
+                'timestamp': datetime.utcnow(),
+                'request_info': {'path': request.path} if request else {},
+            }])
+            return
+        
         log_data = {
             'event_type': 'error',
             'category': 'error',
+            'fingerprint': fingerprint,
             'error_type': type(error).__name__,
             'error_message': str(error),
-            'error_traceback': traceback.format_exc(),
+            'error_traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__)),
             'timestamp': datetime.utcnow(),
             'context': context or {}
         }
+        if compact_enabled():
+            log_data['error_message'] = truncate(log_data['error_message'])
+            log_data['error_traceback'] = truncate_traceback(log_data['error_traceback'])
+            log_data['context'] = truncate(log_data['context'])
+        if suppressed:
+            log_data['suppressed_occurrences'] = suppressed
         
         if user:
             log_data['user_info'] = ApplicationLogger._get_user_info(user)
@@ -104,7 +239,7 @@ class ApplicationLogger:
         if request:
             log_data['request_info'] = ApplicationLogger._get_request_info(request)
         
-        mongodb_service.insert_log('errors', log_data)
+        ApplicationLogger._submit('errors', log_data)
     
     @staticmethod
     def log_business_event(event_type: str, category: str, user: User = None, 
@@ -114,7 +249,7 @@ class ApplicationLogger:
             'event_type': event_type,
             'category': category,
             'timestamp': datetime.utcnow(),
-            'details': details or {}
+            'details': truncate(details or {}) if compact_enabled() else details or {}
         }
         
         if user:
@@ -123,7 +258,7 @@ class ApplicationLogger:
         if request:
             log_data['request_info'] = ApplicationLogger._get_request_info(request)
         
-        mongodb_service.insert_log('business_events', log_data)
+        ApplicationLogger._submit('business_events', log_data)
 
 
 # Instance globale du logger
@@ -0,0 +1,40 @@
+"""
+Commande de calcul en masse des soldes journaliers
+"""
+import time
+from datetime import date, datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+
+from my_frais.services import BalanceSnapshotService
+
+
+class Command(BaseCommand):
+    help = "Calcule les soldes de fin de journée (AccountBalanceSnapshot) sur une période passée"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Premier jour à calculer (YYYY-MM-DD). Par défaut : il y a --days jours')
+        parser.add_argument('--days', type=int, default=90, help='Nombre de jours à calculer si --since est absent')
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help='ID de compte à traiter (répétable). Par défaut : tous les comptes')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Nombre de comptes traités par lot')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide. Utilisez YYYY-MM-DD')
+        else:
+            since = date.today() - timedelta(days=options['days'])
+
+        written = BalanceSnapshotService.backfill(
+            since,
+            account_ids=options['accounts'],
+            chunk_size=max(1, options['chunk_size'])
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {written} soldes journaliers enregistrés depuis le {since} en {time.time() - start_time:.2f}s"
+        ))
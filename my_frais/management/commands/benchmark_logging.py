@@ -0,0 +1,59 @@
+"""
+Commande de mesure du coût de la couche de logging
+"""
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from my_frais.log_writer import log_writer
+from my_frais.logging_service import app_logger
+
+
+class Command(BaseCommand):
+    help = ("Mesure le coût par événement de app_logger (appel dans la requête puis écriture complète) "
+            "avec un sink donné, sans dépendre de MongoDB par défaut")
+
+    SINKS = {
+        'null': {'BACKEND': 'my_frais.log_sinks.NullLogSink'},
+        'ring': {'BACKEND': 'my_frais.log_sinks.RingBufferLogSink'},
+        'file': {'BACKEND': 'my_frais.log_sinks.JsonlFileLogSink'},
+        'mongo': {'BACKEND': 'my_frais.log_sinks.MongoLogSink'},
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', choices=sorted(self.SINKS), default='null',
+                            help='Destination des logs pendant la mesure')
+        parser.add_argument('--events', type=int, default=10000, help="Nombre d'événements")
+        parser.add_argument('--sync', action='store_true', help='Écriture synchrone (sans file ni thread)')
+
+    def handle(self, *args, **options):
+        events = max(1, options['events'])
+        sink = dict(self.SINKS[options['sink']])
+        with tempfile.TemporaryDirectory() as directory:
+            if options['sink'] == 'file':
+                sink['OPTIONS'] = {'path': os.path.join(directory, 'events.jsonl')}
+
+            request = RequestFactory().post('/api/operations/', HTTP_USER_AGENT='benchmark/1.0')
+            with override_settings(
+                LOG_SINKS={'SINKS': {'bench': sink}, 'ROUTES': {'default': ['bench']}},
+                LOG_WRITER_SETTINGS={'ASYNC': not options['sync'], 'QUEUE_SIZE': events + 1}
+            ):
+                start = time.perf_counter()
+                for index in range(events):
+                    app_logger.log_business_event(
+                        event_type='benchmark', category='performance', request=request,
+                        details={'index': index}
+                    )
+                submitted = time.perf_counter()
+                log_writer.flush(timeout=600)
+                flushed = time.perf_counter()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {events} événement(s) vers '{options['sink']}' : "
+            f"{(submitted - start) / events * 1e6:.1f} µs/événement dans la requête, "
+            f"{(flushed - start) / events * 1e6:.1f} µs/événement écriture comprise"
+        ))
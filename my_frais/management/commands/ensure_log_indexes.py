@@ -0,0 +1,24 @@
+"""
+Commande de création des index des collections de logs MongoDB
+"""
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import PyMongoError
+
+from my_frais.mongodb_service import mongodb_service
+
+
+class Command(BaseCommand):
+    help = ("Crée les index des collections de logs : TTL sur timestamp (MONGODB_CONFIG['retention_days']) "
+            "et index composés utilisés par l'admin ; fait aussi automatiquement au premier appel de chaque processus")
+
+    def handle(self, *args, **options):
+        if mongodb_service.db is None:
+            raise CommandError("Connexion MongoDB non disponible")
+        try:
+            indexes = mongodb_service.ensure_indexes()
+        except PyMongoError as e:
+            raise CommandError(f"Création des index impossible: {e}")
+
+        for collection, names in indexes.items():
+            self.stdout.write(f"   {collection}: {', '.join(names)}")
+        self.stdout.write(self.style.SUCCESS(f"✅ Index vérifiés sur {len(indexes)} collection(s)"))
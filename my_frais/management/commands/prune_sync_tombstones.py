@@ -0,0 +1,15 @@
+"""
+Commande de purge des tombstones du journal de synchronisation
+"""
+from django.core.management.base import BaseCommand
+
+from my_frais.services import SyncService
+
+
+class Command(BaseCommand):
+    help = ("Supprime les tombstones (suppressions journalisées) plus anciens que "
+            "SYNC_SETTINGS['TOMBSTONE_RETENTION_DAYS'] ; les curseurs plus anciens sont refusés (410)")
+
+    def handle(self, *args, **options):
+        deleted = SyncService.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"✅ {deleted} tombstone(s) supprimé(s)"))
@@ -0,0 +1,32 @@
+"""
+Commande de reconstruction des agrégats journaliers d'opérations
+"""
+import time
+from django.core.management.base import BaseCommand
+
+from my_frais.models import Account, OperationDailyRollup
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats journaliers d'opérations (OperationDailyRollup) à partir des opérations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help='ID de compte à reconstruire (répétable). Par défaut : tous les comptes')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Nombre de comptes reconstruits par transaction')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        account_ids = options['accounts']
+        if account_ids is None:
+            account_ids = list(Account.objects.order_by('id').values_list('id', flat=True))
+
+        chunk_size = max(1, options['chunk_size'])
+        created = 0
+        for index in range(0, len(account_ids), chunk_size):
+            created += OperationDailyRollup.rebuild(account_ids[index:index + chunk_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {created} agrégats reconstruits pour {len(account_ids)} compte(s) en {time.time() - start_time:.2f}s"
+        ))
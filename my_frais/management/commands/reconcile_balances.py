@@ -0,0 +1,84 @@
+"""
+Commande de rapprochement des soldes des comptes
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from my_frais.models import Account
+from my_frais.services import BalanceReconciliationService
+
+
+def _reconcile_chunk(id_start, id_end, correct):
+    """Traite une tranche d'IDs dans un processus du pool"""
+    try:
+        return BalanceReconciliationService.reconcile_range(id_start, id_end, correct)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Recalcule le solde attendu de chaque compte et signale (ou corrige) les écarts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--correct', action='store_true',
+                            help='Remplacer les soldes en écart par le solde attendu')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Nombre de processus (1 = exécution dans le processus courant)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Nombre d'IDs de comptes par tranche")
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Nombre maximum d\'écarts détaillés dans le rapport')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        correct = options['correct']
+        chunk_size = max(1, options['chunk_size'])
+
+        bounds = Account.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write("ℹ️  Aucun compte à rapprocher")
+            return
+        ranges = [
+            (id_start, min(id_start + chunk_size, bounds['last'] + 1))
+            for id_start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+        ]
+
+        results = []
+        if options['workers'] <= 1:
+            results = [BalanceReconciliationService.reconcile_range(lo, hi, correct) for lo, hi in ranges]
+        else:
+            # Les connexions ne doivent pas être partagées avec les processus forkés
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as pool:
+                futures = [pool.submit(_reconcile_chunk, lo, hi, correct) for lo, hi in ranges]
+                for future in as_completed(futures):
+                    results.append(future.result())
+
+        checked = sum(result['checked'] for result in results)
+        corrected = sum(result['corrected'] for result in results)
+        drifts = sorted(
+            (drift for result in results for drift in result['drifts']),
+            key=lambda drift: abs(drift['ecart']),
+            reverse=True
+        )
+        total_ecart = sum((drift['ecart'] for drift in drifts), Decimal('0'))
+
+        self.stdout.write(f"📊 {checked} comptes contrôlés en {time.time() - start_time:.2f}s ({len(ranges)} tranches)")
+        if not drifts:
+            self.stdout.write(self.style.SUCCESS("✅ Aucun écart détecté"))
+            return
+
+        self.stdout.write(self.style.WARNING(f"⚠️  {len(drifts)} compte(s) en écart, écart cumulé: {total_ecart}€"))
+        for drift in drifts[:options['limit']]:
+            self.stdout.write(
+                f"   - Compte {drift['account_id']}: solde {drift['solde']}€, "
+                f"attendu {drift['attendu']}€ (écart {drift['ecart']}€)"
+            )
+        if correct:
+            self.stdout.write(self.style.SUCCESS(f"✅ {corrected} solde(s) corrigé(s)"))
@@ -0,0 +1,33 @@
+"""
+Commande de réparation des compteurs dénormalisés des comptes
+"""
+import time
+from django.core.management.base import BaseCommand
+
+from my_frais.models import Account
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les compteurs des comptes (opérations, dernière opération, "
+            "prélèvements et revenus actifs) à partir des tables sources")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=int, action='append', dest='accounts',
+                            help='ID de compte à réparer (répétable). Par défaut : tous les comptes')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Nombre de comptes mis à jour par requête')
+
+    def handle(self, *args, **options):
+        start_time = time.time()
+        account_ids = options['accounts']
+        if account_ids is None:
+            account_ids = list(Account.objects.order_by('id').values_list('id', flat=True))
+
+        chunk_size = max(1, options['chunk_size'])
+        updated = 0
+        for index in range(0, len(account_ids), chunk_size):
+            updated += Account.rebuild_counters(account_ids[index:index + chunk_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Compteurs recalculés pour {updated} compte(s) en {time.time() - start_time:.2f}s"
+        ))
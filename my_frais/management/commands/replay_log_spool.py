@@ -0,0 +1,27 @@
+"""
+Commande de rejeu du spool local des logs dans MongoDB
+"""
+from django.core.management.base import BaseCommand
+
+from my_frais.log_spool import log_spool
+from my_frais.mongodb_service import mongodb_service
+
+
+class Command(BaseCommand):
+    help = ("Rejoue dans MongoDB les logs conservés dans le spool local (LOG_SPOOL_SETTINGS['DIRECTORY']) ; "
+            "le rejeu est aussi fait périodiquement par chaque worker")
+
+    def handle(self, *args, **options):
+        if not log_spool.enabled:
+            self.stdout.write(self.style.WARNING("⚠️ Spool des logs non configuré (LOG_SPOOL_DIR)"))
+            return
+
+        replayed = log_spool.replay_once(mongodb_service.replay_logs)
+        remaining = log_spool.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {replayed} log(s) rejoué(s), {remaining['segments']} segment(s) restant(s)"
+        ))
+        if remaining['dead_lettered']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {remaining['dead_lettered']} log(s) refusé(s) par MongoDB, conservé(s) dans les fichiers dead-*.jsonl"
+            ))
@@ -0,0 +1,381 @@
+"""
+Métriques des requêtes HTTP (histogrammes de durée par route, méthode et statut), requêtes SQL
+et état de la chaîne de logs, exposées au format texte Prometheus sur /metrics.
+
+Chaque worker (gunicorn) tient ses compteurs en mémoire et les recopie régulièrement dans
+METRICS_SETTINGS['DIRECTORY'] (un fichier JSON par processus, nommé par pid et par un jeton
+propre au processus, remplacé atomiquement) ; /metrics additionne les fichiers de tous les
+workers. Le fichier d'un worker arrêté est fusionné dans metrics-retired.json : les compteurs
+ne baissent pas au redémarrage d'un worker, même si son pid est réutilisé. Sans dossier, seul
+le worker qui répond est compté.
+"""
+import atexit
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre workers
+    fcntl = None
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from my_frais.log_writer import log_writer
+from my_frais.mongodb_service import mongodb_service
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_METRICS_SETTINGS = {
+    'ENABLED': True,
+    'DIRECTORY': None,
+    # Recopie des compteurs du worker dans son fichier, au plus toutes les N secondes
+    'WRITE_INTERVAL': 5.0,
+    # Jeton attendu dans « Authorization: Bearer <jeton> » ; sans jeton, accès local uniquement
+    'TOKEN': None,
+}
+
+# Bornes (secondes) des classes des histogrammes de durée, en échelle logarithmique
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+
+RETIRED_FILE = 'metrics-retired.json'
+LOCK_FILE = 'metrics.lock'
+
+
+def metrics_setting(name):
+    return getattr(settings, 'METRICS_SETTINGS', {}).get(name, DEFAULT_METRICS_SETTINGS[name])
+
+
+def route_name(request) -> str:
+    """Nom de la route résolue (cardinalité bornée) ; 'unresolved' pour les 404 de résolution"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route or 'unresolved'
+
+
+class QueryCounter:
+    """Wrapper d'exécution SQL (connection.execute_wrapper) qui compte les requêtes"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class RequestMetrics:
+    """Compteurs du processus courant (remis à zéro dans un processus forké)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_write = 0.0
+        self._reset()
+        atexit.register(self.write_snapshot)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Nom du fichier propre à ce processus : un worker qui réutilise le pid d'un worker
+        # arrêté n'écrase pas ses compteurs
+        self._instance = f'{self._pid}-{uuid.uuid4().hex[:12]}'
+        # (route, méthode, statut) -> {'buckets': [...], 'sum': s, 'count': n, 'db_queries': q}
+        self.series: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def observe(self, route: str, method: str, status: int, duration: float, db_queries: int):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            series = self.series.get((route, method, str(status)))
+            if series is None:
+                series = {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0.0, 'count': 0, 'db_queries': 0}
+                self.series[(route, method, str(status))] = series
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += duration
+            series['count'] += 1
+            series['db_queries'] += db_queries
+        if time.monotonic() - self._last_write >= metrics_setting('WRITE_INTERVAL'):
+            self.write_snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Compteurs du processus, y compris ceux de la chaîne de logs (cumulatifs) et ses jauges"""
+        with self._lock:
+            series = [
+                {'route': route, 'method': method, 'status': status, **values,
+                 'buckets': list(values['buckets'])}
+                for (route, method, status), values in self.series.items()
+            ]
+        writer_stats = log_writer.stats()
+        # Disjoncteur seulement : mongodb_service.stats() parcourt aussi le spool sur disque
+        breaker_stats = mongodb_service.breaker.stats()
+        return {
+            'pid': os.getpid(),
+            'series': series,
+            'counters': {
+                'log_writer_events_total': {
+                    status: writer_stats[status] for status in ('queued', 'written', 'failed', 'dropped', 'spilled')
+                },
+                'mongodb_fallback_total': mongodb_service.fallback_total,
+                'mongodb_circuit_opened_total': breaker_stats['opened_total'],
+            },
+            'gauges': {
+                'log_writer_queue_depth': writer_stats['queue_depth'],
+                'mongodb_circuit_state': breaker_stats['state_code'],
+            },
+        }
+
+    def _path(self) -> str:
+        return os.path.join(metrics_setting('DIRECTORY'), f'metrics-{self._instance}.json')
+
+    def write_snapshot(self):
+        """Recopie les compteurs du worker dans son fichier (remplacement atomique)"""
+        directory = metrics_setting('DIRECTORY')
+        self._last_write = time.monotonic()
+        if not directory or self._pid != os.getpid():
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = self._path()
+            temporary = f'{path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(temporary, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Écriture des métriques impossible: {e}")
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """Instantanés de tous les workers (fichiers) ; celui du processus courant est frais"""
+        directory = metrics_setting('DIRECTORY')
+        if not directory:
+            return [self.snapshot()]
+        self.write_snapshot()
+        try:
+            self._retire_dead_workers(directory)
+            with _directory_lock(directory, exclusive=False):
+                return self._read_snapshots(directory)
+        except OSError as e:
+            logger.warning(f"Lecture des métriques des workers impossible: {e}")
+            return [self.snapshot()]
+
+    @staticmethod
+    def _read_snapshots(directory: str) -> List[Dict[str, Any]]:
+        """Fichiers des workers et totaux des workers arrêtés (sans les fichiers déjà fusionnés)"""
+        retired = _load_snapshot(os.path.join(directory, RETIRED_FILE))
+        merged = set(retired.get('instances', [])) if retired else set()
+        snapshots = [retired] if retired else []
+        for name in sorted(os.listdir(directory)):
+            if _snapshot_pid(name) is None or name in merged:
+                continue
+            snapshot = _load_snapshot(os.path.join(directory, name))
+            if snapshot:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def _retire_dead_workers(self, directory: str):
+        """
+        Fusionne les fichiers des workers arrêtés dans RETIRED_FILE, puis les supprime. Le nom
+        des fichiers fusionnés y est noté : une interruption entre les deux étapes ne compte
+        jamais un worker deux fois.
+        """
+        dead = [
+            name for name in os.listdir(directory)
+            if _snapshot_pid(name) not in (None, os.getpid()) and not _process_alive(_snapshot_pid(name))
+        ]
+        if not dead:
+            return
+        with _directory_lock(directory, exclusive=True):
+            retired_path = os.path.join(directory, RETIRED_FILE)
+            retired = _load_snapshot(retired_path) or {'pid': None, 'series': [], 'counters': {}, 'instances': []}
+            merged = set(retired.get('instances', []))
+            snapshots = [retired]
+            for name in dead:
+                snapshot = None if name in merged else _load_snapshot(os.path.join(directory, name))
+                if snapshot:
+                    snapshots.append(snapshot)
+                    merged.add(name)
+            if len(snapshots) > 1:
+                series, counters = merge_snapshots(snapshots)
+                existing = set(os.listdir(directory))
+                retired = {
+                    'pid': None,
+                    'series': [
+                        {'route': route, 'method': method, 'status': status, **values}
+                        for (route, method, status), values in series.items()
+                    ],
+                    'counters': counters,
+                    # Seuls les fichiers encore présents doivent être ignorés à la lecture
+                    'instances': sorted(name for name in merged if name in existing),
+                }
+                temporary = f'{retired_path}.tmp'
+                with open(temporary, 'w', encoding='utf-8') as retired_file:
+                    json.dump(retired, retired_file)
+                os.replace(temporary, retired_path)
+            for name in dead:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+# Instance globale (une par processus)
+request_metrics = RequestMetrics()
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshot_pid(name: str) -> Optional[int]:
+    """pid d'un fichier de worker (metrics-<pid>-<jeton>.json), None pour les autres fichiers"""
+    if not name.startswith('metrics-') or not name.endswith('.json'):
+        return None
+    try:
+        return int(name[len('metrics-'):-len('.json')].split('-')[0])
+    except ValueError:
+        return None
+
+
+def _load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding='utf-8') as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _directory_lock(directory: str, exclusive: bool):
+    """Verrou du dossier : la fusion d'un worker arrêté n'est jamais vue à moitié par une lecture"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, str, str], Dict[str, Any]], Dict[str, Any]]:
+    """Additionne les séries et les compteurs de plusieurs instantanés (jauges exclues)"""
+    series: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    counters: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for values in snapshot.get('series', []):
+            key = (values['route'], values['method'], values['status'])
+            merged = series.setdefault(key, {'buckets': [0] * len(DURATION_BUCKETS), 'sum': 0.0, 'count': 0,
+                                             'db_queries': 0})
+            merged['buckets'] = [total + count for total, count in zip(merged['buckets'], values['buckets'])]
+            merged['sum'] += values['sum']
+            merged['count'] += values['count']
+            merged['db_queries'] += values['db_queries']
+        for name, value in snapshot.get('counters', {}).items():
+            if isinstance(value, dict):
+                totals = counters.setdefault(name, {})
+                for label, count in value.items():
+                    totals[label] = totals.get(label, 0) + count
+            else:
+                counters[name] = counters.get(name, 0) + value
+    return series, counters
+
+
+def render_metrics(snapshots: List[Dict[str, Any]]) -> str:
+    """Agrège les instantanés des workers au format texte Prometheus (0.0.4)"""
+    series, counters = merge_snapshots(snapshots)
+    lines = []
+
+    lines += [
+        '# HELP http_request_duration_seconds Durée des requêtes HTTP par route, méthode et statut',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (route, method, status), values in sorted(series.items()):
+        for bound, count in zip(DURATION_BUCKETS, values['buckets']):
+            labels = _labels(route=route, method=method, status=status, le=_format_bound(bound))
+            lines.append(f'http_request_duration_seconds_bucket{labels} {count}')
+        labels = _labels(route=route, method=method, status=status, le='+Inf')
+        lines.append(f'http_request_duration_seconds_bucket{labels} {values["count"]}')
+        labels = _labels(route=route, method=method, status=status)
+        lines.append(f'http_request_duration_seconds_sum{labels} {values["sum"]}')
+        lines.append(f'http_request_duration_seconds_count{labels} {values["count"]}')
+
+    lines += [
+        '# HELP django_db_queries_total Requêtes SQL exécutées pendant les requêtes HTTP',
+        '# TYPE django_db_queries_total counter',
+    ]
+    for (route, method, status), values in sorted(series.items()):
+        lines.append(f'django_db_queries_total{_labels(route=route, method=method, status=status)} {values["db_queries"]}')
+
+    lines += [
+        '# HELP log_writer_events_total Logs applicatifs par issue (file, écrits, en échec, ignorés, spoolés)',
+        '# TYPE log_writer_events_total counter',
+    ]
+    for status, count in sorted(counters.get('log_writer_events_total', {}).items()):
+        lines.append(f'log_writer_events_total{_labels(status=status)} {count}')
+    for name, help_text in (
+        ('mongodb_fallback_total', 'Logs envoyés au spool local faute de MongoDB'),
+        ('mongodb_circuit_opened_total', 'Ouvertures du disjoncteur MongoDB'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {counters.get(name, 0)}']
+
+    # Jauges : workers encore en vie seulement, une série par processus
+    for name, help_text in (
+        ('log_writer_queue_depth', "Logs en attente d'écriture"),
+        ('mongodb_circuit_state', 'État du disjoncteur MongoDB (0 fermé, 1 semi-ouvert, 2 ouvert)'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        for snapshot in snapshots:
+            if name in snapshot.get('gauges', {}) and _process_alive(snapshot['pid']):
+                lines.append(f'{name}{_labels(pid=snapshot["pid"])} {snapshot["gauges"][name]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _authorized(request) -> bool:
+    token = metrics_setting('TOKEN')
+    if token:
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), f'Bearer {token}'.encode())
+    return request.META.get('REMOTE_ADDR') in LOCAL_ADDRESSES
+
+
+@require_GET
+def metrics_view(request):
+    """Métriques agrégées de tous les workers (format texte Prometheus)"""
+    if not _authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(request_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -2,6 +2,11 @@
 Middleware pour le logging automatique des requêtes et erreurs
 """
 from my_frais.logging_service import app_logger
+from my_frais.metrics import QueryCounter, metrics_setting, request_metrics, route_name
+from my_frais.query_profiler import QueryProfiler, query_profiler_setting
+from auth_api.jwt_auth import JWTAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from django.db import connection
 from django.http import HttpRequest, HttpResponse
 from django.utils.deprecation import MiddlewareMixin
 import time
@@ -13,6 +18,22 @@ logger = logging.getLogger(__name__)
 class LoggingMiddleware(MiddlewareMixin):
     """Middleware pour logger automatiquement les requêtes et erreurs"""
     
+    def __call__(self, request: HttpRequest):
+        """Mesure chaque requête (durée, statut, route, requêtes SQL) pour /metrics (cf. my_frais.metrics)"""
+        if not metrics_setting('ENABLED'):
+            return super().__call__(request)
+        
+        query_counter = QueryCounter()
+        request.query_counter = query_counter
+        started = time.perf_counter()
+        with connection.execute_wrapper(query_counter):
+            response = super().__call__(request)
+        request_metrics.observe(
+            route_name(request), request.method, response.status_code,
+            time.perf_counter() - started, query_counter.count
+        )
+        return response
+    
     def _should_log_request(self, request: HttpRequest) -> bool:
         """Détermine si une requête doit être loggée"""
         # Exclure les requêtes de l'interface admin
@@ -53,6 +74,20 @@ class LoggingMiddleware(MiddlewareMixin):
                     details={'path': request.path}
                 )
     
+    @staticmethod
+    def _slow_request_details(request: HttpRequest, response: HttpResponse, duration: float) -> dict:
+        """Détails d'une requête lente, avec le profil SQL s'il a été relevé (QueryProfilerMiddleware)"""
+        details = {
+            'duration': duration,
+            'status_code': response.status_code,
+            'path': request.path
+        }
+        if hasattr(request, 'query_profile'):
+            details['queries'] = request.query_profile
+        elif hasattr(request, 'query_counter'):
+            details['queries'] = {'count': request.query_counter.count}
+        return details
+    
     def process_response(self, request: HttpRequest, response: HttpResponse):
         """Log la fin de la requête"""
         if not self._should_log_request(request):
@@ -67,11 +102,7 @@ class LoggingMiddleware(MiddlewareMixin):
                     event_type='slow_request',
                     category='performance',
                     request=request,
-                    details={
-                        'duration': duration,
-                        'status_code': response.status_code,
-                        'path': request.path
-                    }
+                    details=self._slow_request_details(request, response, duration)
                 )
             
             # Log des erreurs 4xx et 5xx - seulement pour les API et pages importantes
@@ -100,4 +131,48 @@ class LoggingMiddleware(MiddlewareMixin):
                 request=request,
                 context={'path': request.path, 'method': request.method}
             )
-        return None 
\ No newline at end of file
+        return None
+
+
+class QueryProfilerMiddleware(MiddlewareMixin):
+    """
+    Profilage SQL sur demande (cf. my_frais.query_profiler) : toutes les requêtes si
+    QUERY_PROFILER_SETTINGS['ENABLED'], sinon celles du staff portant l'en-tête X-Profile-Queries.
+    Le résumé est ajouté aux en-têtes de la réponse et au log des requêtes lentes ;
+    à placer après LoggingMiddleware.
+    """
+    
+    def _is_requested(self, request: HttpRequest) -> bool:
+        if query_profiler_setting('ENABLED'):
+            return True
+        header = 'HTTP_' + query_profiler_setting('HEADER').upper().replace('-', '_')
+        if request.META.get(header) not in ('1', 'true', 'yes'):
+            return False
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        # API : utilisateur du token JWT (l'authentification DRF n'a lieu que dans la vue)
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return authenticated is not None and authenticated[0].is_staff
+    
+    def __call__(self, request: HttpRequest):
+        if not self._is_requested(request):
+            return super().__call__(request)
+        
+        profiler = QueryProfiler()
+        with connection.execute_wrapper(profiler):
+            response = super().__call__(request)
+        
+        request.query_profile = profiler.summary()
+        for name, value in profiler.headers().items():
+            response[name] = value
+        if request.query_profile['n_plus_one']:
+            worst = request.query_profile['n_plus_one'][0]
+            logger.warning(
+                f"N+1 probable sur {request.method} {request.path}: {worst['count']}x {worst['sql'][:200]}"
+                f" ({worst['origin'] or 'origine inconnue'})"
+            )
+        return response
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.3 on 2026-10-18 23:56
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    """Construit les agrégats journaliers à partir des opérations existantes"""
+    Operation = apps.get_model('my_frais', 'Operation')
+    OperationDailyRollup = apps.get_model('my_frais', 'OperationDailyRollup')
+
+    grouped = Operation.objects.annotate(day=TruncDate('created_at')).values('compte_reference_id', 'day').annotate(
+        operations_count=Count('id'),
+        total_amount=Sum('montant'),
+        positive_count=Count('id', filter=Q(montant__gt=0)),
+        positive_amount=Sum('montant', filter=Q(montant__gt=0)),
+        negative_count=Count('id', filter=Q(montant__lt=0)),
+        negative_amount=Sum('montant', filter=Q(montant__lt=0)),
+    ).order_by()
+
+    OperationDailyRollup.objects.bulk_create([
+        OperationDailyRollup(
+            compte_reference_id=row['compte_reference_id'],
+            day=row['day'],
+            operations_count=row['operations_count'],
+            total_amount=row['total_amount'] or Decimal('0.00'),
+            positive_count=row['positive_count'],
+            positive_amount=row['positive_amount'] or Decimal('0.00'),
+            negative_count=row['negative_count'],
+            negative_amount=row['negative_amount'] or Decimal('0.00'),
+        )
+        for row in grouped.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_frais', '0008_add_automatic_transaction_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OperationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Jour de création des opérations agrégées')),
+                ('operations_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('positive_count', models.IntegerField(default=0)),
+                ('positive_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('negative_count', models.IntegerField(default=0)),
+                ('negative_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('compte_reference', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='my_frais.account')),
+            ],
+            options={
+                'verbose_name': "Agrégat journalier d'opérations",
+                'verbose_name_plural': "Agrégats journaliers d'opérations",
+                'ordering': ['-day'],
+                'unique_together': {('compte_reference', 'day')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
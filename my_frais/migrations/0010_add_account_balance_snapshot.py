@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_frais', '0009_add_operation_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_snapshot', models.DateField(help_text='Jour dont le solde de fin de journée est enregistré')),
+                ('solde', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('compte_reference', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='my_frais.account')),
+            ],
+            options={
+                'verbose_name': 'Solde journalier',
+                'verbose_name_plural': 'Soldes journaliers',
+                'ordering': ['-date_snapshot'],
+                'unique_together': {('compte_reference', 'date_snapshot')},
+            },
+        ),
+    ]
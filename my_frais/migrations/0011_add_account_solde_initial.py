@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:03
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def compute_solde_initial(apps, schema_editor):
+    """
+    Solde d'ouverture = solde actuel - opérations - transactions automatiques.
+    L'état actuel sert de référence pour les rapprochements suivants.
+    """
+    Account = apps.get_model('my_frais', 'Account')
+    Operation = apps.get_model('my_frais', 'Operation')
+    AutomaticTransaction = apps.get_model('my_frais', 'AutomaticTransaction')
+
+    operations = dict(
+        Operation.objects.filter(directdebit__isnull=True).values('compte_reference_id')
+        .annotate(total=Sum('montant')).order_by().values_list('compte_reference_id', 'total')
+    )
+    transactions = dict(
+        AutomaticTransaction.objects.values('compte_reference_id')
+        .annotate(total=Sum('montant')).order_by().values_list('compte_reference_id', 'total')
+    )
+    for account in Account.objects.only('id', 'solde').iterator():
+        solde_initial = account.solde - (operations.get(account.id) or Decimal('0')) - (transactions.get(account.id) or Decimal('0'))
+        Account.objects.filter(id=account.id).update(solde_initial=solde_initial)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_frais', '0010_add_account_balance_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='solde_initial',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text="Solde d'ouverture, base du rapprochement avec les opérations et transactions automatiques", max_digits=20, null=True),
+        ),
+        migrations.RunPython(compute_solde_initial, migrations.RunPython.noop),
+    ]
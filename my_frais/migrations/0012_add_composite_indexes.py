@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_frais', '0011_add_account_solde_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='automatedtask',
+            index=models.Index(fields=['created_by', 'execution_date', 'status'], name='task_user_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='automatictransaction',
+            index=models.Index(fields=['compte_reference', 'date_transaction', 'transaction_type'], name='autotx_compte_date_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='directdebit',
+            index=models.Index(fields=['actif', 'date_prelevement', 'echeance'], name='directdebit_actif_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['compte_reference', 'created_at'], name='operation_compte_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringincome',
+            index=models.Index(fields=['actif', 'date_premier_versement', 'date_fin'], name='income_actif_date_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def compute_counters(apps, schema_editor):
+    """Initialise les compteurs des comptes à partir des tables sources"""
+    Account = apps.get_model('my_frais', 'Account')
+    Operation = apps.get_model('my_frais', 'Operation')
+    DirectDebit = apps.get_model('my_frais', 'DirectDebit')
+    RecurringIncome = apps.get_model('my_frais', 'RecurringIncome')
+
+    def count_of(queryset):
+        return Coalesce(Subquery(
+            queryset.order_by().values('compte_reference').annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    Account.objects.update(
+        operations_count=count_of(Operation.objects.filter(compte_reference=OuterRef('pk'))),
+        last_operation_at=Subquery(
+            Operation.objects.filter(compte_reference=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+        ),
+        active_debits_count=count_of(DirectDebit.objects.filter(compte_reference=OuterRef('pk'), actif=True)),
+        active_incomes_count=count_of(RecurringIncome.objects.filter(compte_reference=OuterRef('pk'), actif=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_frais', '0012_add_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='active_debits_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='active_incomes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='last_operation_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='operations_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
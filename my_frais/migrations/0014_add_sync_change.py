@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-19 00:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_existing_objects(apps, schema_editor):
+    """Journalise les objets existants pour la première synchronisation des clients"""
+    SyncChange = apps.get_model('my_frais', 'SyncChange')
+    sources = [
+        ('account', apps.get_model('my_frais', 'Account'), 'user_id'),
+        ('operation', apps.get_model('my_frais', 'Operation'), 'compte_reference__user_id'),
+        ('direct_debit', apps.get_model('my_frais', 'DirectDebit'), 'compte_reference__user_id'),
+        ('recurring_income', apps.get_model('my_frais', 'RecurringIncome'), 'compte_reference__user_id'),
+        ('budget_projection', apps.get_model('my_frais', 'BudgetProjection'), 'compte_reference__user_id'),
+    ]
+    for model_name, model, owner_field in sources:
+        batch = []
+        for object_id, user_id in model.objects.order_by('pk').values_list('pk', owner_field).iterator():
+            batch.append(SyncChange(model_name=model_name, object_id=object_id, user_id=user_id))
+            if len(batch) >= 1000:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_frais', '0013_add_account_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(choices=[('account', 'Compte'), ('operation', 'Opération'), ('direct_debit', 'Prélèvement automatique'), ('recurring_income', 'Revenu récurrent'), ('budget_projection', 'Projection budgétaire')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Changement synchronisé',
+                'verbose_name_plural': 'Changements synchronisés',
+                'indexes': [models.Index(fields=['user', 'id'], name='syncchange_user_id_idx')],
+                'unique_together': {('model_name', 'object_id')},
+            },
+        ),
+        migrations.RunPython(record_existing_objects, migrations.RunPython.noop),
+    ]
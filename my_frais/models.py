@@ -1,12 +1,15 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models import F, Q, Sum, Count, OuterRef, Subquery, Value
+from django.db.models.functions import TruncDate, Coalesce, Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 import time
-from django.db import transaction
+from django.db import transaction, IntegrityError
 
 class BaseModel(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='%(class)s_created')
@@ -20,10 +23,72 @@ class Account(BaseModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='accounts')
     nom = models.CharField(max_length=100, default="Compte bancaire")
     solde = models.DecimalField(decimal_places=2, max_digits=20, default=Decimal(0.0))
+    solde_initial = models.DecimalField(
+        decimal_places=2, max_digits=20, null=True, blank=True,
+        help_text="Solde d'ouverture, base du rapprochement avec les opérations et transactions automatiques"
+    )
+    # Compteurs dénormalisés, maintenus par les signaux et réparables via repair_account_counters
+    operations_count = models.IntegerField(default=0)
+    last_operation_at = models.DateTimeField(null=True, blank=True)
+    active_debits_count = models.IntegerField(default=0)
+    active_incomes_count = models.IntegerField(default=0)
 
     def __str__(self):
         return f"{self.nom} - {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        # Le solde d'ouverture est celui fourni à la création du compte
+        if self._state.adding and self.solde_initial is None:
+            self.solde_initial = self.solde
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def apply_counters(cls, account_id, operations=0, active_debits=0, active_incomes=0, last_operation_at=None):
+        """Incrémente les compteurs d'un compte en une requête UPDATE atomique"""
+        values = {}
+        if operations:
+            values['operations_count'] = F('operations_count') + operations
+        if active_debits:
+            values['active_debits_count'] = F('active_debits_count') + active_debits
+        if active_incomes:
+            values['active_incomes_count'] = F('active_incomes_count') + active_incomes
+        if last_operation_at is not None:
+            values['last_operation_at'] = Greatest(
+                Coalesce('last_operation_at', Value(last_operation_at)), Value(last_operation_at)
+            )
+        if values:
+            cls.objects.filter(id=account_id).update(**values)
+
+    @classmethod
+    def refresh_last_operation(cls, account_id):
+        """Recalcule la date de dernière opération (après suppression ou déplacement)"""
+        cls.objects.filter(id=account_id).update(last_operation_at=Subquery(
+            Operation.objects.filter(compte_reference=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+        ))
+
+    @classmethod
+    def rebuild_counters(cls, account_ids=None):
+        """
+        Recalcule les compteurs à partir des tables sources (tous les comptes ou une liste)
+        Retourne le nombre de comptes mis à jour
+        """
+        def count_of(queryset):
+            return Coalesce(Subquery(
+                queryset.order_by().values('compte_reference').annotate(total=Count('pk')).values('total')
+            ), 0)
+
+        accounts = cls.objects.all()
+        if account_ids is not None:
+            accounts = accounts.filter(id__in=account_ids)
+        return accounts.update(
+            operations_count=count_of(Operation.objects.filter(compte_reference=OuterRef('pk'))),
+            last_operation_at=Subquery(
+                Operation.objects.filter(compte_reference=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+            ),
+            active_debits_count=count_of(DirectDebit.objects.filter(compte_reference=OuterRef('pk'), actif=True)),
+            active_incomes_count=count_of(RecurringIncome.objects.filter(compte_reference=OuterRef('pk'), actif=True)),
+        )
+
 class Operation(BaseModel):
     compte_reference = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='operations')
     montant = models.DecimalField(decimal_places=2, max_digits=20)
@@ -37,6 +102,12 @@ class Operation(BaseModel):
         ('manual', 'Opération manuelle')
     ], default='manual')
 
+    class Meta:
+        indexes = [
+            # Listes et agrégats par compte triés par date de création
+            models.Index(fields=['compte_reference', 'created_at'], name='operation_compte_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.description} - {self.montant}€"
 
@@ -60,12 +131,144 @@ class AutomaticTransaction(BaseModel):
     class Meta:
         unique_together = ['source_id', 'transaction_type']
         ordering = ['-date_transaction', '-created_at']
+        indexes = [
+            # Historique et projections par compte sur une plage de dates
+            models.Index(fields=['compte_reference', 'date_transaction', 'transaction_type'], name='autotx_compte_date_type_idx'),
+        ]
         verbose_name = "Transaction automatique"
         verbose_name_plural = "Transactions automatiques"
     
     def __str__(self):
         return f"{self.description} - {self.montant}€ ({self.date_transaction})"
 
+class OperationDailyRollup(models.Model):
+    """
+    Agrégat journalier des opérations par compte
+    Évite de re-scanner l'historique des opérations pour les statistiques
+    """
+    compte_reference = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField(help_text="Jour de création des opérations agrégées")
+    operations_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(decimal_places=2, max_digits=20, default=Decimal('0.00'))
+    positive_count = models.IntegerField(default=0)
+    positive_amount = models.DecimalField(decimal_places=2, max_digits=20, default=Decimal('0.00'))
+    negative_count = models.IntegerField(default=0)
+    negative_amount = models.DecimalField(decimal_places=2, max_digits=20, default=Decimal('0.00'))
+
+    class Meta:
+        unique_together = ['compte_reference', 'day']
+        ordering = ['-day']
+        verbose_name = "Agrégat journalier d'opérations"
+        verbose_name_plural = "Agrégats journaliers d'opérations"
+
+    def __str__(self):
+        return f"{self.compte_reference_id} - {self.day} ({self.operations_count} opérations)"
+
+    @staticmethod
+    def day_for(created_at):
+        """Jour de rattachement d'une opération (identique à created_at__date)"""
+        if timezone.is_aware(created_at):
+            return timezone.localtime(created_at).date()
+        return created_at.date()
+
+    @classmethod
+    def apply_delta(cls, compte_reference_id, day, montant, count=1):
+        """
+        Ajoute (count=1) ou retire (count=-1) une opération de l'agrégat du jour.
+        Le retrait ne crée jamais de ligne : si l'agrégat n'existe plus (compte en
+        cours de suppression), il n'y a rien à corriger.
+        """
+        montant = Decimal(montant)
+        delta = montant * count
+        values = {
+            'operations_count': F('operations_count') + count,
+            'total_amount': F('total_amount') + delta,
+        }
+        initial = {
+            'operations_count': count,
+            'total_amount': delta,
+        }
+        if montant > 0:
+            values.update(positive_count=F('positive_count') + count, positive_amount=F('positive_amount') + delta)
+            initial.update(positive_count=count, positive_amount=delta)
+        elif montant < 0:
+            values.update(negative_count=F('negative_count') + count, negative_amount=F('negative_amount') + delta)
+            initial.update(negative_count=count, negative_amount=delta)
+
+        rollups = cls.objects.filter(compte_reference_id=compte_reference_id, day=day)
+        with transaction.atomic():
+            if rollups.update(**values) or count < 0:
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(compte_reference_id=compte_reference_id, day=day, **initial)
+            except IntegrityError:
+                # Créé en parallèle par une autre requête
+                rollups.update(**values)
+
+    @classmethod
+    def rebuild(cls, account_ids=None, batch_size=1000):
+        """
+        Recalcule les agrégats à partir des opérations (tous les comptes ou une liste)
+        Retourne le nombre de lignes d'agrégat créées
+        """
+        operations = Operation.objects.all()
+        rollups = cls.objects.all()
+        if account_ids is not None:
+            operations = operations.filter(compte_reference_id__in=account_ids)
+            rollups = rollups.filter(compte_reference_id__in=account_ids)
+
+        grouped = operations.annotate(day=TruncDate('created_at')).values('compte_reference_id', 'day').annotate(
+            operations_count=Count('id'),
+            total_amount=Sum('montant'),
+            positive_count=Count('id', filter=Q(montant__gt=0)),
+            positive_amount=Sum('montant', filter=Q(montant__gt=0)),
+            negative_count=Count('id', filter=Q(montant__lt=0)),
+            negative_amount=Sum('montant', filter=Q(montant__lt=0)),
+        ).order_by()
+
+        created = 0
+        with transaction.atomic():
+            rollups.delete()
+            batch = []
+            for row in grouped.iterator():
+                batch.append(cls(
+                    compte_reference_id=row['compte_reference_id'],
+                    day=row['day'],
+                    operations_count=row['operations_count'],
+                    total_amount=row['total_amount'] or Decimal('0.00'),
+                    positive_count=row['positive_count'],
+                    positive_amount=row['positive_amount'] or Decimal('0.00'),
+                    negative_count=row['negative_count'],
+                    negative_amount=row['negative_amount'] or Decimal('0.00'),
+                ))
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                cls.objects.bulk_create(batch)
+                created += len(batch)
+        return created
+
+class AccountBalanceSnapshot(models.Model):
+    """
+    Solde de fin de journée d'un compte
+    Permet de retrouver le solde à une date passée sans rejouer l'historique
+    """
+    compte_reference = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_snapshots')
+    date_snapshot = models.DateField(help_text="Jour dont le solde de fin de journée est enregistré")
+    solde = models.DecimalField(decimal_places=2, max_digits=20)
+
+    class Meta:
+        unique_together = ['compte_reference', 'date_snapshot']
+        ordering = ['-date_snapshot']
+        verbose_name = "Solde journalier"
+        verbose_name_plural = "Soldes journaliers"
+
+    def __str__(self):
+        return f"{self.compte_reference_id} - {self.date_snapshot} : {self.solde}€"
+
 class DirectDebit(Operation):
     date_prelevement = models.DateField()
     echeance = models.DateField(blank=True, null=True, default=None)
@@ -76,6 +279,12 @@ class DirectDebit(Operation):
     ], default='Mensuel')
     actif = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Prélèvements actifs arrivés à échéance (traitement quotidien, tableaux de bord)
+            models.Index(fields=['actif', 'date_prelevement', 'echeance'], name='directdebit_actif_date_idx'),
+        ]
+
     def as_echeance(self) -> bool:
         return True if self.echeance else False
     
@@ -176,7 +385,8 @@ class DirectDebit(Operation):
             next_payment_date = self.get_next_occurrence(today)
             if next_payment_date:
                 # Utiliser update pour éviter de déclencher les signaux
-                DirectDebit.objects.filter(id=self.id).update(date_prelevement=next_payment_date)
+                DirectDebit.objects.filter(id=self.id).update(date_prelevement=next_payment_date, updated_at=timezone.now())
+                SyncChange.record_updated(DirectDebit.objects.filter(id=self.id))
                 self.date_prelevement = next_payment_date
             
             return True
@@ -226,6 +436,12 @@ class RecurringIncome(BaseModel):
         ('Autre', 'Autre')
     ], default='Salaire')
 
+    class Meta:
+        indexes = [
+            # Revenus actifs arrivés à échéance (traitement quotidien, tableaux de bord)
+            models.Index(fields=['actif', 'date_premier_versement', 'date_fin'], name='income_actif_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type_revenu} - {self.description} - {self.montant}€"
 
@@ -326,7 +542,8 @@ class RecurringIncome(BaseModel):
             next_income_date = self.get_next_occurrence(today)
             if next_income_date:
                 # Utiliser update pour éviter de déclencher les signaux
-                RecurringIncome.objects.filter(id=self.id).update(date_premier_versement=next_income_date)
+                RecurringIncome.objects.filter(id=self.id).update(date_premier_versement=next_income_date, updated_at=timezone.now())
+                SyncChange.record_updated(RecurringIncome.objects.filter(id=self.id))
                 self.date_premier_versement = next_income_date
             
             return True
@@ -411,6 +628,10 @@ class AutomatedTask(BaseModel):
         verbose_name = "Tâche automatique"
         verbose_name_plural = "Tâches automatiques"
         ordering = ['-execution_date']
+        indexes = [
+            # Historique des tâches d'un utilisateur par date et statut
+            models.Index(fields=['created_by', 'execution_date', 'status'], name='task_user_date_status_idx'),
+        ]
     
     def __str__(self):
         return f"Tâche automatique #{self.id} - {self.task_type} - {self.status}"
@@ -436,6 +657,70 @@ class AutomatedTask(BaseModel):
             created_by=user
         )
 
+class SyncChange(models.Model):
+    """
+    Journal des changements pour la synchronisation différentielle (endpoint sync/)
+    Une seule ligne par objet : chaque écriture la remplace par une nouvelle (nouvel ID,
+    donc position plus récente du curseur). deleted=True sert de tombstone.
+    """
+    MODEL_CHOICES = [
+        ('account', 'Compte'),
+        ('operation', 'Opération'),
+        ('direct_debit', 'Prélèvement automatique'),
+        ('recurring_income', 'Revenu récurrent'),
+        ('budget_projection', 'Projection budgétaire'),
+    ]
+
+    # Pas de contrainte : les tombstones d'un utilisateur en cours de suppression restent insérables
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    model_name = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['model_name', 'object_id']
+        indexes = [
+            # Lecture des changements d'un utilisateur après un curseur
+            models.Index(fields=['user', 'id'], name='syncchange_user_id_idx'),
+        ]
+        verbose_name = "Changement synchronisé"
+        verbose_name_plural = "Changements synchronisés"
+
+    def __str__(self):
+        return f"{self.model_name} #{self.object_id} ({'supprimé' if self.deleted else 'modifié'})"
+
+    @classmethod
+    def record(cls, model_name, object_id, user_id, deleted=False):
+        """Enregistre la dernière modification (ou la suppression) d'un objet"""
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    cls.objects.filter(model_name=model_name, object_id=object_id).delete()
+                    cls.objects.create(model_name=model_name, object_id=object_id, user_id=user_id, deleted=deleted)
+                return
+            except IntegrityError:
+                # Même objet enregistré en parallèle par une autre requête
+                if attempt:
+                    raise
+
+    @classmethod
+    def record_updated(cls, queryset):
+        """Journalise les objets d'un queryset modifiés via update(), qui n'émet pas de signal"""
+        model = queryset.model
+        owner_field = 'user_id' if model is Account else 'compte_reference__user_id'
+        owners = dict(queryset.order_by().values_list('id', owner_field))
+        if not owners:
+            return
+        model_names = [SYNC_MODEL_NAMES[model]] + (['operation'] if model is DirectDebit else [])
+        with transaction.atomic():
+            for model_name in model_names:
+                cls.objects.filter(model_name=model_name, object_id__in=list(owners)).delete()
+                cls.objects.bulk_create([
+                    cls(model_name=model_name, object_id=object_id, user_id=user_id)
+                    for object_id, user_id in owners.items()
+                ])
+
 # Signaux pour le traitement automatique des prélèvements
 @receiver(post_save, sender=DirectDebit)
 def trigger_payment_processing(sender, instance, created, **kwargs):
@@ -550,3 +835,154 @@ def trigger_income_processing(sender, instance, created, **kwargs):
             user=instance.created_by
         )
     
+
+# Signaux pour la maintenance des agrégats journaliers d'opérations et des compteurs des comptes
+# (DirectDebit hérite d'Operation : ses sauvegardes émettent des signaux avec sender=DirectDebit)
+@receiver(pre_save, sender=Operation)
+@receiver(pre_save, sender=DirectDebit)
+def capture_operation_before_update(sender, instance, **kwargs):
+    """Mémorise l'état en base d'une opération avant sa mise à jour"""
+    instance._previous_state = None
+    if instance.pk and not instance._state.adding:
+        fields = ['compte_reference_id', 'montant', 'created_at']
+        if sender is DirectDebit:
+            fields.append('actif')
+        instance._previous_state = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=Operation)
+@receiver(post_save, sender=DirectDebit)
+def update_operation_aggregates_on_save(sender, instance, created, **kwargs):
+    """Répercute la création ou la modification d'une opération sur les agrégats et les compteurs"""
+    current = (instance.compte_reference_id, OperationDailyRollup.day_for(instance.created_at), instance.montant)
+    previous = getattr(instance, '_previous_state', None)
+    instance._previous_state = None
+    is_debit = sender is DirectDebit
+    active = bool(is_debit and instance.actif)
+
+    with transaction.atomic():
+        if previous is None:
+            Account.apply_counters(
+                instance.compte_reference_id, operations=1, active_debits=int(active),
+                last_operation_at=instance.created_at
+            )
+            OperationDailyRollup.apply_delta(*current, count=1)
+            return
+
+        was_active = bool(is_debit and previous.get('actif'))
+        if previous['compte_reference_id'] != instance.compte_reference_id:
+            Account.apply_counters(previous['compte_reference_id'], operations=-1, active_debits=-int(was_active))
+            Account.refresh_last_operation(previous['compte_reference_id'])
+            Account.apply_counters(
+                instance.compte_reference_id, operations=1, active_debits=int(active),
+                last_operation_at=instance.created_at
+            )
+        elif active != was_active:
+            Account.apply_counters(instance.compte_reference_id, active_debits=1 if active else -1)
+
+        previous = (previous['compte_reference_id'], OperationDailyRollup.day_for(previous['created_at']), previous['montant'])
+        if previous != current:
+            OperationDailyRollup.apply_delta(*previous, count=-1)
+            OperationDailyRollup.apply_delta(*current, count=1)
+
+
+@receiver(post_delete, sender=Operation)
+@receiver(post_delete, sender=DirectDebit)
+def update_operation_aggregates_on_delete(sender, instance, **kwargs):
+    """Retire une opération supprimée des agrégats et des compteurs"""
+    if sender is DirectDebit:
+        # La suppression de la ligne parente Operation émet déjà son propre signal
+        if instance.actif:
+            Account.apply_counters(instance.compte_reference_id, active_debits=-1)
+        return
+    Account.apply_counters(instance.compte_reference_id, operations=-1)
+    Account.refresh_last_operation(instance.compte_reference_id)
+    OperationDailyRollup.apply_delta(
+        instance.compte_reference_id,
+        OperationDailyRollup.day_for(instance.created_at),
+        instance.montant,
+        count=-1
+    )
+
+
+# Signaux pour le compteur de revenus actifs des comptes
+@receiver(pre_save, sender=RecurringIncome)
+def capture_income_before_update(sender, instance, **kwargs):
+    """Mémorise le compte et le statut d'un revenu avant sa mise à jour"""
+    instance._previous_state = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_state = RecurringIncome.objects.filter(pk=instance.pk).values(
+            'compte_reference_id', 'actif'
+        ).first()
+
+
+@receiver(post_save, sender=RecurringIncome)
+def update_income_counters_on_save(sender, instance, created, **kwargs):
+    """Répercute la création ou la modification d'un revenu sur le compteur du compte"""
+    previous = getattr(instance, '_previous_state', None)
+    instance._previous_state = None
+    if previous is None:
+        if instance.actif:
+            Account.apply_counters(instance.compte_reference_id, active_incomes=1)
+        return
+
+    if previous['compte_reference_id'] != instance.compte_reference_id or previous['actif'] != instance.actif:
+        with transaction.atomic():
+            if previous['actif']:
+                Account.apply_counters(previous['compte_reference_id'], active_incomes=-1)
+            if instance.actif:
+                Account.apply_counters(instance.compte_reference_id, active_incomes=1)
+
+
+@receiver(post_delete, sender=RecurringIncome)
+def update_income_counters_on_delete(sender, instance, **kwargs):
+    """Retire un revenu supprimé du compteur du compte"""
+    if instance.actif:
+        Account.apply_counters(instance.compte_reference_id, active_incomes=-1)
+
+
+# Signaux pour le journal de synchronisation (SyncChange)
+def _sync_owner_id(instance):
+    """Utilisateur propriétaire d'un objet synchronisé"""
+    if isinstance(instance, Account):
+        return instance.user_id
+    return Account.objects.filter(id=instance.compte_reference_id).values_list('user_id', flat=True).first()
+
+
+SYNC_MODEL_NAMES = {
+    Account: 'account',
+    Operation: 'operation',
+    DirectDebit: 'direct_debit',
+    RecurringIncome: 'recurring_income',
+    BudgetProjection: 'budget_projection',
+}
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_save, sender=Operation)
+@receiver(post_save, sender=DirectDebit)
+@receiver(post_save, sender=RecurringIncome)
+@receiver(post_save, sender=BudgetProjection)
+def record_sync_change_on_save(sender, instance, **kwargs):
+    """Journalise la création ou la modification d'un objet synchronisé"""
+    user_id = _sync_owner_id(instance)
+    if user_id is None:
+        return
+    SyncChange.record(SYNC_MODEL_NAMES[sender], instance.pk, user_id)
+    if sender is DirectDebit:
+        # Un prélèvement figure aussi dans la liste des opérations
+        SyncChange.record('operation', instance.pk, user_id)
+
+
+@receiver(post_delete, sender=Account)
+@receiver(post_delete, sender=Operation)
+@receiver(post_delete, sender=DirectDebit)
+@receiver(post_delete, sender=RecurringIncome)
+@receiver(post_delete, sender=BudgetProjection)
+def record_sync_change_on_delete(sender, instance, **kwargs):
+    """Journalise la suppression d'un objet synchronisé (tombstone)"""
+    # La suppression d'un prélèvement émet aussi le signal de sa ligne Operation
+    user_id = _sync_owner_id(instance)
+    if user_id is None:
+        return
+    SyncChange.record(SYNC_MODEL_NAMES[sender], instance.pk, user_id, deleted=True)
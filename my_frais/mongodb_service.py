@@ -1,106 +1,567 @@
 """
 Service pour la gestion de MongoDB
 """
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 from django.conf import settings
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+from my_frais.log_spool import log_sort_key, log_spool
 
 logger = logging.getLogger(__name__)
 
+DUPLICATE_KEY_ERROR = 11000
+# IndexOptionsConflict / IndexKeySpecsConflict
+INDEX_OPTIONS_CONFLICT_CODES = (85, 86)
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur : après `failure_threshold` échecs consécutifs, les appels sont refusés
+    immédiatement (ouvert) pendant `reset_timeout` secondes, puis un seul appel d'essai
+    est autorisé (semi-ouvert) : son succès referme le disjoncteur, son échec le rouvre.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+        self.rejected_total = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True si l'appel peut être tenté"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected_total += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Appel autorisé mais non tenté : l'essai du semi-ouvert redevient disponible"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_total += 1
+                    logger.warning(f"Disjoncteur MongoDB ouvert pour {self.reset_timeout}s après {self.failures} échec(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Métriques du disjoncteur (state_code : 0 fermé, 1 semi-ouvert, 2 ouvert)"""
+        return {
+            'state': self.state,
+            'state_code': self.STATE_CODES[self.state],
+            'consecutive_failures': self.failures,
+            'opened_total': self.opened_total,
+            'rejected_total': self.rejected_total,
+        }
+
 
 class MongoDBService:
     """Service pour interagir avec MongoDB"""
-    
+
+    LOG_COLLECTIONS = ['auth_events', 'crud_events', 'errors', 'business_events']
+
+    # Index communes aux collections de logs (le TTL sur timestamp est ajouté selon la rétention)
+    LOG_INDEXES = [
+        ([('user_info.user_id', ASCENDING), ('timestamp', DESCENDING)], 'user_timestamp_idx'),
+        ([('event_type', ASCENDING), ('timestamp', DESCENDING)], 'event_type_timestamp_idx'),
+        # Pagination par clé (timestamp, _id) des listes de l'admin
+        ([('timestamp', DESCENDING), ('_id', DESCENDING)], 'timestamp_id_idx'),
+    ]
+    COLLECTION_INDEXES = {
+        'crud_events': [([('model_name', ASCENDING), ('object_id', ASCENDING)], 'model_object_idx')],
+    }
+
+    # Agrégats tenus par log_rollups : collections horaires (champ `hour`) et empreintes d'erreurs
+    HOURLY_ROLLUP_COLLECTIONS = ['rollup_hourly_events', 'rollup_auth_failures', 'rollup_request_durations']
+    ROLLUP_INDEXES = {
+        'rollup_error_fingerprints': [([('count', DESCENDING)], 'count_idx')],
+    }
+
     def __init__(self):
-        self.client = None
-        self.db = None
-        self._connect()
-    
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._indexes_pid = None
+        self._indexes_retry_at = 0.0
+        config = settings.MONGODB_CONFIG
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get('breaker_failure_threshold', 3),
+            reset_timeout=config.get('breaker_reset_timeout', 30),
+        )
+        self.fallback_total = 0
+        self._lock = threading.Lock()
+
     def _connect(self):
-        """Établit la connexion avec MongoDB"""
+        """
+        Prépare le client MongoDB du processus courant. Aucun aller-retour réseau ici :
+        le client se connecte en arrière-plan et les échecs sont gérés par le disjoncteur.
+        """
         try:
             config = settings.MONGODB_CONFIG
-            
+
             # Construction de l'URI de connexion
             if config.get('username') and config.get('password'):
                 uri = f"mongodb://{config['username']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}?authSource={config['auth_source']}"
             else:
                 uri = f"mongodb://{config['host']}:{config['port']}/{config['database']}"
-            
-            self.client = MongoClient(uri)
-            self.db = self.client[config['database']]
-            
-            # Test de connexion
-            self.client.admin.command('ping')
-            logger.info("Connexion MongoDB établie avec succès")
-            
+
+            # Délais courts : MongoDB indisponible ne doit pas bloquer les requêtes
+            self._client = MongoClient(
+                uri,
+                serverSelectionTimeoutMS=config.get('server_selection_timeout_ms', 2000),
+                connectTimeoutMS=config.get('connect_timeout_ms', 2000),
+                socketTimeoutMS=config.get('socket_timeout_ms', 5000),
+            )
+            self._db = self._client[config['database']]
+
         except Exception as e:
-            logger.error(f"Erreur de connexion MongoDB: {e}")
-            self.client = None
-            self.db = None
-    
-    def insert_log(self, collection: str, data: Dict[str, Any]) -> Optional[str]:
-        """Insère un log dans la collection spécifiée"""
+            logger.error(f"Erreur de configuration MongoDB: {e}")
+            self._client = None
+            self._db = None
+
+    def _ensure_client(self):
+        """
+        Initialisation paresseuse, une fois par processus : rien n'est créé à l'import
+        (commandes manage.py, maître gunicorn) et un processus forké crée son propre client,
+        PyMongo n'étant pas fork-safe.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._connect()
+                self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        """Processus enfant : client du parent abandonné (sans close), disjoncteur remis à zéro"""
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._indexes_pid = None
+        self._indexes_retry_at = 0.0
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(self.breaker.failure_threshold, self.breaker.reset_timeout)
+        self.fallback_total = 0
+
+    @property
+    def client(self):
+        self._ensure_client()
+        return self._client
+
+    @property
+    def db(self):
+        self._ensure_client()
+        return self._db
+
+    @db.setter
+    def db(self, value):
+        self._db = value
+        self._pid = os.getpid()
+
+    def _ensure_ttl_index(self, collection_name: str, field: str, days) -> str:
+        """Index TTL sur `field` (purge par le serveur après `days` jours), mis à jour si la rétention change"""
+        name = f'{field}_ttl_idx'
+        ttl = int(days * 86400)
+        try:
+            return self.db[collection_name].create_index(field, name=name, expireAfterSeconds=ttl)
+        except OperationFailure as e:
+            if e.code not in INDEX_OPTIONS_CONFLICT_CODES:
+                raise
+            # Rétention modifiée : mise à jour du TTL de l'index existant
+            self.db.command('collMod', collection_name, index={'name': name, 'expireAfterSeconds': ttl})
+            return name
+
+    def ensure_indexes(self) -> Dict[str, list]:
+        """
+        Crée (si besoin) les index des collections de logs : TTL sur timestamp selon
+        MONGODB_CONFIG['retention_days'] (purge faite par le serveur) et index composés
+        des requêtes de l'admin, puis ceux des agrégats (cf. log_rollups).
+        Idempotent ; retourne les index par collection.
+        """
+        retention = settings.MONGODB_CONFIG.get('retention_days', {})
+        created = {}
+        for collection_name in self.LOG_COLLECTIONS:
+            collection = self.db[collection_name]
+            names = []
+            days = retention.get(collection_name)
+            if days:
+                names.append(self._ensure_ttl_index(collection_name, 'timestamp', days))
+            else:
+                names.append(collection.create_index([('timestamp', DESCENDING)], name='timestamp_idx'))
+            for keys, name in self.LOG_INDEXES + self.COLLECTION_INDEXES.get(collection_name, []):
+                names.append(collection.create_index(keys, name=name))
+            created[collection_name] = names
+
+        for collection_name in self.HOURLY_ROLLUP_COLLECTIONS:
+            days = retention.get('rollups')
+            if days:
+                created[collection_name] = [self._ensure_ttl_index(collection_name, 'hour', days)]
+            else:
+                created[collection_name] = [self.db[collection_name].create_index([('hour', DESCENDING)], name='hour_idx')]
+        for collection_name, indexes in self.ROLLUP_INDEXES.items():
+            for keys, name in indexes:
+                created.setdefault(collection_name, []).append(self.db[collection_name].create_index(keys, name=name))
+        return created
+
+    def _ensure_indexes_once(self):
+        """
+        Index vérifiés au premier appel de chaque processus (jamais à l'import), hors disjoncteur :
+        un échec (droits insuffisants pour collMod, index existant sous un autre nom...) est
+        journalisé puis réessayé après `ensure_indexes_retry_seconds`, sans jamais faire échouer
+        l'opération en cours (la commande ensure_log_indexes remonte l'erreur)
+        """
+        config = settings.MONGODB_CONFIG
+        if self._indexes_pid == os.getpid() or not config.get('ensure_indexes', True):
+            return
+        if time.monotonic() < self._indexes_retry_at:
+            return
+        self._indexes_pid = os.getpid()
+        try:
+            self.ensure_indexes()
+            logger.info("Index des collections de logs vérifiés")
+        except PyMongoError as e:
+            retry_seconds = config.get('ensure_indexes_retry_seconds', 300)
+            self._indexes_pid = None
+            self._indexes_retry_at = time.monotonic() + retry_seconds
+            logger.warning(f"Création des index des logs impossible, nouvel essai dans {retry_seconds}s: {e}")
+
+    def _call(self, operation, default, error_message: str):
+        """Exécute une opération MongoDB derrière le disjoncteur, `default` en cas d'échec ou de refus"""
         if self.db is None:
             logger.error("Connexion MongoDB non disponible")
-            return None
-        
+            return default
+        if self.breaker.state == CircuitBreaker.CLOSED:
+            self._ensure_indexes_once()
+        if not self.breaker.allow():
+            return default
+
         try:
-            # Ajout automatique du timestamp
-            data['timestamp'] = datetime.utcnow()
-            data['created_at'] = datetime.utcnow()
-            
-            result = self.db[collection].insert_one(data)
-            return str(result.inserted_id)
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'insertion du log: {e}")
+            result = operation()
+        except BulkWriteError:
+            # Erreurs par document (le serveur a répondu) : traitées par l'appelant
+            self.breaker.record_success()
+            raise
+        except InvalidDocument:
+            # Document refusé par le pilote avant l'envoi : rien appris sur l'état du serveur
+            self.breaker.release()
+            raise
+        except PyMongoError as e:
+            self.breaker.record_failure()
+            logger.error(f"{error_message}: {e}")
+            return default
+        self.breaker.record_success()
+        return result
+
+    def _fallback(self, collection: str, documents: list):
+        """Logs non écrits : conservés dans le spool local, rejoué dès que MongoDB répond"""
+        self.fallback_total += len(documents)
+        log_spool.append(collection, documents)
+
+    def _ensure_replay(self):
+        log_spool.ensure_replay_worker(
+            self.replay_logs,
+            should_run=lambda: self.breaker.state != CircuitBreaker.OPEN
+        )
+
+    def insert_log(self, collection: str, data: Dict[str, Any]) -> Optional[str]:
+        """Insère un log dans la collection spécifiée"""
+        self._ensure_replay()
+        # Ajout automatique du timestamp
+        data['timestamp'] = datetime.utcnow()
+        data['created_at'] = datetime.utcnow()
+
+        try:
+            result = self._call(
+                lambda: self.db[collection].insert_one(data),
+                None,
+                "Erreur lors de l'insertion du log"
+            )
+        except InvalidDocument as e:
+            logger.error(f"Log non encodable en BSON, ignoré: {e}")
             return None
-    
-    def find_logs(self, collection: str, filter_dict: Dict[str, Any] = None, limit: int = 100) -> list:
-        """Récupère les logs selon les critères"""
-        if self.db is None:
-            logger.error("Connexion MongoDB non disponible")
-            return []
-        
+        if result is None:
+            self._fallback(collection, [data])
+            return None
+        return str(result.inserted_id)
+
+    def insert_logs(self, collection: str, documents: list) -> int:
+        """Insère un lot de logs (insert_many non ordonné), retourne le nombre de logs insérés"""
+        self._ensure_replay()
+        now = datetime.utcnow()
+        for data in documents:
+            data.setdefault('timestamp', now)
+            data['created_at'] = now
+
         try:
-            filter_dict = filter_dict or {}
-            cursor = self.db[collection].find(filter_dict).sort('timestamp', -1).limit(limit)
-            return list(cursor)
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la récupération des logs: {e}")
-            return []
-    
-    def delete_old_logs(self, collection: str, days_old: int = 30) -> int:
-        """Supprime les logs plus anciens que X jours"""
-        if self.db is None:
-            logger.error("Connexion MongoDB non disponible")
+            result = self._call(
+                lambda: self.db[collection].insert_many(documents, ordered=False),
+                None,
+                "Erreur lors de l'insertion des logs"
+            )
+        except BulkWriteError as e:
+            logger.error(f"Insertion partielle des logs: {e}")
+            return e.details.get('nInserted', 0)
+        except InvalidDocument as e:
+            if len(documents) == 1:
+                logger.error(f"Log non encodable en BSON, ignoré: {e}")
+                return 0
+            # Lot isolé document par document : seuls les logs non encodables sont perdus
+            return sum(self.insert_logs(collection, [data]) for data in documents)
+        if result is None:
+            self._fallback(collection, documents)
             return 0
-        
+        return len(result.inserted_ids)
+
+    def replay_logs(self, collection: str, documents: list) -> Optional[list]:
+        """
+        Réinsère des logs du spool (sans repli). Retourne None si MongoDB est indisponible (lot
+        à rejouer plus tard), sinon les documents refusés définitivement. Les `_id` étant fixés
+        avant le spool, les doublons d'un rejeu précédent ne sont pas des refus.
+        """
         try:
-            from datetime import timedelta
-            cutoff_date = datetime.utcnow() - timedelta(days=days_old)
-            
-            result = self.db[collection].delete_many({
-                'timestamp': {'$lt': cutoff_date}
-            })
-            
-            logger.info(f"Suppression de {result.deleted_count} logs anciens")
-            return result.deleted_count
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la suppression des logs: {e}")
+            result = self._call(
+                lambda: self.db[collection].insert_many(documents, ordered=False),
+                None,
+                "Erreur lors du rejeu des logs"
+            )
+        except BulkWriteError as e:
+            return [
+                documents[error['index']] for error in e.details.get('writeErrors', [])
+                if error.get('code') != DUPLICATE_KEY_ERROR
+            ]
+        except InvalidDocument as e:
+            # Refus avant l'envoi (plus de 16 Mo, type non encodable) : lot isolé document par document
+            if len(documents) == 1:
+                logger.error(f"Log refusé lors du rejeu: {e}")
+                return documents
+            rejected = []
+            for document in documents:
+                refused = self.replay_logs(collection, [document])
+                if refused is None:
+                    return None
+                rejected += refused
+            return rejected
+        return None if result is None else []
+
+    def find_logs(self, collection: str, filter_dict: Dict[str, Any] = None, limit: int = 100) -> list:
+        """Récupère les logs selon les critères, y compris ceux encore dans le spool local"""
+        filter_dict = filter_dict or {}
+        logs = self._call(
+            lambda: list(self.db[collection].find(filter_dict).sort('timestamp', -1).limit(limit)),
+            [],
+            "Erreur lors de la récupération des logs"
+        )
+        spooled = log_spool.find(collection, filter_dict, limit) if self._spool_readable() else []
+        if not spooled:
+            return logs
+        # Un log rejoué entre-temps peut être présent des deux côtés
+        known_ids = {log.get('_id') for log in logs}
+        logs.extend(log for log in spooled if log.get('_id') not in known_ids)
+        logs.sort(key=lambda log: log.get('timestamp') or datetime.min, reverse=True)
+        return logs[:limit]
+
+    def find_logs_page(self, collection: str, filter_dict: Dict[str, Any] = None, limit: int = 50,
+                       after: Optional[Tuple[datetime, Any]] = None, before: Optional[Tuple[datetime, Any]] = None,
+                       projection: Dict[str, Any] = None) -> list:
+        """
+        Page de logs triés par (timestamp, _id) décroissants, par clé plutôt que par skip :
+        `after` (timestamp, _id) donne les logs plus anciens que cette clé, `before` les plus
+        récents (retournés eux aussi du plus récent au plus ancien). Coût constant à toute profondeur.
+        """
+        keyset = {}
+        sort_direction = DESCENDING
+        if after is not None:
+            keyset = {'$or': [{'timestamp': {'$lt': after[0]}}, {'timestamp': after[0], '_id': {'$lt': after[1]}}]}
+        elif before is not None:
+            keyset = {'$or': [{'timestamp': {'$gt': before[0]}}, {'timestamp': before[0], '_id': {'$gt': before[1]}}]}
+            sort_direction = ASCENDING
+        query = {'$and': [filter_dict, keyset]} if filter_dict and keyset else (filter_dict or keyset)
+
+        logs = self._call(
+            lambda: list(
+                self.db[collection].find(query, projection)
+                .sort([('timestamp', sort_direction), ('_id', sort_direction)])
+                .limit(limit)
+            ),
+            [],
+            "Erreur lors de la récupération des logs"
+        )
+        if sort_direction == ASCENDING:
+            logs.reverse()
+
+        spooled = []
+        if self._spool_readable():
+            spooled = log_spool.find(collection, filter_dict, limit, after=after, before=before, projection=projection)
+        if not spooled:
+            return logs
+        known_ids = {log.get('_id') for log in logs}
+        logs.extend(log for log in spooled if log.get('_id') not in known_ids)
+        logs.sort(key=log_sort_key, reverse=True)
+        return logs[-limit:] if sort_direction == ASCENDING else logs[:limit]
+
+    def find_timeline(self, collections: list, filter_dict: Dict[str, Any] = None, limit: int = 50,
+                      after: Optional[Tuple[datetime, Any]] = None, projection: Dict[str, Any] = None) -> list:
+        """
+        Logs de plusieurs collections fusionnés par (timestamp, _id) décroissants, au plus `limit`,
+        en une agrégation ($unionWith, MongoDB 4.4+) : chaque branche est triée et limitée sur son
+        index, puis le flux fusionné est trié et limité côté serveur. Chaque log porte `collection`.
+        """
+        if after is not None:
+            keyset = {'$or': [{'timestamp': {'$lt': after[0]}}, {'timestamp': after[0], '_id': {'$lt': after[1]}}]}
+            query = {'$and': [filter_dict, keyset]} if filter_dict else keyset
+        else:
+            query = filter_dict or {}
+        sort = {'$sort': {'timestamp': -1, '_id': -1}}
+
+        def branch(collection):
+            stages = [{'$match': query}, sort, {'$limit': limit}]
+            if projection:
+                stages.append({'$project': projection})
+            return stages + [{'$addFields': {'collection': collection}}]
+
+        first, *others = collections
+        pipeline = branch(first)
+        pipeline += [{'$unionWith': {'coll': collection, 'pipeline': branch(collection)}} for collection in others]
+        pipeline += [sort, {'$limit': limit}]
+
+        logs = self._call(
+            lambda: list(self.db[first].aggregate(pipeline)),
+            [],
+            "Erreur lors de la récupération de la chronologie des logs"
+        )
+
+        spooled = []
+        if self._spool_readable():
+            # Un seul passage sur le spool pour toutes les collections de la chronologie
+            spooled = log_spool.find(collections, filter_dict, limit, after=after, projection=projection)
+        if not spooled:
+            return logs
+        known_ids = {log.get('_id') for log in logs}
+        logs.extend(log for log in spooled if log.get('_id') not in known_ids)
+        logs.sort(key=log_sort_key, reverse=True)
+        return logs[:limit]
+
+    def _spool_readable(self) -> bool:
+        """
+        Le spool n'est consulté par les lectures que pendant une panne (segments présents et
+        MongoDB non configuré, disjoncteur non fermé ou dernier appel en échec) : sinon le
+        rejeu le vide sous peu et chaque page éviterait la lecture des segments.
+        """
+        if not log_spool.enabled:
+            return False
+        unavailable = (self._db is None or self.breaker.state != CircuitBreaker.CLOSED
+                       or self.breaker.failures > 0)
+        return unavailable and log_spool.has_segments()
+
+    def get_log(self, collection: str, log_id: Any) -> Optional[Dict[str, Any]]:
+        """Récupère un log complet par son _id (base, puis spool local)"""
+        log = self._call(
+            lambda: self.db[collection].find_one({'_id': log_id}),
+            None,
+            "Erreur lors de la récupération du log"
+        )
+        if log is None and self._spool_readable():
+            spooled = log_spool.find(collection, {'_id': log_id}, limit=1)
+            log = spooled[0] if spooled else None
+        return log
+
+    def upsert_many(self, collection: str, operations: list) -> bool:
+        """Applique un lot d'opérations (UpdateOne upsert, $inc/$max...) ; False si MongoDB est indisponible"""
+        result = self._call(
+            lambda: self.db[collection].bulk_write(operations, ordered=False),
+            None,
+            "Erreur lors de la mise à jour des agrégats"
+        )
+        return result is not None
+
+    def aggregate(self, collection: str, pipeline: list) -> list:
+        """Exécute un pipeline d'agrégation ([] si MongoDB est indisponible)"""
+        return self._call(
+            lambda: list(self.db[collection].aggregate(pipeline)),
+            [],
+            "Erreur lors de l'agrégation"
+        )
+
+    def estimated_count(self, collection: str) -> int:
+        """Nombre de documents d'après les métadonnées de la collection (sans parcours)"""
+        return self._call(
+            lambda: self.db[collection].estimated_document_count(),
+            0,
+            "Erreur lors du comptage des logs"
+        )
+
+    def count_logs(self, collection: str, filter_dict: Dict[str, Any] = None) -> int:
+        """Compte les logs d'une collection"""
+        return self._call(
+            lambda: self.db[collection].count_documents(filter_dict or {}),
+            0,
+            "Erreur lors du comptage des logs"
+        )
+
+    def delete_old_logs(self, collection: str, days_old: int = 30) -> int:
+        """Supprime les logs plus anciens que X jours"""
+        cutoff_date = datetime.utcnow() - timedelta(days=days_old)
+        result = self._call(
+            lambda: self.db[collection].delete_many({'timestamp': {'$lt': cutoff_date}}),
+            None,
+            "Erreur lors de la suppression des logs"
+        )
+        if result is None:
             return 0
-    
+        logger.info(f"Suppression de {result.deleted_count} logs anciens")
+        return result.deleted_count
+
+    def stats(self) -> Dict[str, Any]:
+        """Métriques du service : disjoncteur, logs envoyés au spool local et état du spool"""
+        return {**self.breaker.stats(), 'fallback_total': self.fallback_total, 'spool': log_spool.stats()}
+
     def close(self):
-        """Ferme la connexion MongoDB"""
-        if self.client is not None:
-            self.client.close()
+        """Ferme la connexion MongoDB (le client sera recréé au prochain appel)"""
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
             logger.info("Connexion MongoDB fermée")
+        self._client = None
+        self._db = None
+        self._pid = None
+
 
+# Instance globale du service (client créé au premier appel, dans chaque processus)
+mongodb_service = MongoDBService()
 
-# Instance globale du service
-mongodb_service = MongoDBService() 
\ No newline at end of file
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=mongodb_service._reset_after_fork)
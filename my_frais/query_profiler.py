@@ -0,0 +1,116 @@
+"""
+Profilage des requêtes SQL d'une requête HTTP (cf. QueryProfilerMiddleware) : nombre, durée et
+regroupement par gabarit (valeurs retirées) pour repérer les N+1, c'est-à-dire une même requête
+répétée pour chaque objet d'une liste.
+"""
+import os
+import re
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+
+DEFAULT_QUERY_PROFILER_SETTINGS = {
+    # Profilage de toutes les requêtes (sinon seulement les requêtes du staff portant l'en-tête)
+    'ENABLED': False,
+    'HEADER': 'X-Profile-Queries',
+    # Un gabarit exécuté au moins N fois dans la même requête est signalé comme N+1
+    'N_PLUS_ONE_THRESHOLD': 5,
+    # Gabarits les plus coûteux repris dans le résumé
+    'TOP_TEMPLATES': 5,
+}
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"`.])-?\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+
+
+def query_profiler_setting(name):
+    return getattr(settings, 'QUERY_PROFILER_SETTINGS', {}).get(name, DEFAULT_QUERY_PROFILER_SETTINGS[name])
+
+
+def sql_template(sql: str) -> str:
+    """Gabarit d'une requête : listes IN, chaînes et nombres littéraux remplacés"""
+    template = _IN_LIST.sub('IN (...)', sql)
+    template = _STRING.sub('?', template)
+    template = _NUMBER.sub('?', template)
+    return _SPACES.sub(' ', template).strip()
+
+
+def _origin() -> Optional[str]:
+    """Dernière frame du code du projet ayant déclenché la requête (hors ce module)"""
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename \
+                and not frame.filename.endswith('query_profiler.py'):
+            return f"{os.path.relpath(frame.filename, base_dir)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class QueryProfiler:
+    """Wrapper d'exécution SQL (connection.execute_wrapper) qui mesure et regroupe les requêtes"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # gabarit -> {'count', 'duration', 'origin'}
+        self.templates: Dict[str, Dict[str, Any]] = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            template = sql_template(sql)
+            stats = self.templates.setdefault(template, {'count': 0, 'duration': 0.0, 'origin': None})
+            stats['count'] += 1
+            stats['duration'] += duration
+            if stats['count'] == 2:
+                # Origine relevée à la première répétition seulement (coût de la pile)
+                stats['origin'] = _origin()
+
+    def n_plus_one(self) -> List[Dict[str, Any]]:
+        """Gabarits répétés au-delà du seuil, les plus fréquents d'abord"""
+        threshold = query_profiler_setting('N_PLUS_ONE_THRESHOLD')
+        repeated = [
+            {'sql': template, 'count': stats['count'], 'time_ms': round(stats['duration'] * 1000, 2),
+             'origin': stats['origin']}
+            for template, stats in self.templates.items() if stats['count'] >= threshold
+        ]
+        return sorted(repeated, key=lambda entry: entry['count'], reverse=True)
+
+    def summary(self) -> Dict[str, Any]:
+        top = sorted(self.templates.items(), key=lambda item: item[1]['duration'], reverse=True)
+        return {
+            'count': self.count,
+            'time_ms': round(self.duration * 1000, 2),
+            'duplicates': self.count - len(self.templates),
+            'n_plus_one': self.n_plus_one(),
+            'top_templates': [
+                {'sql': template, 'count': stats['count'], 'time_ms': round(stats['duration'] * 1000, 2)}
+                for template, stats in top[:query_profiler_setting('TOP_TEMPLATES')]
+            ],
+        }
+
+    def headers(self) -> Dict[str, str]:
+        """Résumé en en-têtes de réponse (ASCII, une ligne)"""
+        headers = {
+            'X-Query-Count': str(self.count),
+            'X-Query-Time-Ms': f'{self.duration * 1000:.2f}',
+            'X-Query-Duplicates': str(self.count - len(self.templates)),
+            'Server-Timing': f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"',
+        }
+        repeated = self.n_plus_one()
+        if repeated:
+            worst = repeated[0]
+            description = f"{len(repeated)} template(s); {worst['count']}x {worst['sql'][:200]}"
+            if worst['origin']:
+                description += f" @ {worst['origin']}"
+            headers['X-Query-N-Plus-One'] = description.encode('ascii', 'replace').decode()
+        return headers
@@ -10,11 +10,11 @@ class AccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = Account
         fields = [
-            'id', 'user', 'user_username', 'nom', 'solde', 
+            'id', 'user', 'user_username', 'nom', 'solde', 'solde_initial',
             'created_by', 'created_by_username', 
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_by', 'created_by_username', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'solde_initial', 'created_by', 'created_by_username', 'created_at', 'updated_at']
     
     def validate_solde(self, value):
         """Validation du solde - permet les valeurs négatives (découverts)"""
@@ -47,42 +47,32 @@ class AccountSerializer(serializers.ModelSerializer):
         # Empêcher la modification de l'utilisateur propriétaire
         if 'user' in validated_data:
             del validated_data['user']
+        
+        # Une saisie manuelle du solde décale d'autant le solde d'ouverture,
+        # sinon le rapprochement la signalerait comme un écart
+        if 'solde' in validated_data and instance.solde_initial is not None:
+            instance.solde_initial += validated_data['solde'] - instance.solde
         return super().update(instance, validated_data)
 
 
 class AccountListSerializer(serializers.ModelSerializer):
     """Serializer pour la liste des comptes avec informations résumées"""
     user_username = serializers.CharField(source='user.username', read_only=True)
-    operations_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Account
-        fields = ['id', 'user_username', 'nom', 'solde', 'operations_count', 'updated_at']
-    
-    def get_operations_count(self, obj):
-        """Compter le nombre d'opérations pour ce compte"""
-        return obj.operations.count()
+        fields = ['id', 'user_username', 'nom', 'solde', 'operations_count', 'last_operation_at', 'updated_at']
+        read_only_fields = ['operations_count', 'last_operation_at']
 
 
 class AccountSummarySerializer(serializers.ModelSerializer):
     """Serializer pour le résumé des comptes avec statistiques complètes"""
     user_username = serializers.CharField(source='user.username', read_only=True)
-    operations_count = serializers.SerializerMethodField()
-    direct_debits_count = serializers.SerializerMethodField()
-    recurring_incomes_count = serializers.SerializerMethodField()
+    # Compteurs dénormalisés du compte : aucune requête supplémentaire par compte
+    direct_debits_count = serializers.IntegerField(source='active_debits_count', read_only=True)
+    recurring_incomes_count = serializers.IntegerField(source='active_incomes_count', read_only=True)
     
     class Meta:
         model = Account
         fields = ['id', 'user_username', 'nom', 'solde', 'operations_count', 'direct_debits_count', 'recurring_incomes_count', 'created_at', 'updated_at']
-    
-    def get_operations_count(self, obj):
-        """Compter le nombre d'opérations pour ce compte"""
-        return obj.operations.count()
-    
-    def get_direct_debits_count(self, obj):
-        """Compter le nombre de prélèvements automatiques pour ce compte"""
-        return obj.operations.filter(directdebit__actif=True).count()
-    
-    def get_recurring_incomes_count(self, obj):
-        """Compter le nombre de revenus récurrents pour ce compte"""
-        return obj.recurring_incomes.filter(actif=True).count() 
\ No newline at end of file
+        read_only_fields = ['operations_count']
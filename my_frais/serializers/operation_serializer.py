@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db import transaction
 from my_frais.models import Operation, Account
 from decimal import Decimal
 
@@ -40,13 +41,15 @@ class OperationSerializer(serializers.ModelSerializer):
         """Création d'une opération avec mise à jour automatique du solde"""
         validated_data['created_by'] = self.context['request'].user
         
-        # Créer l'opération
-        operation = super().create(validated_data)
-        
-        # Mettre à jour le solde du compte
-        compte = operation.compte_reference
-        compte.solde += operation.montant
-        compte.save()
+        # Opération, solde et agrégats journaliers sont mis à jour ensemble
+        with transaction.atomic():
+            # Créer l'opération
+            operation = super().create(validated_data)
+            
+            # Mettre à jour le solde du compte
+            compte = operation.compte_reference
+            compte.solde += operation.montant
+            compte.save()
         
         return operation
     
@@ -55,27 +58,29 @@ class OperationSerializer(serializers.ModelSerializer):
         # Sauvegarder l'ancien montant pour ajuster le solde
         ancien_montant = instance.montant
         
-        # Mettre à jour l'opération
-        operation = super().update(instance, validated_data)
-        
-        # Ajuster le solde du compte
-        compte = operation.compte_reference
-        nouveau_montant = operation.montant
-        difference = nouveau_montant - ancien_montant
-        compte.solde += difference
-        compte.save()
+        with transaction.atomic():
+            # Mettre à jour l'opération
+            operation = super().update(instance, validated_data)
+            
+            # Ajuster le solde du compte
+            compte = operation.compte_reference
+            nouveau_montant = operation.montant
+            difference = nouveau_montant - ancien_montant
+            compte.solde += difference
+            compte.save()
         
         return operation
     
     def delete(self, instance):
         """Suppression d'une opération avec ajustement du solde"""
-        # Ajuster le solde du compte avant suppression
-        compte = instance.compte_reference
-        compte.solde -= instance.montant
-        compte.save()
-        
-        # Supprimer l'opération
-        instance.delete()
+        with transaction.atomic():
+            # Ajuster le solde du compte avant suppression
+            compte = instance.compte_reference
+            compte.solde -= instance.montant
+            compte.save()
+            
+            # Supprimer l'opération
+            instance.delete()
 
 
 class OperationListSerializer(serializers.ModelSerializer):
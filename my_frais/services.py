@@ -5,15 +5,20 @@ Optimise les performances en évitant les doublons et en centralisant la logique
 
 from decimal import Decimal
 from datetime import date, datetime, timedelta
-from django.db import transaction, models
+from django.db import transaction, models, connection
+from django.db.models.functions import TruncDate
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 from typing import List, Dict, Optional, Tuple
+import base64
 import time
 
 from my_frais.models import (
     Account, DirectDebit, RecurringIncome, 
-    AutomaticTransaction, AutomatedTask
+    AutomaticTransaction, AutomatedTask, OperationDailyRollup,
+    Operation, AccountBalanceSnapshot, SyncChange
 )
 
 
@@ -43,6 +48,14 @@ class AutomaticTransactionService:
         # Traiter les revenus
         incomes_count = cls._process_recurring_incomes(today, account_filter)
         
+        # Enregistrer les soldes de fin de la veille (traitement global uniquement)
+        snapshots_count = 0
+        if not account_filter:
+            try:
+                snapshots_count = BalanceSnapshotService.snapshot_previous_day()
+            except Exception as e:
+                print(f"Erreur lors de l'enregistrement des soldes journaliers: {e}")
+        
         total_count = payments_count + incomes_count
         execution_duration = time.time() - start_time
         
@@ -56,6 +69,7 @@ class AutomaticTransactionService:
             'total': total_count,
             'payments': payments_count,
             'incomes': incomes_count,
+            'snapshots': snapshots_count,
             'execution_duration': execution_duration
         }
     
@@ -148,8 +162,10 @@ class AutomaticTransactionService:
                 next_payment_date = payment.get_next_occurrence(target_date)
                 if next_payment_date:
                     DirectDebit.objects.filter(id=payment.id).update(
-                        date_prelevement=next_payment_date
+                        date_prelevement=next_payment_date,
+                        updated_at=timezone.now()
                     )
+                    SyncChange.record_updated(DirectDebit.objects.filter(id=payment.id))
                 
                 return True
                 
@@ -199,8 +215,10 @@ class AutomaticTransactionService:
                 next_income_date = income.get_next_occurrence(target_date)
                 if next_income_date:
                     RecurringIncome.objects.filter(id=income.id).update(
-                        date_premier_versement=next_income_date
+                        date_premier_versement=next_income_date,
+                        updated_at=timezone.now()
                     )
+                    SyncChange.record_updated(RecurringIncome.objects.filter(id=income.id))
                 
                 return True
                 
@@ -291,6 +309,413 @@ class AutomaticTransactionService:
         }
 
 
+class OperationRollupService:
+    """
+    Service de lecture des agrégats journaliers d'opérations
+    Les statistiques lisent quelques lignes par compte au lieu de l'historique complet
+    """
+    
+    FIELDS = {
+        'count': 'operations_count',
+        'montant_total': 'total_amount',
+        'count_positif': 'positive_count',
+        'montant_positif': 'positive_amount',
+        'count_negatif': 'negative_count',
+        'montant_negatif': 'negative_amount',
+    }
+    
+    @classmethod
+    def get_rollups_for_user(cls, user: User):
+        """Agrégats visibles par l'utilisateur (tous les comptes pour le staff)"""
+        if user.is_staff:
+            return OperationDailyRollup.objects.all()
+        return OperationDailyRollup.objects.filter(compte_reference__user=user)
+    
+    @classmethod
+    def summarize(cls, rollups, periods: Optional[Dict[str, date]] = None) -> Dict[str, Dict]:
+        """
+        Agrège les lignes en une seule requête
+        Retourne les totaux sous 'total' et, pour chaque période, les totaux depuis la date donnée
+        """
+        periods = periods or {}
+        aggregates = {}
+        for key, field in cls.FIELDS.items():
+            aggregates[f'total__{key}'] = models.Sum(field)
+            for name, since in periods.items():
+                aggregates[f'{name}__{key}'] = models.Sum(field, filter=models.Q(day__gte=since))
+        
+        result = rollups.order_by().aggregate(**aggregates)
+        
+        summary = {}
+        for name in ['total', *periods]:
+            summary[name] = {}
+            for key in cls.FIELDS:
+                value = result[f'{name}__{key}']
+                if key.startswith('count'):
+                    summary[name][key] = int(value or 0)
+                else:
+                    summary[name][key] = value or Decimal('0.00')
+        return summary
+
+
+class BalanceSnapshotService:
+    """
+    Service des soldes journaliers (AccountBalanceSnapshot)
+    Le solde à une date se lit dans un snapshot, complété par les mouvements des jours
+    sans snapshot, au lieu de rejouer tout l'historique. Le complément est d'au plus un
+    jour une fois backfill_balance_snapshots exécuté et le snapshot quotidien à jour ;
+    sinon il couvre tout le trou (une requête agrégée par jour sur l'index
+    (compte_reference, created_at), coût proportionnel à la longueur du trou).
+    """
+    
+    @staticmethod
+    def start_of_day(day: date) -> datetime:
+        """
+        Début de journée dans le fuseau courant (celui de TruncDate) : filtrer created_at sur
+        [début du jour, début du lendemain[ garde l'index (compte_reference, created_at),
+        que created_at__date (DATE()/CAST sur la colonne) rend inutilisable
+        """
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    
+    @classmethod
+    def daily_deltas(cls, account_ids: List[int], start: date, end: date) -> Dict[Tuple[int, date], Decimal]:
+        """
+        Mouvements nets par compte et par jour sur [start, end]
+        (opérations hors définitions de prélèvements + transactions automatiques)
+        """
+        deltas = {}
+        
+        operations = Operation.objects.filter(
+            compte_reference_id__in=account_ids,
+            directdebit__isnull=True,
+            created_at__gte=cls.start_of_day(start),
+            created_at__lt=cls.start_of_day(end + timedelta(days=1))
+        ).annotate(day=TruncDate('created_at')).values('compte_reference_id', 'day').annotate(
+            total=models.Sum('montant')
+        ).order_by()
+        for row in operations:
+            key = (row['compte_reference_id'], row['day'])
+            deltas[key] = deltas.get(key, Decimal('0')) + (row['total'] or Decimal('0'))
+        
+        transactions = AutomaticTransaction.objects.filter(
+            compte_reference_id__in=account_ids,
+            date_transaction__gte=start,
+            date_transaction__lte=end
+        ).values('compte_reference_id', 'date_transaction').annotate(
+            total=models.Sum('montant')
+        ).order_by()
+        for row in transactions:
+            key = (row['compte_reference_id'], row['date_transaction'])
+            deltas[key] = deltas.get(key, Decimal('0')) + (row['total'] or Decimal('0'))
+        
+        return deltas
+    
+    @classmethod
+    def _save_snapshots(cls, snapshots: List[AccountBalanceSnapshot]) -> int:
+        """Insère ou met à jour les snapshots en une requête par lot"""
+        if not snapshots:
+            return 0
+        # MySQL déduit la clé en conflit de la contrainte d'unicité, les autres bases l'exigent
+        unique_fields = None
+        if connection.features.supports_update_conflicts_with_target:
+            unique_fields = ['compte_reference', 'date_snapshot']
+        AccountBalanceSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=1000,
+            update_conflicts=True,
+            update_fields=['solde'],
+            unique_fields=unique_fields
+        )
+        return len(snapshots)
+    
+    @classmethod
+    def backfill(cls, start: date, end: date = None, account_ids: List[int] = None,
+                 chunk_size: int = 500) -> int:
+        """
+        Calcule et enregistre les soldes de fin de journée de start à end (défaut : hier)
+        en repartant du solde actuel et en retranchant les mouvements postérieurs.
+        Retourne le nombre de snapshots écrits.
+        """
+        today = date.today()
+        if end is None or end >= today:
+            end = today - timedelta(days=1)
+        if start > end:
+            return 0
+        
+        if account_ids is None:
+            account_ids = list(Account.objects.order_by('id').values_list('id', flat=True))
+        
+        written = 0
+        for index in range(0, len(account_ids), chunk_size):
+            chunk = account_ids[index:index + chunk_size]
+            soldes = dict(Account.objects.filter(id__in=chunk).values_list('id', 'solde'))
+            deltas = cls.daily_deltas(chunk, start + timedelta(days=1), today)
+            
+            snapshots = []
+            for account_id, solde in soldes.items():
+                # Solde de fin de journée = solde de la fin du jour suivant - mouvements du jour suivant
+                balance = solde
+                day = today
+                while day > start:
+                    balance -= deltas.get((account_id, day), Decimal('0'))
+                    day -= timedelta(days=1)
+                    if day <= end:
+                        snapshots.append(AccountBalanceSnapshot(
+                            compte_reference_id=account_id, date_snapshot=day, solde=balance
+                        ))
+            
+            with transaction.atomic():
+                written += cls._save_snapshots(snapshots)
+        
+        return written
+    
+    @classmethod
+    def snapshot_previous_day(cls, account_ids: List[int] = None, chunk_size: int = 500) -> int:
+        """Enregistre le solde de fin de la veille (appelé par le traitement quotidien)"""
+        yesterday = date.today() - timedelta(days=1)
+        return cls.backfill(yesterday, yesterday, account_ids=account_ids, chunk_size=chunk_size)
+    
+    @classmethod
+    def balance_on(cls, account: Account, target_date: date) -> Decimal:
+        """
+        Solde de fin de journée d'un compte à une date donnée. Sans snapshot antérieur (historique
+        jamais calculé par backfill_balance_snapshots), les mouvements sont retranchés depuis le
+        snapshot suivant ou le solde actuel, sur tout l'intervalle
+        """
+        today = date.today()
+        if target_date >= today:
+            return account.solde
+        
+        snapshot = account.balance_snapshots.filter(date_snapshot__lte=target_date).order_by('-date_snapshot').first()
+        if snapshot and snapshot.date_snapshot == target_date:
+            return snapshot.solde
+        
+        if snapshot:
+            # Jours manquants entre le snapshot et la date demandée
+            deltas = cls.daily_deltas([account.id], snapshot.date_snapshot + timedelta(days=1), target_date)
+            return snapshot.solde + sum(deltas.values(), Decimal('0'))
+        
+        # Aucun snapshot antérieur : repartir du suivant, ou du solde actuel
+        following = account.balance_snapshots.filter(date_snapshot__gt=target_date).order_by('date_snapshot').first()
+        reference_date, reference_balance = (following.date_snapshot, following.solde) if following else (today, account.solde)
+        deltas = cls.daily_deltas([account.id], target_date + timedelta(days=1), reference_date)
+        return reference_balance - sum(deltas.values(), Decimal('0'))
+    
+    @classmethod
+    def history(cls, account: Account, start: date, end: date, points: int = None) -> List[Dict]:
+        """
+        Série des soldes de fin de journée sur [start, end], éventuellement sous-échantillonnée.
+        Les jours passés sans snapshot (traitement quotidien manqué, historique non calculé) sont
+        complétés à partir des mouvements, en une requête agrégée sur la période du trou
+        """
+        today = date.today()
+        soldes = dict(account.balance_snapshots.filter(
+            date_snapshot__gte=start, date_snapshot__lte=end
+        ).values_list('date_snapshot', 'solde'))
+        
+        last_day = min(end, today - timedelta(days=1))
+        missing = [
+            start + timedelta(days=offset) for offset in range((last_day - start).days + 1)
+            if start + timedelta(days=offset) not in soldes
+        ]
+        if missing:
+            # Retour en arrière depuis le premier solde connu après le trou (snapshot ou solde actuel)
+            following = account.balance_snapshots.filter(date_snapshot__gt=missing[-1]).order_by('date_snapshot').first()
+            anchor_date, balance = (following.date_snapshot, following.solde) if following else (today, account.solde)
+            deltas = cls.daily_deltas([account.id], missing[0] + timedelta(days=1), anchor_date)
+            day = anchor_date
+            while day > missing[0]:
+                balance -= deltas.get((account.id, day), Decimal('0'))
+                day -= timedelta(days=1)
+                if day in soldes:
+                    balance = soldes[day]
+                elif day <= last_day:
+                    soldes[day] = balance
+        
+        series = [{'date': day, 'solde': float(solde)} for day, solde in sorted(soldes.items())]
+        if start <= today <= end:
+            series.append({'date': today, 'solde': float(account.solde)})
+        
+        if points:
+            series = cls.downsample_lttb(series, points)
+        return series
+    
+    @staticmethod
+    def downsample_lttb(series: List[Dict], threshold: int) -> List[Dict]:
+        """
+        Sous-échantillonnage Largest-Triangle-Three-Buckets pour l'affichage en graphique
+        Conserve le premier et le dernier point et la forme générale de la courbe
+        """
+        length = len(series)
+        if threshold >= length or threshold < 3:
+            return series
+        
+        def x(point):
+            return point['date'].toordinal()
+        
+        sampled = [series[0]]
+        bucket_size = (length - 2) / (threshold - 2)
+        previous = 0
+        
+        for bucket in range(threshold - 2):
+            bucket_start = int(bucket * bucket_size) + 1
+            bucket_end = int((bucket + 1) * bucket_size) + 1
+            
+            # Moyenne du bucket suivant
+            next_start = bucket_end
+            next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+            next_points = series[next_start:next_end] or [series[-1]]
+            avg_x = sum(x(p) for p in next_points) / len(next_points)
+            avg_y = sum(p['solde'] for p in next_points) / len(next_points)
+            
+            # Point du bucket courant formant le plus grand triangle
+            ax, ay = x(series[previous]), series[previous]['solde']
+            best_area = -1
+            best_index = bucket_start
+            for index in range(bucket_start, bucket_end):
+                area = abs((ax - avg_x) * (series[index]['solde'] - ay) - (ax - x(series[index])) * (avg_y - ay))
+                if area > best_area:
+                    best_area = area
+                    best_index = index
+            
+            sampled.append(series[best_index])
+            previous = best_index
+        
+        sampled.append(series[-1])
+        return sampled
+
+
+class BalanceReconciliationService:
+    """
+    Rapprochement du solde stocké avec le solde attendu
+    Solde attendu = solde d'ouverture + opérations + transactions automatiques
+    """
+    
+    @classmethod
+    def reconcile_range(cls, id_start: int, id_end: int, correct: bool = False) -> Dict:
+        """
+        Contrôle les comptes dont l'ID est dans [id_start, id_end[ avec trois requêtes groupées
+        Si correct=True, les soldes en écart sont remplacés par le solde attendu
+        """
+        accounts = Account.objects.filter(id__gte=id_start, id__lt=id_end).order_by().values_list(
+            'id', 'solde', 'solde_initial'
+        )
+        operations = dict(
+            Operation.objects.filter(
+                compte_reference_id__gte=id_start, compte_reference_id__lt=id_end,
+                directdebit__isnull=True
+            ).values('compte_reference_id').annotate(total=models.Sum('montant')).order_by()
+            .values_list('compte_reference_id', 'total')
+        )
+        transactions = dict(
+            AutomaticTransaction.objects.filter(
+                compte_reference_id__gte=id_start, compte_reference_id__lt=id_end
+            ).values('compte_reference_id').annotate(total=models.Sum('montant')).order_by()
+            .values_list('compte_reference_id', 'total')
+        )
+        
+        checked = 0
+        corrected = 0
+        drifts = []
+        for account_id, solde, solde_initial in accounts:
+            checked += 1
+            attendu = (
+                (solde_initial or Decimal('0'))
+                + (operations.get(account_id) or Decimal('0'))
+                + (transactions.get(account_id) or Decimal('0'))
+            )
+            if solde == attendu:
+                continue
+            
+            drifts.append({
+                'account_id': account_id,
+                'solde': solde,
+                'attendu': attendu,
+                'ecart': solde - attendu
+            })
+            if correct:
+                # Ne corrige que si le solde n'a pas bougé depuis la lecture
+                if Account.objects.filter(id=account_id, solde=solde).update(solde=attendu, updated_at=timezone.now()):
+                    corrected += 1
+                    SyncChange.record_updated(Account.objects.filter(id=account_id))
+        
+        return {'checked': checked, 'corrected': corrected, 'drifts': drifts}
+
+
+class SyncService:
+    """
+    Synchronisation différentielle à partir du journal SyncChange
+    Le curseur est l'ID du dernier changement transmis, horodaté pour détecter
+    les curseurs plus anciens que la rétention des tombstones
+    """
+    DEFAULTS = {
+        'PAGE_SIZE': 200,
+        'MAX_PAGE_SIZE': 1000,
+        # Un changement plus récent peut encore avoir un voisin d'ID inférieur non commité :
+        # il est transmis mais le curseur ne le dépasse pas (il sera renvoyé, sans effet)
+        'CURSOR_GRACE_SECONDS': 5,
+        'TOMBSTONE_RETENTION_DAYS': 90,
+    }
+    
+    @classmethod
+    def setting(cls, name):
+        return getattr(settings, 'SYNC_SETTINGS', {}).get(name, cls.DEFAULTS[name])
+    
+    @staticmethod
+    def encode_cursor(change_id: int) -> str:
+        raw = f"{change_id}:{int(time.time())}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, int]:
+        """Retourne (id du dernier changement, timestamp d'émission) ; ValueError si invalide"""
+        try:
+            change_id, issued_at = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+            return int(change_id), int(issued_at)
+        except (ValueError, UnicodeDecodeError, TypeError) as e:
+            raise ValueError("Curseur invalide") from e
+    
+    @classmethod
+    def is_expired(cls, issued_at: int) -> bool:
+        """Curseur émis avant la rétention des tombstones : resynchronisation complète nécessaire"""
+        return issued_at < time.time() - cls.setting('TOMBSTONE_RETENTION_DAYS') * 86400
+    
+    @classmethod
+    def changes_since(cls, user: User, after_id: int = 0, limit: Optional[int] = None) -> Dict:
+        """
+        Changements postérieurs à after_id, par ordre d'ID, au plus `limit`
+        Sans curseur (after_id=0), seuls les objets existants sont renvoyés
+        """
+        limit = min(limit or cls.setting('PAGE_SIZE'), cls.setting('MAX_PAGE_SIZE'))
+        changes = SyncChange.objects.filter(id__gt=after_id)
+        if not user.is_staff:
+            changes = changes.filter(user=user)
+        if not after_id:
+            changes = changes.filter(deleted=False)
+        rows = list(changes.order_by('id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        # Le curseur avance jusqu'au dernier changement d'une suite continue de changements "stables"
+        settled_before = timezone.now() - timedelta(seconds=cls.setting('CURSOR_GRACE_SECONDS'))
+        next_id = after_id
+        for row in rows:
+            if row.changed_at > settled_before:
+                break
+            next_id = row.id
+        
+        # Page entière trop récente : le client réessaiera plus tard avec le même curseur
+        has_more = has_more and next_id > after_id
+        return {'changes': rows, 'next_id': next_id, 'has_more': has_more}
+    
+    @classmethod
+    def prune_tombstones(cls) -> int:
+        """Supprime les tombstones plus anciens que la rétention"""
+        cutoff = timezone.now() - timedelta(days=cls.setting('TOMBSTONE_RETENTION_DAYS'))
+        deleted, _ = SyncChange.objects.filter(deleted=True, changed_at__lt=cutoff).delete()
+        return deleted
+
+
 class BudgetProjectionService:
     """
     Service pour calculer les projections de budget en utilisant le nouveau système
@@ -1,19 +1,28 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import re
+import tempfile
+import time
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.core.exceptions import ValidationError
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 from rest_framework import status
 from dateutil.relativedelta import relativedelta
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from unittest.mock import patch, MagicMock
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, connection
+from rest_framework.request import Request
 
 from my_frais.models import (
     Account, Operation, DirectDebit, RecurringIncome, 
-    BudgetProjection, AutomatedTask, AutomaticTransaction
+    BudgetProjection, AutomatedTask, AutomaticTransaction, OperationDailyRollup,
+    AccountBalanceSnapshot
 )
 from my_frais.serializers.account_serializer import AccountSerializer, AccountListSerializer, AccountSummarySerializer
 from my_frais.serializers.operation_serializer import OperationSerializer, OperationListSerializer
@@ -21,6 +30,26 @@ from my_frais.serializers.direct_debit_serializer import DirectDebitSerializer,
 from my_frais.serializers.recurring_income_serializer import RecurringIncomeSerializer, RecurringIncomeListSerializer
 from my_frais.serializers.budget_projection_serializer import BudgetProjectionSerializer
 from my_frais.serializers.automated_task_serializer import AutomatedTaskSerializer
+from my_frais.services import BalanceSnapshotService, BalanceReconciliationService, SyncService
+from my_frais.throttling import get_bucket_backend, InProcessBucketBackend
+from my_frais.log_writer import AsyncLogWriter
+from my_frais.log_spool import LogSpool, log_spool
+from my_frais.log_rollups import LogRollups, percentile_from_buckets
+from my_frais.log_schema import UserAgentTable, user_agent_table
+from my_frais.metrics import request_metrics
+from my_frais.query_profiler import QueryProfiler, sql_template
+from my_frais.log_sinks import log_router, JsonlFileLogSink
+from my_frais.logging_service import app_logger, error_deduplicator, exception_fingerprint
+from my_frais.mongodb_service import CircuitBreaker, MongoDBService
+from my_frais.admin_services import MongoDBLogService
+from bson.errors import InvalidDocument
+from pymongo.errors import DocumentTooLarge, OperationFailure, ServerSelectionTimeoutError
+from my_frais.viewsets.account_viewset import AccountViewSet
+from my_frais.viewsets.operation_viewset import OperationViewSet
+from my_frais.viewsets.direct_debit_viewset import DirectDebitViewSet
+from my_frais.viewsets.recurring_income_viewset import RecurringIncomeViewSet
+from my_frais.viewsets.budget_projection_viewset import BudgetProjectionViewSet
+from my_frais.viewsets.automated_task_viewset import AutomatedTaskViewSet
 from auth_api.jwt_auth import generate_tokens
 
 
@@ -612,6 +641,36 @@ class AccountViewSetTestCase(APITestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_global_overview_query_count_is_constant(self):
+        """Test que la vue d'ensemble garde un nombre de requêtes constant"""
+        url = reverse('account-global-overview')
+        self.client.get(url)  # Utilisateur authentifié mis en cache
+        # Validateur (3 agrégats), comptes, agrégats d'opérations, prélèvements
+        with self.assertNumQueries(6):
+            self.client.get(url)
+        
+        for index in range(5):
+            account = Account.objects.create(
+                user=self.user, nom=f"Compte {index}", solde=Decimal('-10.00'), created_by=self.user
+            )
+            Operation.objects.create(
+                compte_reference=account, montant=Decimal('-5.00'), description="Op", created_by=self.user
+            )
+            DirectDebit.objects.create(
+                compte_reference=account, montant=Decimal('-30.00'), description="Abonnement",
+                date_prelevement=date.today() + timedelta(days=3), created_by=self.user
+            )
+        
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summary']['total_comptes'], 6)
+        self.assertEqual(response.data['summary']['comptes_negatifs'], 5)
+        self.assertEqual(response.data['recent_activity']['operations_7_jours'], 10)
+        self.assertEqual(response.data['alerts']['prélèvements_imminents'], 5)
+        self.assertEqual(len(response.data['comptes']), 6)
 
 
 class OperationViewSetTestCase(APITestCase):
@@ -674,6 +733,47 @@ class OperationViewSetTestCase(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['created_count'], 2)
+    
+    def test_by_account_returns_bounded_latest_operations(self):
+        """Test du regroupement par compte borné aux dernières opérations"""
+        for i in range(4):
+            Operation.objects.create(
+                compte_reference=self.account, montant=Decimal('10.00'),
+                description=f"Op {i}", created_by=self.user
+            )
+        
+        response = self.client.get(reverse('operation-by-account'), {'latest': 2})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        account_data = response.data[0]
+        self.assertEqual(account_data['operations_count'], 4)
+        self.assertEqual(account_data['total_montant'], 40.0)
+        self.assertEqual([op['description'] for op in account_data['operations']], ['Op 3', 'Op 2'])
+        self.assertTrue(account_data['has_more'])
+    
+    def test_by_account_cursor_drill_down(self):
+        """Test de la pagination par curseur des opérations d'un compte"""
+        for i in range(3):
+            Operation.objects.create(
+                compte_reference=self.account, montant=Decimal('10.00'),
+                description=f"Op {i}", created_by=self.user
+            )
+        
+        url = reverse('operation-by-account')
+        response = self.client.get(url, {'account': self.account.id, 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        
+        response = self.client.get(response.data['next'])
+        self.assertEqual([op['description'] for op in response.data['results']], ['Op 0'])
+        self.assertIsNone(response.data['next'])
+        
+        other_user = User.objects.create_user(username='other@example.com', password='testpassword123')
+        other_account = Account.objects.create(user=other_user, nom="Autre", created_by=other_user)
+        response = self.client.get(url, {'account': other_account.id})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
 class DirectDebitViewSetTestCase(APITestCase):
@@ -977,3 +1077,1481 @@ class MyFraisIntegrationTestCase(TestCase):
         self.assertEqual(direct_debits.count(), 1)
         self.assertEqual(self.account.recurring_incomes.count(), 1)
         self.assertEqual(self.account.budget_projections.count(), 1)
+
+
+class OperationDailyRollupTestCase(APITestCase):
+    """Tests pour les agrégats journaliers d'opérations"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        
+        self.access_token, _ = generate_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+    
+    def _rollup(self):
+        return OperationDailyRollup.objects.get(compte_reference=self.account)
+    
+    def test_rollup_maintained_on_create_update_delete(self):
+        """Test de la maintenance des agrégats à la création, modification et suppression"""
+        operation = Operation.objects.create(
+            compte_reference=self.account, montant=Decimal('100.00'),
+            description="Dépôt", created_by=self.user
+        )
+        Operation.objects.create(
+            compte_reference=self.account, montant=Decimal('-40.00'),
+            description="Achat", created_by=self.user
+        )
+        rollup = self._rollup()
+        self.assertEqual(rollup.operations_count, 2)
+        self.assertEqual(rollup.total_amount, Decimal('60.00'))
+        self.assertEqual(rollup.positive_amount, Decimal('100.00'))
+        self.assertEqual(rollup.negative_count, 1)
+        
+        operation.montant = Decimal('-10.00')
+        operation.save()
+        rollup = self._rollup()
+        self.assertEqual(rollup.operations_count, 2)
+        self.assertEqual(rollup.positive_count, 0)
+        self.assertEqual(rollup.negative_amount, Decimal('-50.00'))
+        
+        operation.delete()
+        rollup = self._rollup()
+        self.assertEqual(rollup.operations_count, 1)
+        self.assertEqual(rollup.total_amount, Decimal('-40.00'))
+    
+    def test_rollup_includes_direct_debits(self):
+        """Test que les prélèvements (qui héritent d'Operation) sont agrégés une seule fois"""
+        debit = DirectDebit.objects.create(
+            compte_reference=self.account, montant=Decimal('50.00'),
+            description="Abonnement", date_prelevement=date.today() + timedelta(days=5),
+            created_by=self.user
+        )
+        self.assertEqual(self._rollup().operations_count, 1)
+        
+        debit.delete()
+        self.assertEqual(self._rollup().operations_count, 0)
+    
+    def test_rebuild_matches_incremental_rollup(self):
+        """Test que la reconstruction donne le même résultat que la maintenance incrémentale"""
+        for montant in ['10.00', '-5.00', '20.00']:
+            Operation.objects.create(
+                compte_reference=self.account, montant=Decimal(montant),
+                description="Op", created_by=self.user
+            )
+        incremental = self._rollup()
+        
+        OperationDailyRollup.objects.all().delete()
+        self.assertEqual(OperationDailyRollup.rebuild(), 1)
+        rebuilt = self._rollup()
+        
+        self.assertEqual(rebuilt.operations_count, incremental.operations_count)
+        self.assertEqual(rebuilt.total_amount, incremental.total_amount)
+        self.assertEqual(rebuilt.negative_amount, incremental.negative_amount)
+    
+    def test_operation_statistics_from_rollups(self):
+        """Test des statistiques d'opérations calculées depuis les agrégats"""
+        url = reverse('operation-list')
+        self.client.post(url, {'compte_reference': self.account.id, 'montant': '200.00', 'description': 'Salaire'}, format='json')
+        self.client.post(url, {'compte_reference': self.account.id, 'montant': '-50.00', 'description': 'Courses'}, format='json')
+        
+        response = self.client.get(reverse('operation-statistics'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['statistics']
+        self.assertEqual(stats['total_operations'], 2)
+        self.assertEqual(stats['total_montant'], 150.0)
+        self.assertEqual(stats['operations_7_jours'], 2)
+        self.assertEqual(stats['montant_negatif'], -50.0)
+
+
+
+class AccountBalanceSnapshotTestCase(APITestCase):
+    """Tests pour les soldes journaliers"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        self.today = date.today()
+        
+        self.access_token, _ = generate_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+    
+    def _transaction(self, montant, days_ago, source_id):
+        AutomaticTransaction.objects.create(
+            compte_reference=self.account, montant=Decimal(montant), description="Auto",
+            date_transaction=self.today - timedelta(days=days_ago),
+            transaction_type='recurring_income', source_id=source_id,
+            source_reference='1', created_by=self.user
+        )
+    
+    def test_backfill_walks_back_from_current_balance(self):
+        """Test du calcul des soldes passés à partir du solde actuel"""
+        self._transaction('200.00', 2, 'a')
+        self._transaction('-50.00', 0, 'b')
+        
+        written = BalanceSnapshotService.backfill(self.today - timedelta(days=3))
+        
+        self.assertEqual(written, 3)
+        soldes = dict(AccountBalanceSnapshot.objects.values_list('date_snapshot', 'solde'))
+        self.assertEqual(soldes[self.today - timedelta(days=1)], Decimal('1050.00'))
+        self.assertEqual(soldes[self.today - timedelta(days=2)], Decimal('1050.00'))
+        self.assertEqual(soldes[self.today - timedelta(days=3)], Decimal('850.00'))
+    
+    def test_balance_on_fills_gap_from_previous_snapshot(self):
+        """Test du solde à une date sans snapshot, complété par les mouvements manquants"""
+        AccountBalanceSnapshot.objects.create(
+            compte_reference=self.account, date_snapshot=self.today - timedelta(days=3), solde=Decimal('900.00')
+        )
+        self._transaction('100.00', 2, 'a')
+        
+        solde = BalanceSnapshotService.balance_on(self.account, self.today - timedelta(days=2))
+        
+        self.assertEqual(solde, Decimal('1000.00'))
+    
+    def test_daily_deltas_uses_datetime_range_on_created_at(self):
+        """Test : bornes de jour exactes, sans DATE()/CAST sur created_at (index utilisable)"""
+        start, end = self.today - timedelta(days=3), self.today - timedelta(days=2)
+        day_start = BalanceSnapshotService.start_of_day
+        for montant, created_at in [
+            ('10.00', day_start(start)),
+            ('20.00', day_start(end + timedelta(days=1)) - timedelta(microseconds=1)),
+            ('40.00', day_start(end + timedelta(days=1))),
+            ('80.00', day_start(start) - timedelta(microseconds=1)),
+        ]:
+            operation = Operation.objects.create(
+                compte_reference=self.account, montant=Decimal(montant), description="Op", created_by=self.user
+            )
+            Operation.objects.filter(pk=operation.pk).update(created_at=created_at)
+        
+        with self.assertNumQueries(2) as queries:
+            deltas = BalanceSnapshotService.daily_deltas([self.account.id], start, end)
+        
+        self.assertEqual(deltas, {(self.account.id, start): Decimal('10.00'), (self.account.id, end): Decimal('20.00')})
+        where = queries.captured_queries[0]['sql'].split('WHERE', 1)[1]
+        self.assertNotIn('django_datetime_cast_date', where)
+        self.assertIn('"my_frais_operation"."created_at" >=', where)
+    
+    def test_history_fills_days_without_snapshot(self):
+        """Test : jours sans snapshot (traitement quotidien manqué) complétés par les mouvements"""
+        for days_ago, solde in ((5, '900.00'), (2, '1000.00')):
+            AccountBalanceSnapshot.objects.create(
+                compte_reference=self.account, date_snapshot=self.today - timedelta(days=days_ago), solde=Decimal(solde)
+            )
+        self._transaction('100.00', 3, 'a')
+        
+        series = BalanceSnapshotService.history(self.account, self.today - timedelta(days=5), self.today)
+        
+        self.assertEqual([point['date'] for point in series], [self.today - timedelta(days=5 - i) for i in range(6)])
+        self.assertEqual([point['solde'] for point in series], [900.0, 900.0, 1000.0, 1000.0, 1000.0, 1000.0])
+    
+    def test_downsample_lttb_keeps_bounds(self):
+        """Test du sous-échantillonnage LTTB"""
+        series = [
+            {'date': self.today - timedelta(days=100 - i), 'solde': float(i % 7)}
+            for i in range(100)
+        ]
+        
+        sampled = BalanceSnapshotService.downsample_lttb(series, 10)
+        
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], series[0])
+        self.assertEqual(sampled[-1], series[-1])
+    
+    def test_balance_history_endpoint(self):
+        """Test de l'endpoint d'historique du solde"""
+        BalanceSnapshotService.backfill(self.today - timedelta(days=5))
+        url = reverse('account-balance-history', args=[self.account.id])
+        
+        response = self.client.get(url, {'start': (self.today - timedelta(days=5)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['points'], 6)
+        self.assertEqual(response.data['history'][-1]['solde'], 1000.0)
+        
+        response = self.client.get(url, {'date': (self.today - timedelta(days=2)).isoformat()})
+        self.assertEqual(response.data['solde'], 1000.0)
+        
+        response = self.client.get(url, {'date': 'invalide'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BalanceReconciliationTestCase(APITestCase):
+    """Tests pour le rapprochement des soldes"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        
+        self.access_token, _ = generate_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+    
+    def _reconcile(self, correct=False):
+        return BalanceReconciliationService.reconcile_range(self.account.id, self.account.id + 1, correct)
+    
+    def test_drift_detected_and_corrected(self):
+        """Test de la détection et de la correction d'un écart"""
+        response = self.client.post(reverse('operation-list'), {
+            'compte_reference': self.account.id,
+            'montant': '-50.00',
+            'description': 'Courses'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._reconcile()['drifts'], [])
+        
+        Account.objects.filter(id=self.account.id).update(solde=Decimal('900.00'))
+        result = self._reconcile(correct=True)
+        
+        self.assertEqual(result['corrected'], 1)
+        self.assertEqual(result['drifts'][0]['ecart'], Decimal('-50.00'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.solde, Decimal('950.00'))
+    
+    def test_manual_balance_update_is_not_a_drift(self):
+        """Test qu'une modification manuelle du solde déplace le solde d'ouverture"""
+        url = reverse('account-detail', args=[self.account.id])
+        response = self.client.patch(url, {'solde': '1200.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.solde_initial, Decimal('1200.00'))
+        self.assertEqual(self._reconcile()['drifts'], [])
+
+
+class QueryPlanTestCase(TestCase):
+    """Vérifie via EXPLAIN que les requêtes principales utilisent un index"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        self.today = date.today()
+        DirectDebit.objects.create(
+            compte_reference=self.account, montant=Decimal('-30.00'), description="Abonnement",
+            date_prelevement=self.today, created_by=self.user
+        )
+        RecurringIncome.objects.create(
+            compte_reference=self.account, montant=Decimal('2000.00'), description="Salaire",
+            date_premier_versement=self.today, created_by=self.user
+        )
+        AutomatedTask.log_task('PAYMENT_PROCESSING', 'SUCCESS', user=self.user)
+        
+        if connection.vendor not in ('mysql', 'sqlite'):
+            self.skipTest(f"Analyse des plans non prise en charge pour {connection.vendor}")
+    
+    def _full_scans(self, queryset):
+        """Retourne les tables lues intégralement dans le plan d'exécution"""
+        if connection.vendor == 'mysql':
+            plan = json.loads(queryset.explain(format='json'))
+            scans = []
+            
+            def walk(node):
+                if isinstance(node, dict):
+                    table = node.get('table')
+                    if isinstance(table, dict) and table.get('access_type') == 'ALL':
+                        scans.append(table.get('table_name'))
+                    for value in node.values():
+                        walk(value)
+                elif isinstance(node, list):
+                    for value in node:
+                        walk(value)
+            walk(plan)
+            return scans
+        
+        # SQLite : "SCAN <table>" sans index associé
+        return re.findall(r'\bSCAN (\w+)$', queryset.explain(), re.MULTILINE)
+    
+    def _list_queryset(self, viewset_class):
+        """Requête de liste d'un viewset pour l'utilisateur de test"""
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.user
+        view = viewset_class(request=request, action='list', format_kwarg=None)
+        return view.filter_queryset(view.get_queryset())
+    
+    def assertNoFullScan(self, queryset):
+        self.assertEqual(self._full_scans(queryset), [], str(queryset.query))
+    
+    def test_viewset_list_queries_use_indexes(self):
+        """Test des requêtes de liste des viewsets"""
+        for viewset_class in (
+            AccountViewSet, OperationViewSet, DirectDebitViewSet,
+            RecurringIncomeViewSet, BudgetProjectionViewSet, AutomatedTaskViewSet
+        ):
+            with self.subTest(viewset=viewset_class.__name__):
+                self.assertNoFullScan(self._list_queryset(viewset_class))
+    
+    def test_account_history_queries_use_indexes(self):
+        """Test des requêtes par compte et par période"""
+        self.assertNoFullScan(
+            Operation.objects.filter(compte_reference=self.account).order_by('-created_at', '-id')
+        )
+        self.assertNoFullScan(
+            AutomaticTransaction.objects.filter(
+                compte_reference=self.account,
+                date_transaction__gte=self.today - timedelta(days=30),
+                transaction_type='direct_debit'
+            )
+        )
+    
+    def _usable_indexes(self, queryset):
+        """
+        Index envisagés par le planificateur (MySQL : possible_keys, stable quel que soit le
+        volume des tables ; SQLite : index utilisés par le plan)
+        """
+        if connection.vendor == 'mysql':
+            plan = json.loads(queryset.explain(format='json'))
+            keys = set()
+            
+            def walk(node):
+                if isinstance(node, dict):
+                    table = node.get('table')
+                    if isinstance(table, dict):
+                        keys.update(table.get('possible_keys', []))
+                    for value in node.values():
+                        walk(value)
+                elif isinstance(node, list):
+                    for value in node:
+                        walk(value)
+            walk(plan)
+            return keys
+        
+        # SQLite reçoit "WHERE actif" (sans comparaison), que son planificateur n'indexe pas ;
+        # le plan est lu pour la forme "actif = 1" envoyée à MySQL
+        sql, params = queryset.query.sql_with_params()
+        select, where = sql.split(' WHERE ', 1)
+        where = re.sub(r'("\w+"\."actif")(?!\s*=)', r'\1 = 1', where)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {select} WHERE {where}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+        return {name for detail in details for name in re.findall(r'USING (?:COVERING )?INDEX (\w+)', detail)}
+    
+    def test_daily_processing_queries_use_indexes(self):
+        """Test des requêtes du traitement quotidien"""
+        self.assertIn('directdebit_actif_date_idx', self._usable_indexes(
+            DirectDebit.objects.filter(actif=True, date_prelevement__lte=self.today).exclude(echeance__lt=self.today)
+        ))
+        self.assertIn('income_actif_date_idx', self._usable_indexes(
+            RecurringIncome.objects.filter(actif=True, date_premier_versement__lte=self.today).exclude(date_fin__lt=self.today)
+        ))
+
+
+class AccountCountersTestCase(APITestCase):
+    """Tests pour les compteurs dénormalisés des comptes"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        self.future = date.today() + timedelta(days=10)
+        
+        self.access_token, _ = generate_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+    
+    def _counters(self):
+        self.account.refresh_from_db()
+        return (
+            self.account.operations_count, self.account.active_debits_count,
+            self.account.active_incomes_count
+        )
+    
+    def test_counters_follow_write_paths(self):
+        """Test de la maintenance des compteurs par les créations, modifications et suppressions"""
+        first = Operation.objects.create(
+            compte_reference=self.account, montant=Decimal('-10.00'), description="Op 1", created_by=self.user
+        )
+        second = Operation.objects.create(
+            compte_reference=self.account, montant=Decimal('-20.00'), description="Op 2", created_by=self.user
+        )
+        debit = DirectDebit.objects.create(
+            compte_reference=self.account, montant=Decimal('-30.00'), description="Abonnement",
+            date_prelevement=self.future, created_by=self.user
+        )
+        income = RecurringIncome.objects.create(
+            compte_reference=self.account, montant=Decimal('2000.00'), description="Salaire",
+            date_premier_versement=self.future, created_by=self.user
+        )
+        self.assertEqual(self._counters(), (3, 1, 1))
+        self.assertEqual(self.account.last_operation_at, debit.created_at)
+        
+        debit.actif = False
+        debit.save()
+        income.actif = False
+        income.save()
+        self.assertEqual(self._counters(), (3, 0, 0))
+        
+        debit.delete()
+        second.delete()
+        self.assertEqual(self._counters(), (1, 0, 0))
+        self.assertEqual(self.account.last_operation_at, first.created_at)
+    
+    def test_bulk_status_and_repair(self):
+        """Test du recalcul après une mise à jour groupée et de la réparation"""
+        debit = DirectDebit.objects.create(
+            compte_reference=self.account, montant=Decimal('-30.00'), description="Abonnement",
+            date_prelevement=self.future, created_by=self.user
+        )
+        response = self.client.post(reverse('direct-debit-bulk-status'), {
+            'prélèvements_ids': [debit.id], 'actif': False
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._counters(), (1, 0, 0))
+        
+        Account.objects.filter(id=self.account.id).update(operations_count=42, active_debits_count=7)
+        self.assertEqual(Account.rebuild_counters([self.account.id]), 1)
+        self.assertEqual(self._counters(), (1, 0, 0))
+    
+    def test_account_list_query_count_is_constant(self):
+        """Test que la liste des comptes ne fait pas de requête par compte"""
+        for index in range(5):
+            account = Account.objects.create(
+                user=self.user, nom=f"Compte {index}", solde=Decimal('10.00'), created_by=self.user
+            )
+            Operation.objects.create(
+                compte_reference=account, montant=Decimal('5.00'), description="Op", created_by=self.user
+            )
+        
+        self.client.get(reverse('account-list'))  # Utilisateur authentifié mis en cache
+        # Validateur (ETag), puis une seule requête pour tous les comptes
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('account-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ConditionalRequestTestCase(APITestCase):
+    """Tests pour les requêtes conditionnelles (ETag / If-None-Match / If-Match)"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        
+        self.access_token, _ = generate_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+    
+    def test_list_not_modified_until_change(self):
+        """Test du 304 sur la liste des comptes, puis d'un nouvel ETag après modification"""
+        url = reverse('account-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        
+        # Validateur uniquement (utilisateur authentifié en cache)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        self.client.post(reverse('operation-list'), {
+            'compte_reference': self.account.id, 'montant': '-20.00', 'description': 'Courses'
+        }, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_dashboard_not_modified(self):
+        """Test du 304 sur les tableaux de bord"""
+        for url in (reverse('account-global-overview'), reverse('budget-projection-dashboard')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_if_match_on_update(self):
+        """Test de la concurrence optimiste via If-Match"""
+        url = reverse('account-detail', args=[self.account.id])
+        etag = self.client.get(url)['ETag']
+        
+        response = self.client.patch(url, {'nom': 'Renommé'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        
+        # L'ETag initial est périmé
+        response = self.client.patch(url, {'nom': 'Autre'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.nom, 'Renommé')
+
+
+@override_settings(SYNC_SETTINGS={'PAGE_SIZE': 2, 'CURSOR_GRACE_SECONDS': 0})
+class SyncViewSetTestCase(APITestCase):
+    """Tests pour la synchronisation différentielle"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpassword123'
+        )
+        self.account = Account.objects.create(
+            user=self.user,
+            nom="Compte Test",
+            solde=Decimal('1000.00'),
+            created_by=self.user
+        )
+        Account.objects.create(user=self.other_user, nom="Autre", solde=Decimal('10.00'), created_by=self.other_user)
+        self.operation = Operation.objects.create(
+            compte_reference=self.account, montant=Decimal('-10.00'), description="Op", created_by=self.user
+        )
+        
+        self.access_token, _ = generate_tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.url = reverse('sync-list')
+    
+    def _sync_all(self, cursor=None):
+        """Parcourt toutes les pages et retourne (changements, curseur final)"""
+        changes = []
+        while True:
+            response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changes.extend(response.data['changes'])
+            cursor = response.data['cursor']
+            if not response.data['has_more']:
+                return changes, cursor
+    
+    def test_initial_then_delta_sync(self):
+        """Test de la synchronisation complète puis différentielle avec tombstone"""
+        changes, cursor = self._sync_all()
+        self.assertEqual(
+            sorted((change['model'], change['id']) for change in changes),
+            [('account', self.account.id), ('operation', self.operation.id)]
+        )
+        
+        changes, cursor = self._sync_all(cursor)
+        self.assertEqual(changes, [])
+        
+        self.client.delete(reverse('operation-detail', args=[self.operation.id]))
+        changes, cursor = self._sync_all(cursor)
+        
+        actions = {(change['model'], change['action']) for change in changes}
+        self.assertIn(('operation', 'delete'), actions)
+        self.assertIn(('account', 'upsert'), actions)  # Solde recalculé
+        self.assertEqual(self._sync_all(cursor)[0], [])
+    
+    def test_invalid_and_expired_cursor(self):
+        """Test des curseurs invalides et expirés"""
+        response = self.client.get(self.url, {'cursor': 'invalide'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        expired = base64.urlsafe_b64encode(b'1:1000').decode()
+        response = self.client.get(self.url, {'cursor': expired})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(response.data['reset'])
+    
+    @override_settings(SYNC_SETTINGS={'CURSOR_GRACE_SECONDS': 60})
+    def test_cursor_does_not_pass_recent_changes(self):
+        """Test que le curseur ne dépasse pas les changements trop récents"""
+        response = self.client.get(self.url)
+        
+        self.assertEqual(len(response.data['changes']), 2)
+        self.assertEqual(SyncService.decode_cursor(response.data['cursor'])[0], 0)
+
+
+class RateLimitTestCase(APITestCase):
+    """Tests pour la limitation de débit des endpoints coûteux"""
+    
+    RATES = {'dashboard': {'capacity': 2, 'per_minute': 1, 'key': 'user'}}
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser@example.com',
+            email='testuser@example.com',
+            password='testpassword123'
+        )
+        self.other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpassword123'
+        )
+        self.url = reverse('budget-projection-dashboard')
+        get_bucket_backend().reset()
+    
+    def _get_as(self, user):
+        access_token, _ = generate_tokens(user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        return self.client.get(self.url)
+    
+    def _assert_limited_per_user(self):
+        for _ in range(2):
+            self.assertEqual(self._get_as(self.user).status_code, status.HTTP_200_OK)
+        response = self._get_as(self.user)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self._get_as(self.other_user).status_code, status.HTTP_200_OK)
+    
+    def test_dashboard_limited_per_user(self):
+        """Test du seau par utilisateur (backend en mémoire)"""
+        with override_settings(RATE_LIMIT_SETTINGS={'RATES': self.RATES}):
+            self._assert_limited_per_user()
+    
+    def test_cache_backend(self):
+        """Test du backend partagé via le cache Django"""
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ratelimit-tests'}},
+            RATE_LIMIT_SETTINGS={'BACKEND': 'my_frais.throttling.CacheBucketBackend', 'RATES': self.RATES}
+        ):
+            self._assert_limited_per_user()
+            # reset (interface commune des backends) remplit tous les seaux
+            get_bucket_backend().reset()
+            self.assertEqual(self._get_as(self.user).status_code, status.HTTP_200_OK)
+    
+    def test_token_bucket_refill(self):
+        """Test du remplissage progressif du seau (1 jeton par minute)"""
+        take = InProcessBucketBackend._take
+        self.assertEqual(take(2, 0, 0, 2, 1 / 60), (1, 0))
+        tokens, wait = take(0, 0, 0, 2, 1 / 60)
+        self.assertAlmostEqual(wait, 60)
+        tokens, wait = take(0, 0, 30, 2, 1 / 60)
+        self.assertAlmostEqual(wait, 30)
+        # Le seau ne dépasse jamais sa capacité
+        self.assertEqual(take(0, 0, 3600, 2, 1 / 60), (1, 0))
+
+
+class AsyncLogWriterTestCase(TestCase):
+    """Tests pour l'écriture asynchrone des logs"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.writer = AsyncLogWriter()
+        self.batches = []
+        patcher = patch(
+            'my_frais.log_writer.log_router.write',
+            side_effect=lambda collection, documents: self.batches.append((collection, list(documents))) or len(documents)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.writer.shutdown)
+    
+    @override_settings(LOG_WRITER_SETTINGS={'BATCH_SIZE': 3, 'FLUSH_INTERVAL': 60})
+    def test_batches_by_collection_and_drains_on_shutdown(self):
+        """Test des insert_many groupés par collection et de la vidange à l'arrêt"""
+        for index in range(3):
+            self.writer.submit('crud_events', {'index': index})
+        self.writer.submit('errors', {'index': 3})
+        self.writer.shutdown(timeout=5)
+        
+        written = sorted((collection, len(documents)) for collection, documents in self.batches)
+        self.assertEqual(written, [('crud_events', 3), ('errors', 1)])
+        self.assertEqual(self.writer.stats()['written'], 4)
+        self.assertEqual(self.writer.stats()['queue_depth'], 0)
+    
+    @override_settings(LOG_WRITER_SETTINGS={'QUEUE_SIZE': 1, 'FLUSH_INTERVAL': 60, 'BATCH_SIZE': 100})
+    def test_full_queue_drops_or_spools(self):
+        """Test du débordement : logs comptés comme ignorés, ou conservés dans le spool"""
+        spool = LogSpool()
+        with patch.object(self.writer, '_run'), patch('my_frais.log_writer.log_spool', spool):
+            # Thread sans consommateur : la file reste pleine
+            self.writer.submit('errors', {'index': 0})
+            self.writer.submit('errors', {'index': 1})
+            self.assertEqual(self.writer.stats()['dropped'], 1)
+            
+            with tempfile.TemporaryDirectory() as directory:
+                with override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': directory}):
+                    self.writer.submit('errors', {'index': 2})
+                    spooled = spool.find('errors')
+        
+        self.assertEqual([log['index'] for log in spooled], [2])
+        self.assertEqual(self.writer.stats()['spilled'], 1)
+    
+    @override_settings(LOG_WRITER_SETTINGS={'ASYNC': False})
+    def test_synchronous_mode(self):
+        """Test du mode synchrone (écriture immédiate)"""
+        self.writer.submit('auth_events', {'event_type': 'login_success'})
+        
+        self.assertEqual(len(self.batches), 1)
+        self.assertIn('timestamp', self.batches[0][1][0])
+
+
+class LogSinkTestCase(TestCase):
+    """Tests pour les destinations (sinks) des logs"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'events.jsonl')
+        error_deduplicator.reset()
+    
+    def test_routing_and_fan_out(self):
+        """Test du routage par collection : erreurs vers deux sinks, CRUD vers fichier, le reste ignoré"""
+        sinks = {
+            'SINKS': {
+                'memory': {'BACKEND': 'my_frais.log_sinks.RingBufferLogSink', 'OPTIONS': {'capacity': 100}},
+                'file': {'BACKEND': 'my_frais.log_sinks.JsonlFileLogSink', 'OPTIONS': {'path': self.path}},
+                'null': {'BACKEND': 'my_frais.log_sinks.NullLogSink'},
+            },
+            'ROUTES': {'errors': ['memory', 'file'], 'crud_events': ['file'], 'default': ['null']},
+        }
+        with override_settings(LOG_SINKS=sinks, LOG_WRITER_SETTINGS={'ASYNC': False}):
+            app_logger.log_error(ValueError('boom'), context={'action': 'test'})
+            app_logger.log_crud_event('create', 'Operation', object_id=1)
+            app_logger.log_auth_event('login_success')
+            memory = log_router.get_sink('memory')
+            
+            self.assertEqual([log['error_message'] for log in memory.find('errors')], ['boom'])
+            self.assertEqual(memory.find('crud_events'), [])
+        
+        with open(self.path) as log_file:
+            collections = [json.loads(line)['collection'] for line in log_file]
+        self.assertEqual(collections, ['errors', 'crud_events'])
+    
+    def test_file_rotation(self):
+        """Test de la rotation du fichier JSONL par taille"""
+        sink = JsonlFileLogSink(self.path, max_bytes=200, backup_count=2)
+        for index in range(20):
+            sink.write('errors', [{'index': index, 'message': 'x' * 50}])
+        
+        self.assertTrue(os.path.exists(f'{self.path}.1'))
+        self.assertTrue(os.path.exists(f'{self.path}.2'))
+        self.assertFalse(os.path.exists(f'{self.path}.3'))
+        self.assertLessEqual(os.path.getsize(self.path), 200)
+
+
+class MongoDBCircuitBreakerTestCase(TestCase):
+    """Tests pour le disjoncteur du service MongoDB"""
+    
+    def test_breaker_states(self):
+        """Test des transitions fermé -> ouvert -> semi-ouvert -> fermé"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        
+        # Délai écoulé : un seul appel d'essai
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.stats()['state_code'], 0)
+    
+    def test_open_breaker_fails_fast_to_local_spool(self):
+        """Test que les logs partent au spool local sans appel MongoDB quand le disjoncteur est ouvert"""
+        service = MongoDBService()
+        service.db = MagicMock()
+        collection = service.db.__getitem__.return_value
+        collection.insert_many.side_effect = ServerSelectionTimeoutError('indisponible')
+        collection.find.side_effect = ServerSelectionTimeoutError('indisponible')
+        spool = LogSpool()
+        
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': directory, 'REPLAY_INTERVAL': 3600}), \
+                patch('my_frais.mongodb_service.log_spool', spool):
+            for index in range(4):
+                self.assertEqual(service.insert_logs('errors', [{'index': index}]), 0)
+            
+            # Les logs en spool restent consultables
+            self.assertEqual([log['index'] for log in service.find_logs('errors', limit=10)], [3, 2, 1, 0])
+        
+        self.assertEqual(collection.insert_many.call_count, 3)
+        self.assertEqual(service.stats()['state'], CircuitBreaker.OPEN)
+        self.assertEqual(service.stats()['fallback_total'], 4)
+
+
+    def test_unencodable_log_does_not_lose_batch(self):
+        """Test : un log non encodable en BSON est écarté, les autres logs du lot sont écrits"""
+        service = MongoDBService()
+        service.db = MagicMock()
+        collection = service.db.__getitem__.return_value
+        stored = []
+        
+        def insert_many(documents, ordered):
+            if any(isinstance(document.get('details'), Decimal) for document in documents):
+                raise InvalidDocument("cannot encode object: Decimal('10.00')")
+            stored.extend(documents)
+            return MagicMock(inserted_ids=[document.get('_id') for document in documents])
+        
+        collection.insert_many.side_effect = insert_many
+        documents = [{'index': 0}, {'index': 1, 'details': Decimal('10.00')}, {'index': 2}]
+        
+        self.assertEqual(service.insert_logs('errors', documents), 2)
+        self.assertEqual([document['index'] for document in stored], [0, 2])
+        self.assertEqual(service.stats()['fallback_total'], 0)
+        self.assertEqual(service.stats()['state'], CircuitBreaker.CLOSED)
+
+
+class MongoDBLazyClientTestCase(TestCase):
+    """Tests pour l'initialisation paresseuse du client MongoDB"""
+    
+    def test_client_created_on_first_use_once_per_process(self):
+        """Test : aucun client à la création du service, un client par processus ensuite"""
+        service = MongoDBService()
+        self.assertIsNone(service._client)
+        
+        with patch('my_frais.mongodb_service.MongoClient') as client_class:
+            service.db
+            service.db
+            self.assertEqual(client_class.call_count, 1)
+            
+            # Processus forké : nouveau client, disjoncteur remis à zéro
+            service.breaker.record_failure()
+            service._reset_after_fork()
+            with patch('my_frais.mongodb_service.os.getpid', return_value=os.getpid() + 1):
+                service.db
+            self.assertEqual(client_class.call_count, 2)
+            self.assertEqual(service.breaker.failures, 0)
+    
+    def test_indexes_ensured_on_first_call(self):
+        """Test : TTL selon la rétention et index composés créés au premier appel seulement"""
+        service = MongoDBService()
+        service.db = MagicMock()
+        collections = {}
+        service.db.__getitem__.side_effect = lambda name: collections.setdefault(name, MagicMock())
+        
+        with override_settings(MONGODB_CONFIG={**settings.MONGODB_CONFIG, 'retention_days': {'errors': 90}}):
+            service._call(lambda: True, False, "Erreur")
+            service._call(lambda: True, False, "Erreur")
+        
+        errors_calls = collections['errors'].create_index.call_args_list
+        self.assertEqual(errors_calls[0].kwargs, {'name': 'timestamp_ttl_idx', 'expireAfterSeconds': 90 * 86400})
+        self.assertEqual(len(errors_calls), 4)
+        crud_names = [call.kwargs['name'] for call in collections['crud_events'].create_index.call_args_list]
+        self.assertEqual(crud_names, ['timestamp_idx', 'user_timestamp_idx', 'event_type_timestamp_idx', 'timestamp_id_idx', 'model_object_idx'])
+    
+    def test_index_failure_does_not_block_writes(self):
+        """Test : index impossibles à créer (collMod refusé), les logs sont tout de même écrits"""
+        service = MongoDBService()
+        service.db = MagicMock()
+        collection = service.db.__getitem__.return_value
+        collection.insert_many.side_effect = lambda documents, ordered: MagicMock(inserted_ids=[1] * len(documents))
+        
+        with patch.object(service, 'ensure_indexes', side_effect=OperationFailure('not authorized', 13)) as ensure:
+            for index in range(3):
+                self.assertEqual(service.insert_logs('errors', [{'index': index}]), 1)
+        
+        # Un seul essai (nouvel essai différé), disjoncteur fermé
+        ensure.assert_called_once()
+        self.assertEqual(collection.insert_many.call_count, 3)
+        self.assertEqual(service.stats()['state'], CircuitBreaker.CLOSED)
+        self.assertEqual(service.stats()['fallback_total'], 0)
+
+
+class AdminLogsPaginationTestCase(TestCase):
+    """Tests pour la pagination par curseur et le détail à la demande des logs de l'admin"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        spool_settings = override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': directory.name, 'FSYNC_EVERY': 1})
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        
+        # MongoDB en panne : les logs viennent du spool local, filtré par clé comme en base
+        self.service = MongoDBService()
+        self.service.db = MagicMock()
+        self.service.db['errors'].find.side_effect = ServerSelectionTimeoutError('indisponible')
+        self.service.db['errors'].find_one.side_effect = ServerSelectionTimeoutError('indisponible')
+        service_patch = patch('my_frais.admin_services.mongodb_service', self.service)
+        service_patch.start()
+        self.addCleanup(service_patch.stop)
+        
+        timestamp = datetime(2026, 1, 1, 12, 0)
+        self.service._fallback('errors', [
+            {'event_type': 'error', 'index': index, 'timestamp': timestamp - timedelta(minutes=index // 2),
+             'error_traceback': f'Traceback {index}'}
+            for index in range(5)
+        ])
+    
+    def test_cursor_pages_cover_all_logs_once(self):
+        """Test : pages suivantes sans doublon (timestamps égaux inclus), retour à la page précédente"""
+        first = MongoDBLogService.get_logs_page('errors', limit=2)
+        self.assertIsNone(first['prev_cursor'])
+        
+        pages, page = [first], first
+        while page['next_cursor']:
+            page = MongoDBLogService.get_logs_page('errors', limit=2, after=page['next_cursor'])
+            pages.append(page)
+        seen = [log['log_id'] for page in pages for log in page['logs']]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        self.assertEqual(len(pages), 3)
+        
+        previous = MongoDBLogService.get_logs_page('errors', limit=2, before=pages[1]['prev_cursor'])
+        self.assertEqual([log['log_id'] for log in previous['logs']], [log['log_id'] for log in first['logs']])
+        self.assertIsNone(previous['prev_cursor'])
+        
+        with self.assertRaises(ValueError):
+            MongoDBLogService.get_logs_page('errors', after='invalide')
+    
+    def test_spool_not_read_while_mongodb_healthy(self):
+        """Test : segments du spool lus seulement pendant une panne de MongoDB"""
+        self.service.db['errors'].find.side_effect = None
+        self.service.db['errors'].find.return_value.sort.return_value.limit.return_value = []
+        with patch.object(LogSpool, '_read_segment') as read_segment:
+            self.assertEqual(MongoDBLogService.get_logs_page('errors', limit=2)['logs'], [])
+        read_segment.assert_not_called()
+    
+    def test_projection_and_lazy_detail(self):
+        """Test : projection des champs de liste en base, blobs servis par l'API de détail"""
+        cursor = MongoDBLogService.get_logs_page('errors', limit=2)['next_cursor']
+        MongoDBLogService.get_logs_page('errors', limit=2, after=cursor)
+        query, projection = self.service.db['errors'].find.call_args.args
+        self.assertIn('$or', query)
+        self.assertEqual(projection, MongoDBLogService.LIST_PROJECTION)
+        
+        staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client.force_login(staff)
+        log = MongoDBLogService.get_logs_page('errors', limit=1)['logs'][0]
+        # Logs du spool projetés comme en base
+        self.assertNotIn('error_traceback', log)
+        spooled = {str(log['_id']): log for log in log_spool.find('errors')}
+        
+        response = self.client.get(reverse('mongodb_logs:api', args=['errors']), {'id': log['log_id']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['log']['error_traceback_display'], spooled[log['log_id']]['error_traceback'])
+        
+        response = self.client.get(reverse('mongodb_logs:errors'), {'limit': 2})
+        self.assertContains(response, 'Afficher les détails', count=2)
+        self.assertNotContains(response, 'Traceback')
+        
+        response = self.client.get(reverse('mongodb_logs:api', args=['inconnue']))
+        self.assertEqual(response.status_code, 404)
+
+
+class UserLogTimelineTestCase(TestCase):
+    """Tests pour la chronologie des logs d'un utilisateur"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        spool_settings = override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': directory.name, 'FSYNC_EVERY': 1})
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        
+        self.service = MongoDBService()
+        self.service.db = MagicMock()
+        self.service.db['auth_events'].aggregate.side_effect = ServerSelectionTimeoutError('indisponible')
+        service_patch = patch('my_frais.admin_services.mongodb_service', self.service)
+        service_patch.start()
+        self.addCleanup(service_patch.stop)
+        
+        self.start = datetime(2026, 1, 1)
+        for collection, category in [('auth_events', 'authentication'), ('crud_events', 'crud')]:
+            self.service._fallback(collection, [
+                {'category': category, 'user_info': {'user_id': user_id}, 'timestamp': self.start + timedelta(hours=hour)}
+                for hour in range(3) for user_id in (7, 8)
+            ])
+    
+    def test_single_aggregation_merged_on_server(self):
+        """Test : une seule agrégation $unionWith, triée et limitée après la fusion"""
+        self.service.find_timeline(['auth_events', 'crud_events', 'business_events'], {'user_info.user_id': 7}, 10)
+        
+        self.service.db['auth_events'].aggregate.assert_called_once()
+        pipeline = self.service.db['auth_events'].aggregate.call_args.args[0]
+        unions = [stage['$unionWith']['coll'] for stage in pipeline if '$unionWith' in stage]
+        self.assertEqual(unions, ['crud_events', 'business_events'])
+        self.assertEqual(pipeline[-2:], [{'$sort': {'timestamp': -1, '_id': -1}}, {'$limit': 10}])
+    
+    def test_cursor_and_filters_across_collections(self):
+        """Test : pages fusionnées sans doublon, filtres par catégorie et par date"""
+        seen, cursor = [], None
+        while True:
+            page = MongoDBLogService.get_user_timeline(7, limit=4, cursor=cursor)
+            seen += page['logs']
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len({log['log_id'] for log in seen}), 6)
+        self.assertEqual(seen, sorted(seen, key=lambda log: log['timestamp'], reverse=True))
+        self.assertEqual({log['collection'] for log in seen}, {'auth_events', 'crud_events'})
+        
+        with patch.object(LogSpool, '_read_segment', wraps=LogSpool._read_segment) as read_segment:
+            MongoDBLogService.get_user_timeline(7, limit=4)
+        # Segments lus une seule fois pour les trois collections, et non une fois par collection
+        self.assertEqual(read_segment.call_count, log_spool.stats()['segments'])
+        
+        page = MongoDBLogService.get_user_timeline(
+            7, categories=['crud'], start_date=self.start + timedelta(hours=1)
+        )
+        self.assertEqual(len(page['logs']), 2)
+        self.assertTrue(all(log['collection'] == 'crud_events' for log in page['logs']))
+        
+        staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.client.force_login(staff)
+        url = reverse('mongodb_logs:user_timeline', args=[8])
+        response = self.client.get(url, {'collection': 'auth_events', 'end': '2026-01-01T01:00:00'})
+        self.assertEqual(len(response.json()['logs']), 2)
+        self.assertEqual(self.client.get(url, {'collection': 'inconnue'}).status_code, 400)
+
+
+class LogRollupsTestCase(TestCase):
+    """Tests pour les agrégats des logs (tableau de bord)"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.rollups = LogRollups()
+        self.timestamp = datetime(2026, 1, 1, 10, 30)
+    
+    def error(self, message, line):
+        return {
+            'event_type': 'error', 'error_type': 'KeyError', 'error_message': message,
+            'error_traceback': f'File "/app/my_frais/services.py", line {line}, in compute',
+            'timestamp': self.timestamp, 'request_info': {'path': '/api/v1/accounts/12/'},
+        }
+    
+    def test_increments_are_batched_per_key(self):
+        """Test : une opération par clé, empreinte indépendante des valeurs variables"""
+        self.rollups.record('errors', [self.error("'compte 12'", 10), self.error("'compte 13'", 11)])
+        self.rollups.record('auth_events', [
+            {'event_type': 'login_failed', 'success': False, 'timestamp': self.timestamp,
+             'request_info': {'ip_address': '10.0.0.1'}},
+        ] * 3)
+        self.rollups.record('business_events', [
+            {'event_type': 'slow_request', 'timestamp': self.timestamp,
+             'details': {'duration': duration, 'path': f'/api/v1/accounts/{index}/'}}
+            for index, duration in enumerate([2.5, 2.8, 7.0])
+        ])
+        
+        with patch('my_frais.log_rollups.mongodb_service.upsert_many', return_value=True) as upsert_many:
+            self.assertTrue(self.rollups.flush())
+        operations = {call.args[0]: call.args[1] for call in upsert_many.call_args_list}
+        
+        fingerprints = operations['rollup_error_fingerprints']
+        self.assertEqual(len(fingerprints), 1)
+        self.assertEqual(fingerprints[0]._doc['$inc'], {'count': 2})
+        self.assertEqual(fingerprints[0]._doc['$setOnInsert']['path'], '/api/v1/accounts/{id}/')
+        
+        self.assertEqual(operations['rollup_auth_failures'][0]._doc['$inc'], {'count': 3})
+        
+        durations = operations['rollup_request_durations'][0]._doc
+        self.assertEqual(durations['$inc']['count'], 3)
+        self.assertEqual(durations['$inc']['buckets.5'], 2)
+        self.assertEqual(durations['$max'], {'max_duration': 7.0})
+        self.assertEqual(percentile_from_buckets({'5': 2, '7': 1}, 50), 3.0)
+        self.assertEqual(percentile_from_buckets({'5': 2, '7': 1}, 99), 10.0)
+        
+        hourly = {operation._filter['_id']: operation._doc['$inc'] for operation in operations['rollup_hourly_events']}
+        self.assertEqual(hourly['auth_events|login_failed|2026-01-01T10:00:00'], {'count': 3, 'failures': 3})
+    
+    def test_failed_flush_keeps_increments(self):
+        """Test : MongoDB indisponible, incréments conservés et fusionnés au lot suivant"""
+        self.rollups.record('errors', [self.error('boom', 10)])
+        with patch('my_frais.log_rollups.mongodb_service.upsert_many', return_value=False):
+            self.assertFalse(self.rollups.flush())
+        self.rollups.record('errors', [self.error('boom', 10)])
+        
+        with patch('my_frais.log_rollups.mongodb_service.upsert_many', return_value=True) as upsert_many:
+            self.rollups.flush()
+        operations = {call.args[0]: call.args[1] for call in upsert_many.call_args_list}
+        self.assertEqual(operations['rollup_error_fingerprints'][0]._doc['$inc'], {'count': 2})
+
+
+class ErrorDeduplicationTestCase(TestCase):
+    """Tests pour le regroupement des erreurs par empreinte"""
+    
+    SINKS = {
+        'SINKS': {'memory': {'BACKEND': 'my_frais.log_sinks.RingBufferLogSink'}},
+        'ROUTES': {'default': ['memory']},
+    }
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        error_deduplicator.reset()
+    
+    def raise_and_log(self, account_id):
+        try:
+            raise KeyError(f'compte {account_id}')
+        except KeyError as e:
+            app_logger.log_error(e)
+    
+    def test_fingerprint_ignores_values_and_line_numbers(self):
+        """Test : même empreinte pour la même pile, différente pour un autre type ou une autre pile"""
+        errors = []
+        for account_id in (1, 2):
+            try:
+                raise KeyError(f'compte {account_id}')
+            except KeyError as e:
+                errors.append(e)
+        try:
+            raise ValueError('compte 1')
+        except ValueError as e:
+            errors.append(e)
+        
+        fingerprints = [exception_fingerprint(error) for error in errors]
+        self.assertEqual(fingerprints[0], fingerprints[1])
+        self.assertNotEqual(fingerprints[0], fingerprints[2])
+        self.assertEqual(exception_fingerprint(KeyError('compte 3')), exception_fingerprint(KeyError('compte 4')))
+    
+    def test_occurrences_within_window_are_only_counted(self):
+        """Test : premier log complet, suivants comptés, log complet suivant après la fenêtre"""
+        with override_settings(LOG_SINKS=self.SINKS, LOG_WRITER_SETTINGS={'ASYNC': False},
+                               ERROR_LOG_SETTINGS={'DEDUP_WINDOW': 0.2}), \
+                patch('my_frais.logging_service.log_rollups.record') as record:
+            for account_id in range(3):
+                self.raise_and_log(account_id)
+            memory = log_router.get_sink('memory')
+            self.assertEqual(len(memory.find('errors')), 1)
+            self.assertIn('raise KeyError', memory.find('errors')[0]['error_traceback'])
+            self.assertEqual(record.call_count, 2)
+            
+            time.sleep(0.25)
+            self.raise_and_log(3)
+            latest = memory.find('errors')
+            self.assertEqual(len(latest), 2)
+            self.assertEqual(latest[0]['suppressed_occurrences'], 2)
+            self.assertEqual(latest[0]['fingerprint'], latest[1]['fingerprint'])
+
+
+class CompactLogSchemaTestCase(TestCase):
+    """Tests pour le schéma compact des logs et sa lecture par l'admin"""
+    
+    SINKS = {
+        'SINKS': {'memory': {'BACKEND': 'my_frais.log_sinks.RingBufferLogSink'}},
+        'ROUTES': {'default': ['memory']},
+    }
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        user_agent_table.reset()
+    
+    def test_crud_event_stores_references_and_truncated_diff(self):
+        """Test : utilisateur et user agent par référence, différences tronquées au lieu des données complètes"""
+        request = APIRequestFactory().put('/api/v1/operations/1/', HTTP_USER_AGENT='Mozilla/5.0 (Test)')
+        with override_settings(LOG_SINKS=self.SINKS, LOG_WRITER_SETTINGS={'ASYNC': False}), \
+                patch('my_frais.log_schema.log_rollups.upsert') as upsert:
+            for description in ('b' * 500, 'c'):
+                app_logger.log_crud_event(
+                    'update', 'Operation', object_id=1, user=self.user, request=request,
+                    old_data={'montant': Decimal('10.00'), 'description': 'a'},
+                    new_data={'montant': '10.00', 'description': description},
+                )
+            log = log_router.get_sink('memory').find('crud_events')[-1]
+        
+        self.assertEqual(log['schema_version'], 2)
+        self.assertEqual(log['user_info'], {'user_id': self.user.id})
+        self.assertNotIn('old_data', log)
+        self.assertEqual(list(log['changes']), ['description'])
+        self.assertEqual(len(log['changes']['description'][1]), 257)
+        self.assertNotIn('user_agent', log['request_info'])
+        self.assertEqual(log['request_info']['ua'], UserAgentTable.fingerprint('Mozilla/5.0 (Test)'))
+        upsert.assert_called_once()
+    
+    @override_settings(LOG_ROLLUP_SETTINGS={'MAX_PENDING_KEYS': 3})
+    def test_user_agent_kept_through_pending_overflow(self):
+        """Test : MongoDB indisponible, le débordement des agrégats n'abandonne pas un user agent déjà interné"""
+        rollups = LogRollups()
+        table = UserAgentTable()
+        with patch('my_frais.log_schema.log_rollups', rollups), \
+                patch('my_frais.log_rollups.mongodb_service.upsert_many', return_value=False) as upsert_many:
+            key = table.intern('Mozilla/5.0 (Test)')
+            rollups.record('errors', [{'event_type': 'error', 'error_type': f'E{index}'} for index in range(5)])
+            self.assertFalse(rollups.flush())
+            
+            self.assertGreater(rollups.counters['dropped'], 0)
+            self.assertIn(('log_user_agents', key), rollups._pending)
+            
+            upsert_many.reset_mock()
+            upsert_many.return_value = True
+            self.assertTrue(rollups.flush())
+        self.assertIn('log_user_agents', [call.args[0] for call in upsert_many.call_args_list])
+    
+    def test_admin_reads_both_schema_versions(self):
+        """Test : affichage identique des deux versions, noms résolus en une requête"""
+        logs = [
+            {'schema_version': 2, 'user_info': {'user_id': self.user.id}, 'changes': {'description': ['a', 'b']}},
+            {'user_info': {'user_id': self.user.id, 'username': 'testuser'}, 'old_data': {'description': 'a'}},
+            {'schema_version': 2, 'user_info': {'user_id': None}},
+        ]
+        with self.assertNumQueries(1):
+            formatted = MongoDBLogService.format_logs(logs)
+        
+        self.assertEqual(formatted[0]['user_display'], formatted[1]['user_display'])
+        self.assertEqual(formatted[0]['user_display'], f'testuser (ID: {self.user.id})')
+        self.assertTrue(formatted[2]['user_display'].startswith('anonymous'))
+
+
+class RequestMetricsTestCase(APITestCase):
+    """Tests pour les histogrammes de durée des requêtes et l'endpoint /metrics"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        request_metrics._reset()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        Account.objects.create(user=self.user, nom="Compte Test", solde=Decimal('100.00'), created_by=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_tokens(self.user)[0]}')
+    
+    def test_requests_are_measured_per_route(self):
+        """Test : durée, statut, route résolue et requêtes SQL de chaque requête"""
+        for _ in range(2):
+            self.client.get(reverse('account-list'))
+        
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        labels = 'route="account-list",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', body)
+        queries = re.search(rf'django_db_queries_total{{{labels}}} (\d+)', body)
+        self.assertGreater(int(queries.group(1)), 0)
+        self.assertIn('log_writer_queue_depth{pid=', body)
+        
+        self.client.credentials()
+        with override_settings(METRICS_SETTINGS={'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+    
+    def test_workers_are_aggregated_from_directory(self):
+        """Test : compteurs des autres workers (fichiers) additionnés, jauges des workers arrêtés ignorées"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        other_worker = {
+            'pid': 2 ** 22 + 1,
+            'series': [{'route': 'account-list', 'method': 'GET', 'status': '200',
+                        'buckets': [0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1], 'sum': 0.08, 'count': 1, 'db_queries': 3}],
+            'counters': {'log_writer_events_total': {'written': 5}},
+            'gauges': {'log_writer_queue_depth': 7},
+        }
+        # Worker arrêté, et ancien worker dont le pid est réutilisé par le processus courant
+        for name in (f"metrics-{other_worker['pid']}-a1.json", f'metrics-{os.getpid()}-b2.json'):
+            with open(os.path.join(directory.name, name), 'w') as snapshot_file:
+                json.dump(other_worker, snapshot_file)
+        
+        labels = 'route="account-list",method="GET",status="200"'
+        with override_settings(METRICS_SETTINGS={'DIRECTORY': directory.name}):
+            self.client.get(reverse('account-list'))
+            body = self.client.get('/metrics').content.decode()
+            self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 3', body)
+            
+            # Fichier du worker arrêté fusionné dans les totaux, compté une seule fois
+            names = sorted(os.listdir(directory.name))
+            self.assertNotIn(f"metrics-{other_worker['pid']}-a1.json", names)
+            self.assertIn('metrics-retired.json', names)
+            self.assertIn(f'metrics-{os.getpid()}-b2.json', names)
+            body = self.client.get('/metrics').content.decode()
+        
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 3', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{labels},le="0.1"}}', body)
+        self.assertNotIn(f'pid="{other_worker["pid"]}"', body)
+        self.assertEqual(len([name for name in names if name.startswith(f'metrics-{os.getpid()}-')]), 2)
+
+
+class QueryProfilerTestCase(APITestCase):
+    """Tests pour le profilage SQL par requête et la détection des N+1"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        get_bucket_backend().reset()
+        self.user = User.objects.create_user(username='staff', email='staff@example.com',
+                                             password='testpass123', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {generate_tokens(self.user)[0]}')
+    
+    def create_incomes(self, count):
+        for index in range(count):
+            account = Account.objects.create(user=self.user, nom=f"Compte {index}", solde=Decimal('0.00'),
+                                             created_by=self.user)
+            RecurringIncome.objects.create(
+                compte_reference=account, montant=Decimal('100.00'), description=f"Revenu {index}",
+                date_premier_versement=date.today(), frequence='Hebdomadaire',
+                type_revenu='Salaire', created_by=self.user
+            )
+    
+    def test_sql_template(self):
+        """Test : valeurs littérales et listes IN retirées du gabarit"""
+        sql = 'SELECT "t"."id" FROM "t1" WHERE "t"."id" = 12 AND "t"."nom" = \'x\' AND "t"."pk" IN (%s, %s, %s)'
+        self.assertEqual(sql_template(sql), 'SELECT "t"."id" FROM "t1" WHERE "t"."id" = ? AND "t"."nom" = ? AND "t"."pk" IN (...)')
+    
+    def test_repeated_template_is_flagged_with_origin(self):
+        """Test : gabarit répété signalé comme N+1, avec la ligne du code qui l'exécute"""
+        self.create_incomes(6)
+        profiler = QueryProfiler()
+        with connection.execute_wrapper(profiler):
+            for income in RecurringIncome.objects.all():
+                income.compte_reference.nom
+        
+        summary = profiler.summary()
+        self.assertEqual(summary['count'], 7)
+        self.assertEqual(summary['n_plus_one'][0]['count'], 6)
+        self.assertIn('my_frais/tests.py', summary['n_plus_one'][0]['origin'])
+        self.assertIn('X-Query-N-Plus-One', profiler.headers())
+    
+    def test_staff_header_adds_summary_to_response(self):
+        """Test : en-têtes pour le staff qui le demande seulement ; upcoming sans N+1"""
+        self.create_incomes(6)
+        url = reverse('recurring-income-upcoming')
+        
+        response = self.client.get(url, HTTP_X_PROFILE_QUERIES='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 6)
+        self.assertLess(int(response['X-Query-Count']), 6)
+        self.assertIn('Server-Timing', response)
+        self.assertNotIn('X-Query-N-Plus-One', response)
+        
+        self.assertNotIn('X-Query-Count', self.client.get(url))
+        
+        self.user.is_staff = False
+        self.user.save()
+        self.assertNotIn('X-Query-Count', self.client.get(url, HTTP_X_PROFILE_QUERIES='1'))
+
+
+class LogSpoolTestCase(TestCase):
+    """Tests pour le spool local des logs"""
+    
+    def setUp(self):
+        """Configuration initiale pour chaque test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.spool = LogSpool()
+    
+    def test_replay_is_idempotent(self):
+        """Test du rejeu : ids fixés au spool, segment rendu en cas d'échec puis rejoué sans doublon"""
+        stored = {}
+        
+        def insert(collection, documents):
+            for document in documents:
+                stored[document['_id']] = (collection, document)
+            return None if failing else []
+        
+        with override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': self.directory, 'FSYNC_EVERY': 1}):
+            timestamp = datetime.utcnow()
+            self.spool.append('errors', [{'index': 0, 'timestamp': timestamp}])
+            self.spool.append('crud_events', [{'index': 1}])
+            
+            failing = True
+            self.assertEqual(self.spool.replay_once(insert), 0)
+            self.assertEqual(len(self.spool.find('errors')), 1)
+            
+            failing = False
+            self.assertEqual(self.spool.replay_once(insert), 2)
+            self.assertEqual(self.spool.stats()['segments'], 0)
+        
+        self.assertEqual(len(stored), 2)
+        errors = [document for collection, document in stored.values() if collection == 'errors']
+        self.assertEqual(errors[0]['timestamp'], timestamp)
+    
+    def test_rejected_document_does_not_block_replay(self):
+        """Test : un log refusé définitivement part en dead-letter, le reste du spool est rejoué"""
+        stored = []
+        
+        def insert_many(documents, ordered):
+            if any(document.get('too_large') for document in documents):
+                raise DocumentTooLarge('BSON document too large')
+            stored.extend(documents)
+            return MagicMock(inserted_ids=[document['_id'] for document in documents])
+        
+        service = MongoDBService()
+        service.db = MagicMock()
+        service.db['errors'].insert_many.side_effect = insert_many
+        with override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': self.directory, 'SEGMENT_MAX_BYTES': 1}):
+            self.spool.append('errors', [{'index': 0}, {'index': 1, 'too_large': True}, {'index': 2}])
+            self.spool.append('errors', [{'index': 3}])
+            
+            self.assertEqual(self.spool.replay_once(service.replay_logs), 3)
+            stats = self.spool.stats()
+        
+        self.assertEqual(sorted(document['index'] for document in stored), [0, 2, 3])
+        self.assertEqual((stats['segments'], stats['dead_lettered'], stats['dead_letter_files']), (0, 1, 1))
+        self.assertEqual(service.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_find_page_reads_newest_segments_only(self):
+        """Test : bornes de page, projection et lecture arrêtée aux segments utiles"""
+        start = datetime(2026, 1, 1)
+        with override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': self.directory, 'SEGMENT_MAX_BYTES': 1}):
+            for index in range(6):
+                timestamp = start + timedelta(hours=index)
+                self.spool.append('errors', [{'index': index, 'timestamp': timestamp, 'error_traceback': 'x' * 100}])
+                # Dernière écriture du segment à l'heure de son log
+                path = self.spool._segment_paths('seg-*.jsonl')[-1]
+                epoch = (timestamp - datetime(1970, 1, 1)).total_seconds()
+                os.utime(path, (epoch, epoch))
+            
+            read = []
+            read_segment = LogSpool._read_segment
+            with patch.object(LogSpool, '_read_segment', side_effect=lambda path: read.append(path) or read_segment(path)):
+                page = self.spool.find('errors', limit=2, projection={'index': 1, 'timestamp': 1})
+            self.assertEqual([log['index'] for log in page], [5, 4])
+            self.assertNotIn('error_traceback', page[0])
+            self.assertTrue(page[0]['spooled'])
+            self.assertEqual(len(read), 2)
+            
+            older = self.spool.find('errors', limit=2, after=(page[-1]['timestamp'], page[-1]['_id']))
+            self.assertEqual([log['index'] for log in older], [3, 2])
+            newer = self.spool.find('errors', limit=2, before=(older[0]['timestamp'], older[0]['_id']))
+            self.assertEqual([log['index'] for log in newer], [5, 4])
+    
+    def test_quota_and_filters(self):
+        """Test du quota disque et des filtres de consultation"""
+        with override_settings(LOG_SPOOL_SETTINGS={'DIRECTORY': self.directory, 'QUOTA_BYTES': 400}):
+            for user_id in range(10):
+                self.spool.append('auth_events', [{'user_info': {'user_id': user_id}}])
+            kept = self.spool.stats()
+            
+            self.assertGreater(kept['dropped_quota'], 0)
+            self.assertLessEqual(kept['size_bytes'], 400)
+            self.assertEqual(len(self.spool.find('auth_events', {'user_info.user_id': 0})), 1)
+            self.assertEqual(self.spool.find('auth_events', {'user_info.user_id': {'$gte': 100}}), [])
@@ -0,0 +1,193 @@
+"""
+Limitation de débit par seau à jetons (token bucket) pour les endpoints coûteux.
+
+Chaque classe d'endpoint (scope) a son seau par client : adresse IP, utilisateur,
+ou les deux, selon RATE_LIMIT_SETTINGS['RATES'][scope]. Un seau contient au plus
+`capacity` jetons et se remplit de `per_minute` jetons par minute ; une requête
+consomme un jeton, sinon réponse 429 avec l'en-tête Retry-After.
+
+Le stockage des seaux est interchangeable (RATE_LIMIT_SETTINGS['BACKEND']) :
+- InProcessBucketBackend : mémoire du worker (défaut, sans I/O, limite par worker)
+- CacheBucketBackend : cache Django partagé entre workers (Redis, Memcached, base...)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+DEFAULT_RATE_LIMIT_SETTINGS = {
+    'ENABLED': True,
+    'BACKEND': 'my_frais.throttling.InProcessBucketBackend',
+    'CACHE_ALIAS': 'default',
+    'MAX_BUCKETS': 10000,
+    # Proxies de confiance devant l'application : 0 = REMOTE_ADDR seul, X-Forwarded-For ignoré
+    'NUM_PROXIES': 0,
+    'RATES': {},
+}
+
+
+def rate_limit_setting(name):
+    return getattr(settings, 'RATE_LIMIT_SETTINGS', {}).get(name, DEFAULT_RATE_LIMIT_SETTINGS[name])
+
+
+class BucketBackend:
+    """Stockage des seaux : `consume` retourne 0 si un jeton a été pris, sinon l'attente en secondes"""
+
+    @staticmethod
+    def _take(tokens, updated_at, now, capacity, refill_rate):
+        """Applique le remplissage puis tente de prendre un jeton : (jetons, attente)"""
+        tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+        if tokens >= 1:
+            return tokens - 1, 0
+        return tokens, (1 - tokens) / refill_rate
+
+    def consume(self, key, capacity, refill_rate):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+
+class InProcessBucketBackend(BucketBackend):
+    """Seaux en mémoire du worker (LRU borné à MAX_BUCKETS)"""
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens, wait = self._take(tokens, updated_at, now, capacity, refill_rate)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > rate_limit_setting('MAX_BUCKETS'):
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketBackend(BucketBackend):
+    """
+    Seaux dans le cache Django (CACHE_ALIAS), partagés entre workers et serveurs.
+    La lecture-écriture n'est pas atomique : sous forte concurrence, quelques
+    requêtes de plus que la capacité peuvent passer, sans jamais bloquer à tort.
+    """
+
+    GENERATION_KEY = 'ratelimit:generation'
+
+    def consume(self, key, capacity, refill_rate):
+        cache = caches[rate_limit_setting('CACHE_ALIAS')]
+        cache_key = f'ratelimit:{key}'
+        now = time.time()
+        # Seau et génération lus en un seul aller-retour ; un seau d'une génération antérieure
+        # (avant reset) compte comme plein
+        values = cache.get_many([cache_key, self.GENERATION_KEY])
+        generation = values.get(self.GENERATION_KEY, 0)
+        tokens, updated_at, bucket_generation = values.get(cache_key, (capacity, now, generation))
+        if bucket_generation != generation:
+            tokens, updated_at = capacity, now
+        tokens, wait = self._take(tokens, updated_at, now, capacity, refill_rate)
+        # Un seau plein est équivalent à une absence d'entrée
+        cache.set(cache_key, (tokens, now, generation), timeout=int((capacity - tokens) / refill_rate) + 1)
+        return wait
+
+    def reset(self):
+        """Remplit tous les seaux (de tous les workers) en changeant de génération"""
+        cache = caches[rate_limit_setting('CACHE_ALIAS')]
+        cache.set(self.GENERATION_KEY, cache.get(self.GENERATION_KEY, 0) + 1, timeout=None)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_bucket_backend():
+    """Instance (unique par processus) du backend configuré"""
+    global _backend
+    path = rate_limit_setting('BACKEND')
+    if _backend is None or _backend[0] != path:
+        with _backend_lock:
+            if _backend is None or _backend[0] != path:
+                _backend = (path, import_string(path)())
+    return _backend[1]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle DRF par seau à jetons. Les sous-classes définissent `scope`, dont la
+    configuration est lue dans RATE_LIMIT_SETTINGS['RATES'] :
+    {'capacity': 10, 'per_minute': 5, 'key': 'ip' | 'user' | 'user_ip'}
+    """
+    scope = None
+
+    def get_rate(self):
+        return rate_limit_setting('RATES').get(self.scope)
+
+    def get_ident(self, request):
+        """
+        Adresse IP du client. X-Forwarded-For n'est lu qu'avec NUM_PROXIES > 0, et seulement
+        l'adresse ajoutée par le premier proxy de confiance : les entrées plus à gauche sont
+        fournies par le client et changeraient de seau à chaque requête.
+        """
+        remote_addr = request.META.get('REMOTE_ADDR')
+        num_proxies = rate_limit_setting('NUM_PROXIES')
+        xff = request.META.get('HTTP_X_FORWARDED_FOR')
+        if not num_proxies or not xff:
+            return remote_addr
+        addresses = [address.strip() for address in xff.split(',')]
+        return addresses[-min(num_proxies, len(addresses))] or remote_addr
+
+    def get_client_key(self, request, key_type):
+        """Identifiant du client ; les anonymes sont toujours identifiés par IP"""
+        ident = self.get_ident(request)
+        user = getattr(request, 'user', None)
+        if key_type == 'ip' or not (user and user.is_authenticated):
+            return f'ip:{ident}'
+        if key_type == 'user':
+            return f'user:{user.pk}'
+        return f'user:{user.pk}:ip:{ident}'
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        rate = self.get_rate()
+        if not rate or not rate_limit_setting('ENABLED'):
+            return True
+
+        capacity = rate.get('capacity', 1)
+        refill_rate = rate.get('per_minute', 60) / 60
+        key = f"{self.scope}:{self.get_client_key(request, rate.get('key', 'ip'))}"
+        wait = get_bucket_backend().consume(key, capacity, refill_rate)
+        if wait:
+            self.wait_seconds = wait
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class RegisterRateThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class ProjectionComputeRateThrottle(TokenBucketThrottle):
+    """calculate et compare_scenarios"""
+    scope = 'projection_compute'
+
+
+class DashboardRateThrottle(TokenBucketThrottle):
+    scope = 'dashboard'
@@ -1,7 +1,7 @@
 from rest_framework.routers import DefaultRouter
 from my_frais.viewsets import (
     AccountViewSet, OperationViewSet, DirectDebitViewSet, 
-    RecurringIncomeViewSet, BudgetProjectionViewSet, AutomatedTaskViewSet
+    RecurringIncomeViewSet, BudgetProjectionViewSet, AutomatedTaskViewSet, SyncViewSet
 )
 
 # Création du router global pour l'application my_frais
@@ -14,6 +14,7 @@ router.register(r'direct-debits', DirectDebitViewSet, basename='direct-debit')
 router.register(r'recurring-incomes', RecurringIncomeViewSet, basename='recurring-income')
 router.register(r'budget-projections', BudgetProjectionViewSet, basename='budget-projection')
 router.register(r'automated-tasks', AutomatedTaskViewSet, basename='automated-task')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 # URLs de l'application
 urlpatterns = router.urls 
\ No newline at end of file
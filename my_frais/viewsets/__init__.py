@@ -4,6 +4,7 @@ from .direct_debit_viewset import DirectDebitViewSet
 from .recurring_income_viewset import RecurringIncomeViewSet
 from .budget_projection_viewset import BudgetProjectionViewSet
 from .automated_task_viewset import AutomatedTaskViewSet
+from .sync_viewset import SyncViewSet
 
 __all__ = [
     'AccountViewSet',
@@ -11,7 +12,8 @@ __all__ = [
     'DirectDebitViewSet',
     'RecurringIncomeViewSet',
     'BudgetProjectionViewSet',
-    'AutomatedTaskViewSet'
+    'AutomatedTaskViewSet',
+    'SyncViewSet'
 ]
 
 # Viewsets pour l'application my_frais 
\ No newline at end of file
@@ -3,15 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, Max, Q
 from datetime import datetime, timedelta
 from decimal import Decimal
 
 from my_frais.models import Account
 from my_frais.serializers.account_serializer import AccountSerializer, AccountListSerializer
+from my_frais.services import OperationRollupService, BalanceSnapshotService
+from my_frais.viewsets.mixins import ConditionalGetMixin
 
 
-class AccountViewSet(viewsets.ModelViewSet):
+class AccountViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des comptes bancaires.
     
@@ -26,6 +28,15 @@ class AccountViewSet(viewsets.ModelViewSet):
     search_fields = ['user__username', 'user__email']
     ordering_fields = ['solde', 'created_at', 'updated_at']
     ordering = ['-created_at']
+    # La liste affiche le solde et les compteurs, mis à jour sans toucher updated_at
+    list_validator_aggregates = {
+        'last_updated': Max('updated_at'),
+        'count': Count('pk'),
+        'solde': Sum('solde'),
+        'operations': Sum('operations_count'),
+        'last_operation': Max('last_operation_at'),
+    }
+    object_validator_fields = ('updated_at', 'solde')
     
     def get_queryset(self):
         """Filtrer les comptes selon l'utilisateur connecté avec optimisation"""
@@ -94,17 +105,11 @@ class AccountViewSet(viewsets.ModelViewSet):
         """Obtenir les statistiques d'un compte"""
         account = self.get_object()
         
-        # Statistiques des opérations
-        operations = account.operations.all()
-        total_operations = operations.count()
-        total_montant = operations.aggregate(total=Sum('montant'))['total'] or 0
-        
-        # Statistiques par période
+        # Statistiques des opérations (lues depuis les agrégats journaliers)
         today = datetime.now().date()
         month_ago = today - timedelta(days=30)
         
-        operations_month = operations.filter(created_at__date__gte=month_ago)
-        montant_month = operations_month.aggregate(total=Sum('montant'))['total'] or 0
+        stats = OperationRollupService.summarize(account.daily_rollups.all(), {'month': month_ago})
         
         # Prélèvements automatiques  
         direct_debits = account.operations.filter(directdebit__actif=True, directdebit__isnull=False)
@@ -116,15 +121,65 @@ class AccountViewSet(viewsets.ModelViewSet):
             'account_username': account.user.username,
             'solde_actuel': float(account.solde),
             'statistics': {
-                'total_operations': total_operations,
-                'total_montant_operations': float(total_montant),
-                'operations_30_jours': operations_month.count(),
-                'montant_30_jours': float(montant_month),
+                'total_operations': stats['total']['count'],
+                'total_montant_operations': float(stats['total']['montant_total']),
+                'operations_30_jours': stats['month']['count'],
+                'montant_30_jours': float(stats['month']['montant_total']),
                 'prélèvements_actifs': total_direct_debits,
                 'montant_prélèvements': float(montant_direct_debits)
             }
         })
     
+    @action(detail=True, methods=['get'])
+    def balance_history(self, request, pk=None):
+        """
+        Historique du solde d'un compte depuis les soldes journaliers.
+        
+        `date=YYYY-MM-DD` : solde de fin de journée à cette date.
+        `start`/`end` (défaut : 30 derniers jours) : série de soldes, sous-échantillonnée
+        à `points` valeurs (LTTB) si demandé.
+        """
+        account = self.get_object()
+        
+        try:
+            if request.query_params.get('date'):
+                target_date = datetime.strptime(request.query_params['date'], '%Y-%m-%d').date()
+                return Response({
+                    'account_id': account.id,
+                    'date': target_date.isoformat(),
+                    'solde': float(BalanceSnapshotService.balance_on(account, target_date))
+                })
+            
+            today = datetime.now().date()
+            end = datetime.strptime(request.query_params['end'], '%Y-%m-%d').date() if request.query_params.get('end') else today
+            start = datetime.strptime(request.query_params['start'], '%Y-%m-%d').date() if request.query_params.get('start') else end - timedelta(days=30)
+        except ValueError:
+            return Response(
+                {'error': 'Format de date invalide. Utilisez YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if start > end:
+            return Response(
+                {'error': 'La date de début doit précéder la date de fin'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        points = request.query_params.get('points')
+        try:
+            points = int(points) if points else None
+        except (ValueError, TypeError):
+            points = None
+        
+        series = BalanceSnapshotService.history(account, start, end, points)
+        return Response({
+            'account_id': account.id,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'points': len(series),
+            'history': [{'date': point['date'].isoformat(), 'solde': point['solde']} for point in series]
+        })
+    
     @action(detail=True, methods=['post'])
     def adjust_balance(self, request, pk=None):
         """Ajuster manuellement le solde d'un compte"""
@@ -169,6 +224,11 @@ class AccountViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Résumé de tous les comptes de l'utilisateur"""
+        etag, last_modified = self.get_list_validator()
+        not_modified = self.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        
         accounts = self.get_queryset()
         
         total_solde = accounts.aggregate(total=Sum('solde'))['total'] or 0
@@ -181,109 +241,95 @@ class AccountViewSet(viewsets.ModelViewSet):
         # Détails des comptes
         comptes_details = []
         for compte in accounts:
-            operations_count = compte.operations.count()
             comptes_details.append({
                 'id': compte.id,
                 'nom': compte.nom,
                 'solde': float(compte.solde),
-                'operations_count': operations_count
+                'operations_count': compte.operations_count
             })
         
-        return Response({
+        return self.set_validators(Response({
             'total_comptes': total_comptes,
             'total_solde': float(total_solde),
             'comptes_positifs': comptes_positifs,
             'comptes_negatifs': comptes_negatifs,
             'comptes': comptes_details
-        })
+        }), etag, last_modified)
 
     @action(detail=False, methods=['get'])
     def global_overview(self, request):
-        """Vue d'ensemble complète des comptes pour dashboard"""
-        accounts = self.get_queryset()
+        """
+        Vue d'ensemble complète des comptes pour dashboard.
         
-        # Statistiques de base
-        total_solde = accounts.aggregate(total=Sum('solde'))['total'] or Decimal('0.00')
-        total_comptes = accounts.count()
-        comptes_negatifs = accounts.filter(solde__lt=0)
-        comptes_positifs = accounts.filter(solde__gte=0)
+        Nombre de requêtes constant : les comptes (avec leurs compteurs) en une requête,
+        puis un agrégat conditionnel pour les opérations et un pour les prélèvements.
+        Le validateur (ETag) ajoute trois agrégats légers et évite tout le reste en cas de 304.
+        """
+        # Revenus actifs lus dans les compteurs des comptes, déjà couverts par le validateur
+        etag = self.get_dashboard_validator(request, include_incomes=False)
+        not_modified = self.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        # Calculs détaillés par compte
-        comptes_details = []
-        total_operations = 0
-        derniere_activite_globale = None
+        user = request.user
+        today = datetime.now().date()
+        week_ago = today - timedelta(days=7)
+        month_ago = today - timedelta(days=30)
+        date_limite = today + timedelta(days=7)
         
+        # Comptes et compteurs dénormalisés (une requête), totaux calculés en mémoire
+        accounts = list(self.get_queryset().order_by('-created_at').values(
+            'id', 'nom', 'solde', 'operations_count', 'last_operation_at', 'active_incomes_count'
+        ))
+        total_solde = sum((compte['solde'] for compte in accounts), Decimal('0.00'))
+        total_comptes = len(accounts)
+        comptes_negatifs = sum(1 for compte in accounts if compte['solde'] < 0)
+        comptes_positifs = total_comptes - comptes_negatifs
+        revenus_actifs = sum(compte['active_incomes_count'] for compte in accounts)
+        
+        comptes_details = []
         for compte in accounts:
-            compte_operations = compte.operations.all()
-            operations_count = compte_operations.count()
-            total_operations += operations_count
-            
-            derniere_operation = compte_operations.order_by('-created_at').first()
-            if derniere_operation:
-                if derniere_activite_globale is None or derniere_operation.created_at > derniere_activite_globale:
-                    derniere_activite_globale = derniere_operation.created_at
-            
+            derniere_activite = compte['last_operation_at']
             comptes_details.append({
-                'id': compte.id,
-                'nom': compte.nom,
-                'solde': float(compte.solde),
-                'nombre_operations': operations_count,
-                'derniere_activite': derniere_operation.created_at.isoformat() if derniere_operation else None,
-                'status': 'positif' if compte.solde >= 0 else 'negatif'
+                'id': compte['id'],
+                'nom': compte['nom'],
+                'solde': float(compte['solde']),
+                'nombre_operations': compte['operations_count'],
+                'derniere_activite': derniere_activite.isoformat() if derniere_activite else None,
+                'status': 'positif' if compte['solde'] >= 0 else 'negatif'
             })
         
-        # Statistiques d'activité récente
-        today = datetime.now().date()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
+        # Activité récente (un agrégat conditionnel sur les agrégats journaliers)
+        rollups = OperationRollupService.get_rollups_for_user(user)
+        stats = OperationRollupService.summarize(rollups, {'week': week_ago, 'month': month_ago})
+        operations_7_jours = stats['week']['count']
+        operations_30_jours = stats['month']['count']
         
-        from my_frais.models import Operation
-        user = request.user
-        if user.is_staff:
-            operations_7_jours = Operation.objects.filter(created_at__date__gte=week_ago).count()
-            operations_30_jours = Operation.objects.filter(created_at__date__gte=month_ago).count()
-        else:
-            operations_7_jours = Operation.objects.filter(compte_reference__user=user, created_at__date__gte=week_ago).count()
-            operations_30_jours = Operation.objects.filter(compte_reference__user=user, created_at__date__gte=month_ago).count()
-        
-        # Prélèvements et revenus actifs
-        from my_frais.models import DirectDebit, RecurringIncome
-        if user.is_staff:
-            prelevements_actifs = DirectDebit.objects.filter(actif=True).count()
-            revenus_actifs = RecurringIncome.objects.filter(actif=True).count()
-        else:
-            prelevements_actifs = DirectDebit.objects.filter(compte_reference__user=user, actif=True).count()
-            revenus_actifs = RecurringIncome.objects.filter(compte_reference__user=user, actif=True).count()
+        # Prélèvements actifs et imminents (dans les 7 prochains jours), un agrégat conditionnel
+        from my_frais.models import DirectDebit
+        debits = DirectDebit.objects.filter(actif=True)
+        if not user.is_staff:
+            debits = debits.filter(compte_reference__user=user)
+        prelevements = debits.aggregate(
+            actifs=Count('pk'),
+            imminents=Count('pk', filter=Q(date_prelevement__lte=date_limite))
+        )
+        prelevements_actifs = prelevements['actifs']
+        prelevements_imminents = prelevements['imminents']
         
         # Alertes
         alertes = []
-        if comptes_negatifs.count() > 0:
-            alertes.append(f"{comptes_negatifs.count()} compte(s) en déficit")
-        
-        # Prélèvements imminents (dans les 7 prochains jours)
-        date_limite = today + timedelta(days=7)
-        prelevements_imminents = 0
-        if user.is_staff:
-            prelevements_imminents = DirectDebit.objects.filter(
-                actif=True, 
-                date_prelevement__lte=date_limite
-            ).count()
-        else:
-            prelevements_imminents = DirectDebit.objects.filter(
-                compte_reference__user=user,
-                actif=True, 
-                date_prelevement__lte=date_limite
-            ).count()
-        
+        if comptes_negatifs > 0:
+            alertes.append(f"{comptes_negatifs} compte(s) en déficit")
         if prelevements_imminents > 0:
             alertes.append(f"{prelevements_imminents} prélèvement(s) dans les 7 prochains jours")
         
-        return Response({
+        return self.set_validators(Response({
             'summary': {
                 'total_comptes': total_comptes,
                 'total_solde': float(total_solde),
-                'comptes_positifs': comptes_positifs.count(),
-                'comptes_negatifs': comptes_negatifs.count()
+                'comptes_positifs': comptes_positifs,
+                'comptes_negatifs': comptes_negatifs
             },
             'recent_activity': {
                 'operations_7_jours': operations_7_jours,
@@ -292,9 +338,9 @@ class AccountViewSet(viewsets.ModelViewSet):
                 'revenus_actifs': revenus_actifs
             },
             'alerts': {
-                'comptes_negatifs': comptes_negatifs.count(),
+                'comptes_negatifs': comptes_negatifs,
                 'prélèvements_imminents': prelevements_imminents,
                 'messages': alertes
             },
             'comptes': comptes_details
-        }) 
\ No newline at end of file
+        }), etag)
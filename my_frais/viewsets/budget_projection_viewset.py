@@ -11,9 +11,12 @@ from my_frais.models import BudgetProjection, Account, DirectDebit, RecurringInc
 from my_frais.serializers.budget_projection_serializer import (
     BudgetProjectionSerializer, BudgetProjectionCalculatorSerializer, BudgetSummarySerializer
 )
+from my_frais.services import OperationRollupService
+from my_frais.throttling import ProjectionComputeRateThrottle, DashboardRateThrottle
+from my_frais.viewsets.mixins import ConditionalGetMixin
 
 
-class BudgetProjectionViewSet(viewsets.ModelViewSet):
+class BudgetProjectionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des projections de budget.
     
@@ -61,7 +64,7 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
         else:
             return 'critique'
     
-    @action(detail=False, methods=['post'])
+    @action(detail=False, methods=['post'], throttle_classes=[ProjectionComputeRateThrottle])
     def calculate(self, request):
         """Calculer les projections de budget en temps réel sans les sauvegarder"""
         serializer = BudgetProjectionCalculatorSerializer(data=request.data, context={'request': request})
@@ -123,9 +126,15 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
                 'summaries': summaries
             })
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[DashboardRateThrottle])
     def dashboard(self, request):
         """Tableau de bord avec les indicateurs clés"""
+        # 304 si rien n'a changé dans le périmètre de l'utilisateur depuis le dernier appel
+        etag = self.get_dashboard_validator(request)
+        not_modified = self.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        
         user = request.user
         
         # Paramètre pour la période de projection (défaut: 3 mois)
@@ -140,12 +149,10 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
             comptes = Account.objects.select_related('user').all()
             prelevements = DirectDebit.objects.select_related('compte_reference', 'compte_reference__user').filter(actif=True)
             revenus = RecurringIncome.objects.select_related('compte_reference', 'compte_reference__user').filter(actif=True)
-            operations = Operation.objects.select_related('compte_reference', 'compte_reference__user').all()
         else:
             comptes = Account.objects.select_related('user').filter(user=user)
             prelevements = DirectDebit.objects.select_related('compte_reference', 'compte_reference__user').filter(compte_reference__user=user, actif=True)
             revenus = RecurringIncome.objects.select_related('compte_reference', 'compte_reference__user').filter(compte_reference__user=user, actif=True)
-            operations = Operation.objects.select_related('compte_reference', 'compte_reference__user').filter(compte_reference__user=user)
         
         # Calculs des totaux
         solde_total = sum(compte.solde for compte in comptes)
@@ -180,43 +187,30 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
         month_ago = today - timedelta(days=30)
         quarter_ago = today - timedelta(days=90)
         
-        operations_semaine = operations.filter(created_at__date__gte=week_ago)
-        operations_mois = operations.filter(created_at__date__gte=month_ago)
-        operations_trimestre = operations.filter(created_at__date__gte=quarter_ago)
-        
-        activite_stats = {
-            'operations_7j': {
-                'count': operations_semaine.count(),
-                'montant_total': float(operations_semaine.aggregate(total=Sum('montant'))['total'] or 0),
-                'montant_positif': float(operations_semaine.filter(montant__gt=0).aggregate(total=Sum('montant'))['total'] or 0),
-                'montant_negatif': float(operations_semaine.filter(montant__lt=0).aggregate(total=Sum('montant'))['total'] or 0)
-            },
-            'operations_30j': {
-                'count': operations_mois.count(),
-                'montant_total': float(operations_mois.aggregate(total=Sum('montant'))['total'] or 0),
-                'montant_positif': float(operations_mois.filter(montant__gt=0).aggregate(total=Sum('montant'))['total'] or 0),
-                'montant_negatif': float(operations_mois.filter(montant__lt=0).aggregate(total=Sum('montant'))['total'] or 0)
-            },
-            'operations_90j': {
-                'count': operations_trimestre.count(),
-                'montant_total': float(operations_trimestre.aggregate(total=Sum('montant'))['total'] or 0),
-                'montant_positif': float(operations_trimestre.filter(montant__gt=0).aggregate(total=Sum('montant'))['total'] or 0),
-                'montant_negatif': float(operations_trimestre.filter(montant__lt=0).aggregate(total=Sum('montant'))['total'] or 0)
+        # Agrégats journaliers : quelques lignes par compte au lieu de l'historique complet
+        rollups = OperationRollupService.get_rollups_for_user(user)
+        stats = OperationRollupService.summarize(rollups, {'7j': week_ago, '30j': month_ago, '90j': quarter_ago})
+        
+        activite_stats = {}
+        for periode in ['7j', '30j', '90j']:
+            activite_stats[f'operations_{periode}'] = {
+                'count': stats[periode]['count'],
+                'montant_total': float(stats[periode]['montant_total']),
+                'montant_positif': float(stats[periode]['montant_positif']),
+                'montant_negatif': float(stats[periode]['montant_negatif'])
             }
-        }
         
-        # Répartition des comptes
+        # Répartition des comptes (compteurs dénormalisés)
         comptes_details = []
         for compte in comptes:
-            compte_operations = operations.filter(compte_reference=compte)
-            derniere_operation = compte_operations.order_by('-created_at').first()
+            derniere_activite = compte.last_operation_at
             
             comptes_details.append({
                 'id': compte.id,
                 'nom': compte.nom,
                 'solde': float(compte.solde),
-                'nombre_operations': compte_operations.count(),
-                'derniere_activite': derniere_operation.created_at.isoformat() if derniere_operation else None,
+                'nombre_operations': compte.operations_count,
+                'derniere_activite': derniere_activite.isoformat() if derniere_activite else None,
                 'status': 'positif' if compte.solde >= 0 else 'negatif'
             })
         
@@ -298,7 +292,7 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
                 'variation': float(revenus_mensuels - prelevements_mensuels)
             })
         
-        return Response({
+        return self.set_validators(Response({
             'overview': {
                 'comptes_count': comptes.count(),
                 'solde_total': float(solde_total),
@@ -341,7 +335,7 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
                 'taux_epargne': float(solde_mensuel_estime / revenus_mensuels * 100) if revenus_mensuels > 0 else None,
                 'seuil_securite_mois': int(solde_total / prelevements_mensuels) if prelevements_mensuels > 0 else None
             }
-        })
+        }), etag)
     
     @action(detail=False, methods=['post'])
     def quick_projection(self, request):
@@ -409,7 +403,7 @@ class BudgetProjectionViewSet(viewsets.ModelViewSet):
         
         return Response(quick_data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[ProjectionComputeRateThrottle])
     def compare_scenarios(self, request):
         """Comparer différents scénarios de projection"""
         compte_id = request.query_params.get('compte_id')
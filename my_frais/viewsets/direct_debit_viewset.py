@@ -3,19 +3,22 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.utils import timezone
 from django.db.models import Sum, Count, Q
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 
-from my_frais.models import DirectDebit, Account
+from my_frais.models import DirectDebit, Account, SyncChange
 from my_frais.serializers.direct_debit_serializer import (
     DirectDebitSerializer, 
     DirectDebitListSerializer,
     DirectDebitSummarySerializer
 )
+from my_frais.viewsets.mixins import ConditionalGetMixin
 
 
-class DirectDebitViewSet(viewsets.ModelViewSet):
+class DirectDebitViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des prélèvements automatiques.
     
@@ -287,7 +290,13 @@ class DirectDebitViewSet(viewsets.ModelViewSet):
                 )
         
         # Mettre à jour le statut
-        updated_count = DirectDebit.objects.filter(id__in=prelevements_ids).update(actif=actif)
+        # update() ne déclenche pas les signaux : recalcul des compteurs des comptes concernés
+        with transaction.atomic():
+            prelevements = DirectDebit.objects.filter(id__in=prelevements_ids)
+            account_ids = list(prelevements.values_list('compte_reference_id', flat=True).distinct())
+            updated_count = prelevements.update(actif=actif, updated_at=timezone.now())
+            SyncChange.record_updated(prelevements)
+            Account.rebuild_counters(account_ids)
         
         return Response({
             'message': f'{updated_count} prélèvement(s) mis à jour',
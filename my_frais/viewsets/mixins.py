@@ -0,0 +1,136 @@
+import hashlib
+from datetime import date
+
+from django.db.models import Max, Count, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from my_frais.models import Account, DirectDebit, RecurringIncome
+from my_frais.services import OperationRollupService
+
+
+class ConditionalGetMixin:
+    """
+    Requêtes conditionnelles pour les ViewSets.
+
+    - GET liste / détail : ETag (et Last-Modified) calculés par un agrégat léger sur le
+      périmètre de l'utilisateur ; `If-None-Match` correspondant => 304 sans sérialisation.
+    - PUT / PATCH / DELETE : `If-Match` optionnel, 412 si la ressource a changé entre-temps.
+    """
+    # Agrégats décrivant l'état d'une liste : toute création, modification ou suppression les change
+    list_validator_aggregates = {
+        'last_updated': Max('updated_at'),
+        'count': Count('pk'),
+    }
+    # Champs décrivant l'état d'un objet (les champs modifiés via update() doivent y figurer)
+    object_validator_fields = ('updated_at',)
+
+    @staticmethod
+    def make_etag(*parts):
+        """ETag opaque à partir des éléments du validateur"""
+        return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+    def get_list_validator(self):
+        """Validateur (etag, last_modified) de la liste, filtres et pagination compris"""
+        values = self.get_queryset().order_by().aggregate(**self.list_validator_aggregates)
+        etag = self.make_etag(self.request.user.pk, self.request.get_full_path(), sorted(values.items()))
+        return etag, values.get('last_updated')
+
+    def get_object_validator(self):
+        """Validateur (etag, last_modified) de l'objet, (None, None) s'il n'est pas visible"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        values = self.get_queryset().filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values_list(*self.object_validator_fields).first()
+        if values is None:
+            return None, None
+        return self.make_etag(self.basename, self.kwargs[lookup_url_kwarg], values), values[0]
+
+    def conditional_response(self, request, etag, last_modified=None):
+        """Réponse 304/412 si les en-têtes conditionnels de la requête le demandent, sinon None"""
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None
+        )
+        if response is not None and response.status_code == 304:
+            response['ETag'] = etag
+        return response
+
+    @staticmethod
+    def set_validators(response, etag, last_modified=None):
+        """Ajoute ETag et Last-Modified à une réponse réussie"""
+        if etag and 200 <= response.status_code < 300:
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validator()
+        # Pas de If-Modified-Since sur les listes : une suppression ne change pas max(updated_at)
+        not_modified = self.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return self.set_validators(super().list(request, *args, **kwargs), etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_object_validator()
+        if etag:
+            not_modified = self.conditional_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+        return self.set_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+    def _check_if_match(self, request):
+        """412 si If-Match ne correspond plus à l'état de l'objet"""
+        if 'HTTP_IF_MATCH' not in request.META:
+            return None
+        etag, last_modified = self.get_object_validator()
+        if etag is None:
+            # Objet absent : la vue renverra 404
+            return None
+        return self.conditional_response(request, etag, last_modified)
+
+    def update(self, request, *args, **kwargs):
+        precondition_failed = self._check_if_match(request)
+        if precondition_failed is not None:
+            return precondition_failed
+        response = super().update(request, *args, **kwargs)
+        return self.set_validators(response, *self.get_object_validator())
+
+    def destroy(self, request, *args, **kwargs):
+        precondition_failed = self._check_if_match(request)
+        if precondition_failed is not None:
+            return precondition_failed
+        return super().destroy(request, *args, **kwargs)
+
+    def get_dashboard_validator(self, request, include_incomes=True):
+        """
+        Validateur des tableaux de bord : état des comptes, des prélèvements, des agrégats
+        d'opérations (et des revenus) de l'utilisateur, plus la date du jour (échéances)
+        """
+        user = request.user
+        accounts = Account.objects.all() if user.is_staff else Account.objects.filter(user=user)
+        debits = DirectDebit.objects.all() if user.is_staff else DirectDebit.objects.filter(compte_reference__user=user)
+        rollups = OperationRollupService.get_rollups_for_user(user)
+
+        parts = [
+            accounts.order_by().aggregate(
+                last=Max('updated_at'), count=Count('pk'), solde=Sum('solde'),
+                operations=Sum('operations_count'), last_operation=Max('last_operation_at'),
+                debits=Sum('active_debits_count'), incomes=Sum('active_incomes_count')
+            ),
+            # date_prelevement / date_premier_versement avancent via update(), sans toucher updated_at
+            debits.order_by().aggregate(last=Max('updated_at'), count=Count('pk'), next=Max('date_prelevement')),
+            rollups.order_by().aggregate(count=Count('pk'), total=Sum('total_amount'), last=Max('day')),
+        ]
+        if include_incomes:
+            incomes = RecurringIncome.objects.all() if user.is_staff else RecurringIncome.objects.filter(compte_reference__user=user)
+            parts.append(incomes.order_by().aggregate(
+                last=Max('updated_at'), count=Count('pk'), next=Max('date_premier_versement')
+            ))
+        return self.make_etag(
+            user.pk, request.get_full_path(), date.today(),
+            [sorted(values.items()) for values in parts]
+        )
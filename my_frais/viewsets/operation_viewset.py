@@ -2,6 +2,7 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Sum, Count, Q
 from datetime import datetime, timedelta
@@ -10,10 +11,20 @@ from decimal import Decimal
 from my_frais.models import Operation, Account
 from my_frais.serializers.operation_serializer import OperationSerializer, OperationListSerializer
 from my_frais.mongodb_service import mongodb_service
+from my_frais.services import OperationRollupService
 from my_frais.logging_service import app_logger
+from my_frais.viewsets.mixins import ConditionalGetMixin
 
 
-class OperationViewSet(viewsets.ModelViewSet):
+class OperationCursorPagination(CursorPagination):
+    """Pagination par curseur des opérations d'un compte (du plus récent au plus ancien)"""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class OperationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des opérations financières.
     
@@ -29,6 +40,9 @@ class OperationViewSet(viewsets.ModelViewSet):
     ordering_fields = ['montant', 'created_at', 'updated_at']
     ordering = ['-created_at']
     
+    # Nombre maximum d'opérations récentes renvoyées par compte dans by_account
+    BY_ACCOUNT_MAX_LATEST = 50
+    
     def get_queryset(self):
         """Filtrer les opérations selon l'utilisateur connecté avec optimisation"""
         user = self.request.user
@@ -155,80 +169,117 @@ class OperationViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Obtenir les statistiques des opérations"""
-        operations = self.get_queryset()
-        
-        # Statistiques générales
-        total_operations = operations.count()
-        total_montant = operations.aggregate(total=Sum('montant'))['total'] or Decimal('0.00')
+        """Obtenir les statistiques des opérations (lues depuis les agrégats journaliers)"""
+        rollups = OperationRollupService.get_rollups_for_user(request.user)
         
         # Statistiques par période
         today = datetime.now().date()
         month_ago = today - timedelta(days=30)
         week_ago = today - timedelta(days=7)
         
-        operations_month = operations.filter(created_at__date__gte=month_ago)
-        operations_week = operations.filter(created_at__date__gte=week_ago)
-        
-        montant_month = operations_month.aggregate(total=Sum('montant'))['total'] or Decimal('0.00')
-        montant_week = operations_week.aggregate(total=Sum('montant'))['total'] or Decimal('0.00')
-        
-        # Statistiques par type (positif/négatif)
-        operations_positives = operations.filter(montant__gt=0)
-        operations_negatives = operations.filter(montant__lt=0)
-        
-        montant_positif = operations_positives.aggregate(total=Sum('montant'))['total'] or Decimal('0.00')
-        montant_negatif = operations_negatives.aggregate(total=Sum('montant'))['total'] or Decimal('0.00')
+        stats = OperationRollupService.summarize(rollups, {'month': month_ago, 'week': week_ago})
+        total, month, week = stats['total'], stats['month'], stats['week']
         
         return Response({
             'statistics': {
-                'total_operations': total_operations,
-                'total_montant': float(total_montant),
-                'operations_30_jours': operations_month.count(),
-                'montant_30_jours': float(montant_month),
-                'operations_7_jours': operations_week.count(),
-                'montant_7_jours': float(montant_week),
-                'operations_positives': operations_positives.count(),
-                'montant_positif': float(montant_positif),
-                'operations_negatives': operations_negatives.count(),
-                'montant_negatif': float(montant_negatif)
+                'total_operations': total['count'],
+                'total_montant': float(total['montant_total']),
+                'operations_30_jours': month['count'],
+                'montant_30_jours': float(month['montant_total']),
+                'operations_7_jours': week['count'],
+                'montant_7_jours': float(week['montant_total']),
+                'operations_positives': total['count_positif'],
+                'montant_positif': float(total['montant_positif']),
+                'operations_negatives': total['count_negatif'],
+                'montant_negatif': float(total['montant_negatif'])
             }
         })
     
     @action(detail=False, methods=['get'])
     def by_account(self, request):
-        """Obtenir les opérations groupées par compte"""
-        operations = self.get_queryset()
+        """
+        Obtenir les opérations groupées par compte.
         
-        # Grouper par compte
-        accounts_data = {}
-        for operation in operations:
-            account_id = operation.compte_reference.id
-            account_username = operation.compte_reference.user.username
-            
-            if account_id not in accounts_data:
-                accounts_data[account_id] = {
-                    'account_id': account_id,
-                    'account_username': account_username,
-                    'operations_count': 0,
-                    'total_montant': Decimal('0.00'),
-                    'operations': []
-                }
+        Sans paramètre : totaux par compte (depuis les agrégats journaliers) et les
+        `latest` dernières opérations de chaque compte (5 par défaut, 50 maximum).
+        Avec `account=<id>` : opérations du compte paginées par curseur (`cursor`, `page_size`).
+        """
+        account_id = request.query_params.get('account')
+        if account_id:
+            return self._account_operations_page(request, account_id)
+        
+        try:
+            latest = min(max(int(request.query_params.get('latest', 5)), 0), self.BY_ACCOUNT_MAX_LATEST)
+        except (ValueError, TypeError):
+            latest = 5
+        
+        # Un agrégat groupé par compte au lieu de parcourir toutes les opérations
+        accounts_totals = OperationRollupService.get_rollups_for_user(request.user).order_by().values(
+            'compte_reference_id', 'compte_reference__user__username'
+        ).annotate(
+            operations_count=Sum('operations_count'),
+            total_montant=Sum('total_amount')
+        ).filter(operations_count__gt=0).order_by('compte_reference_id')
+        
+        accounts_data = []
+        for totals in accounts_totals:
+            account_id = totals['compte_reference_id']
+            operations = []
+            if latest:
+                # Requête bornée (latest + 1 pour savoir s'il en reste) par compte
+                operations = list(
+                    Operation.objects.filter(compte_reference_id=account_id)
+                    .order_by('-created_at', '-id')
+                    .values('id', 'montant', 'description', 'created_at')[:latest + 1]
+                )
             
-            accounts_data[account_id]['operations_count'] += 1
-            accounts_data[account_id]['total_montant'] += operation.montant
-            accounts_data[account_id]['operations'].append({
+            accounts_data.append({
+                'account_id': account_id,
+                'account_username': totals['compte_reference__user__username'],
+                'operations_count': totals['operations_count'],
+                'total_montant': float(totals['total_montant'] or 0),
+                'operations': [
+                    {
+                        'id': operation['id'],
+                        'montant': float(operation['montant']),
+                        'description': operation['description'],
+                        'created_at': operation['created_at']
+                    }
+                    for operation in operations[:latest]
+                ],
+                'has_more': totals['operations_count'] > latest
+            })
+        
+        return Response(accounts_data)
+    
+    def _account_operations_page(self, request, account_id):
+        """Page d'opérations d'un compte, paginée par curseur sur created_at"""
+        try:
+            account_id = int(account_id)
+        except (ValueError, TypeError):
+            return Response({'error': 'Identifiant de compte invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        accounts = Account.objects.filter(id=account_id)
+        if not request.user.is_staff:
+            accounts = accounts.filter(user=request.user)
+        if not accounts.exists():
+            return Response({'error': 'Compte non trouvé'}, status=status.HTTP_404_NOT_FOUND)
+        
+        operations = Operation.objects.filter(compte_reference_id=account_id).only(
+            'id', 'montant', 'description', 'created_at'
+        )
+        paginator = OperationCursorPagination()
+        page = paginator.paginate_queryset(operations, request, view=self)
+        
+        return paginator.get_paginated_response([
+            {
                 'id': operation.id,
                 'montant': float(operation.montant),
                 'description': operation.description,
                 'created_at': operation.created_at
-            })
-        
-        # Convertir les montants en float pour la sérialisation JSON
-        for account_data in accounts_data.values():
-            account_data['total_montant'] = float(account_data['total_montant'])
-        
-        return Response(list(accounts_data.values()))
+            }
+            for operation in page
+        ])
     
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -11,9 +11,10 @@ from my_frais.models import RecurringIncome, Account
 from my_frais.serializers.recurring_income_serializer import (
     RecurringIncomeSerializer, RecurringIncomeListSerializer, RecurringIncomeSummarySerializer
 )
+from my_frais.viewsets.mixins import ConditionalGetMixin
 
 
-class RecurringIncomeViewSet(viewsets.ModelViewSet):
+class RecurringIncomeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des revenus récurrents.
     
@@ -187,7 +188,7 @@ class RecurringIncomeViewSet(viewsets.ModelViewSet):
         days = int(request.query_params.get('days', 30))
         date_limite = date.today() + timedelta(days=days)
         
-        revenus = self.get_queryset().filter(actif=True)
+        revenus = self.get_queryset().filter(actif=True).select_related('compte_reference')
         upcoming_revenus = []
         
         for revenu in revenus:
@@ -0,0 +1,85 @@
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+
+from my_frais.models import Account, Operation, DirectDebit, RecurringIncome, BudgetProjection
+from my_frais.serializers.account_serializer import AccountSerializer
+from my_frais.serializers.operation_serializer import OperationSerializer
+from my_frais.serializers.direct_debit_serializer import DirectDebitSerializer
+from my_frais.serializers.recurring_income_serializer import RecurringIncomeSerializer
+from my_frais.serializers.budget_projection_serializer import BudgetProjectionSerializer
+from my_frais.services import SyncService
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    ViewSet de synchronisation différentielle pour les clients hors ligne.
+
+    GET sync/ : tous les objets existants (première synchronisation), par pages.
+    GET sync/?cursor=<curseur> : uniquement les objets créés, modifiés ou supprimés
+    depuis ce curseur. Chaque réponse fournit le curseur suivant et `has_more`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    # Requête et serializer utilisés pour chaque type d'objet synchronisé
+    SYNC_MODELS = {
+        'account': (lambda: Account.objects.select_related('user', 'created_by'), AccountSerializer),
+        'operation': (lambda: Operation.objects.select_related('compte_reference__user', 'created_by'), OperationSerializer),
+        'direct_debit': (lambda: DirectDebit.objects.select_related('compte_reference__user', 'created_by'), DirectDebitSerializer),
+        'recurring_income': (lambda: RecurringIncome.objects.select_related('compte_reference__user', 'created_by'), RecurringIncomeSerializer),
+        'budget_projection': (lambda: BudgetProjection.objects.select_related('compte_reference', 'created_by'), BudgetProjectionSerializer),
+    }
+
+    def list(self, request):
+        """Changements depuis le curseur fourni"""
+        after_id = 0
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                after_id, issued_at = SyncService.decode_cursor(cursor)
+            except ValueError:
+                return Response({'error': 'Curseur invalide'}, status=status.HTTP_400_BAD_REQUEST)
+            if SyncService.is_expired(issued_at):
+                return Response(
+                    {'error': 'Curseur expiré, resynchronisation complète nécessaire', 'reset': True},
+                    status=status.HTTP_410_GONE
+                )
+
+        try:
+            page_size = int(request.query_params.get('page_size', 0)) or None
+        except (ValueError, TypeError):
+            page_size = None
+
+        result = SyncService.changes_since(request.user, after_id, page_size)
+
+        # Une requête par type d'objet présent dans la page
+        ids_by_model = {}
+        for change in result['changes']:
+            if not change.deleted:
+                ids_by_model.setdefault(change.model_name, []).append(change.object_id)
+        data_by_model = {}
+        for model_name, ids in ids_by_model.items():
+            queryset_factory, serializer_class = self.SYNC_MODELS[model_name]
+            objects = queryset_factory().filter(id__in=ids)
+            data_by_model[model_name] = {
+                item['id']: item
+                for item in serializer_class(objects, many=True, context={'request': request}).data
+            }
+
+        changes = []
+        for change in result['changes']:
+            if change.deleted:
+                changes.append({'model': change.model_name, 'id': change.object_id, 'action': 'delete'})
+                continue
+            data = data_by_model[change.model_name].get(change.object_id)
+            if data is None:
+                # Supprimé depuis : le tombstone suit dans le journal
+                continue
+            changes.append({'model': change.model_name, 'id': change.object_id, 'action': 'upsert', 'data': data})
+
+        return Response({
+            'changes': changes,
+            'cursor': SyncService.encode_cursor(result['next_id']),
+            'has_more': result['has_more'],
+            'reset': False
+        })